@@ -4,7 +4,7 @@ Topping Internal Ticket Bot — PTB v20+
 - IT → Amir's group (Queue | Algorithm & Pricing) only.
 - Marketing → Arian's NodeWest group only.
 - No CEO copy to Hamid PV (Hamid is in both groups).
-- Commands: /ticket, /task, /status <id>, /close <id>
+- Commands: /ticket, /task, /status <id>, /close <id>, /search <terms>
 """
 print("BOT VERSION: 2026-02-23 IT-ROUTING v1")
 
@@ -26,9 +26,26 @@ from telegram.ext import (
     ContextTypes,
     MessageHandler,
     CallbackQueryHandler,
+    TypeHandler,
     filters,
 )
 
+from database import db
+from database.archive import ARCHIVE_INTERVAL, archive
+from database.conversations import SWEEP_INTERVAL, ConversationStore
+from database.journal import TicketJournal
+from database.ticket_ids import TicketIdAllocator
+from database.tickets import TicketRepository
+from handlers.announce_handler import resume_retries as resume_announcement_retries
+from handlers.sla import sla
+from utils import metrics, render_cache
+from utils.downloads import downloads
+from utils.edits import edits
+from utils.ingress import IngressFilter, allowed_updates
+from utils.locks import locks
+from utils.metrics import InstrumentedRequest
+from utils.outbound import PRIORITY_CARD, PRIORITY_NOTICE, outbound
+
 # ---------------------------------------------------------------------------
 # Logging
 # ---------------------------------------------------------------------------
@@ -46,6 +63,7 @@ logging.getLogger("httpcore").setLevel(logging.WARNING)
 # Config from ENV (validated on startup)
 # ---------------------------------------------------------------------------
 DATA_FILE = Path("tickets.json")
+TICKET_IDS_FILE = Path("ticket_ids.json")  # today's reserved ticket counter only
 
 
 def _parse_int(val):
@@ -67,6 +85,17 @@ MOTAB_ID = _parse_int(os.getenv("MOTAB_ID"))  # Marketing Manager (optional DM;
 AMIR_IT_GROUP_CHAT_ID = -1003894609250           # Queue | Algorithm & Pricing
 NODEWEST_MARKETING_GROUP_CHAT_ID = -1003532849922  # Arian's NodeWest
 
+# Updates handled at once (1 = strictly one after another).
+CONCURRENT_UPDATES = max(1, _parse_int(os.getenv("CONCURRENT_UPDATES")) or 64)
+
+# Update ingestion: "polling" (default) or "webhook" (PTB's built-in server; keeps pending updates across restarts)
+BOT_MODE = (os.getenv("BOT_MODE") or "polling").strip().lower()
+WEBHOOK_URL = (os.getenv("WEBHOOK_URL") or "").strip().rstrip("/")    # public https base, e.g. https://bot.example.com
+WEBHOOK_SECRET = (os.getenv("WEBHOOK_SECRET") or "").strip()          # sent by Telegram as X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_LISTEN = (os.getenv("WEBHOOK_LISTEN") or "0.0.0.0").strip()
+WEBHOOK_PORT = _parse_int(os.getenv("WEBHOOK_PORT")) or _parse_int(os.getenv("PORT")) or 8443
+WEBHOOK_PATH = (os.getenv("WEBHOOK_PATH") or "telegram").strip().strip("/")
+
 
 def _manager_ids_ok():
     """True if we have at least Hamid and token."""
@@ -82,7 +111,12 @@ def _dept_manager_ids():
 
 
 def _format_ticket_card(ticket: dict) -> str:
-    """Build ticket card text from ticket record (for send and edit)."""
+    """Build ticket card text from ticket record (for send and edit). Cached per ticket version."""
+    key = ("ticket", ticket.get("ticket_id"), ticket.get("updated_at") or ticket.get("created_at"), ticket.get("status"))
+    return render_cache.cards.get_or_build(key, lambda: _render_ticket_card(ticket))
+
+
+def _render_ticket_card(ticket: dict) -> str:
     tid = ticket.get("ticket_id", "?")
     by_ = ticket.get("created_by", {}) or {}
     uid = by_.get("user_id", "?")
@@ -103,7 +137,11 @@ def _format_ticket_card(ticket: dict) -> str:
 
 
 def _status_keyboard(ticket_id: str) -> InlineKeyboardMarkup:
-    """Inline keyboard for In Progress / Done."""
+    """Inline keyboard for In Progress / Done (static per ticket, cached)."""
+    return render_cache.keyboards.get_or_build(("ticket", ticket_id), lambda: _build_status_keyboard(ticket_id))
+
+
+def _build_status_keyboard(ticket_id: str) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup([
         [
             InlineKeyboardButton("In Progress", callback_data=f"S_p_{ticket_id}"),
@@ -113,37 +151,45 @@ def _status_keyboard(ticket_id: str) -> InlineKeyboardMarkup:
 
 
 # ---------------------------------------------------------------------------
-# JSON storage (async-safe: run in thread to avoid blocking)
+# Ticket storage: append-only journal (database/journal.py) behind an in-memory
+# repository with write-behind flushing (database/tickets.py).
+# File I/O runs in a thread to avoid blocking the event loop.
 # ---------------------------------------------------------------------------
+TICKETS_FLUSH_INTERVAL = float(os.getenv("TICKETS_FLUSH_INTERVAL", "2"))  # seconds
+# Flushed tickets are mirrored into SQLite (database/db.py tickets table) for /search.
+TICKETS = TicketRepository(TicketJournal(DATA_FILE), flush_interval=TICKETS_FLUSH_INTERVAL, mirror=db.upsert_tickets)
+TICKET_IDS = TicketIdAllocator(TICKET_IDS_FILE)
+# /ticket -> draft -> department state per user (database/conversations.py); survives restarts, expires by TTL.
+CONVERSATIONS = ConversationStore(flush_interval=TICKETS_FLUSH_INTERVAL)
+# Plain group messages only matter to users who were just asked for their task text.
+INGRESS = IngressFilter(lambda user_id: (CONVERSATIONS.get(user_id) or {}).get("step") == "awaiting_task")
+
+
 def _load_data_sync():
-    if not DATA_FILE.exists():
-        return {"tickets": {}, "daily_counter": {}}
-    with open(DATA_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return TICKETS.journal.document()
 
 
 def _save_data_sync(data):
-    with open(DATA_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    TICKETS.journal.replace(data)
 
 
+@metrics.timed("topping_storage_seconds", "topping_storage_errors_total", op="load_data")
 async def load_data():
+    """Full {"tickets", "daily_counter"} document. O(n): handlers use TICKETS.get/put."""
+    await TICKETS.flush()
     return await asyncio.to_thread(_load_data_sync)
 
 
+@metrics.timed("topping_storage_seconds", "topping_storage_errors_total", op="save_data")
 async def save_data(data):
+    """Replace the whole store and rewrite the snapshot."""
+    await TICKETS.flush()
     await asyncio.to_thread(_save_data_sync, data)
 
 
 async def make_ticket_id(prefix: str) -> str:
-    today = datetime.utcnow().strftime("%Y%m%d")
-    data = await load_data()
-    data.setdefault("daily_counter", {})
-    data["daily_counter"].setdefault(today, 0)
-    data["daily_counter"][today] += 1
-    await save_data(data)
-    n = data["daily_counter"][today]
-    return f"{prefix}-{today}-{str(n).zfill(4)}"
+    """Next PREFIX-YYYYMMDD-NNNN id; unique under concurrent callbacks (database/ticket_ids.py)."""
+    return await TICKET_IDS.next_id(prefix)
 
 
 # ---------------------------------------------------------------------------
@@ -212,18 +258,16 @@ async def whoami(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
 
 async def debug_group(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """برای تست: هر پیام در گروه/سوپرگروه در ترمینال چاپ می‌شود. اگر این را می‌بینی = ربات پیام گروه را می‌گیرد."""
+    """برای تست: پیام‌های گروه که از فیلتر ورودی رد شده‌اند با سطح DEBUG لاگ می‌شوند (چت‌های عادی گروه قبلاً حذف شده‌اند)."""
     if update.effective_chat:
-        chat_id = update.effective_chat.id
-        print("GROUP MESSAGE RECEIVED:", chat_id)
-        logger.info("GROUP MESSAGE RECEIVED: %s", chat_id)
+        logger.debug("GROUP MESSAGE RECEIVED: %s", update.effective_chat.id)
 
 
 async def cmd_ticket_or_task(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Start ticket flow: ask for task message. Works in private and groups."""
     if not update.message or not update.effective_user:
         return
-    context.user_data["awaiting_task"] = True
+    CONVERSATIONS.set(update.effective_user.id, "awaiting_task")
     await update.message.reply_text("Send your task message (one message), then I'll ask for the department.")
 
 
@@ -242,18 +286,23 @@ async def on_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
     """Handle free-text message: only when user just sent /ticket or /task (draft + dept)."""
     if not update.message or not update.effective_user or not update.effective_chat:
         return
-    # In groups, only react if user is in "awaiting task" flow
-    if update.effective_chat.type != "private" and not context.user_data.get("awaiting_task"):
+    # Private or group: only react if the user is in the "awaiting task" step
+    state = CONVERSATIONS.get(update.effective_user.id)
+    if not state or state["step"] != "awaiting_task":
         return
-    if not context.user_data.get("awaiting_task"):
-        return
-    context.user_data["draft"] = update.message.text or "(no text)"
-    context.user_data["awaiting_task"] = False
+    CONVERSATIONS.set(update.effective_user.id, "awaiting_department", draft=update.message.text or "(no text)")
     await update.message.reply_text("Select department:", reply_markup=_dept_keyboard())
 
 
 async def on_dept_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """User chose department: create ticket. Full card ONLY in destination group; source chat gets short confirmation only."""
+    """User chose department: create ticket. Serialized per user, so a double press cannot consume one draft twice."""
+    user = update.effective_user
+    async with locks(("user", user.id if user else 0)):
+        await _create_ticket(update, context)
+
+
+async def _create_ticket(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Full card ONLY in destination group; source chat gets short confirmation only."""
     query = update.callback_query
     if not query:
         return
@@ -276,8 +325,12 @@ async def on_dept_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     user = update.effective_user
     if not user:
         return
-    draft = context.user_data.get("draft", "")
-    context.user_data.pop("draft", None)
+    state = CONVERSATIONS.pop(user.id)
+    if not state or state["step"] != "awaiting_department":
+        # Second press on the same keyboard, or the draft expired.
+        await query.edit_message_text("This draft was already sent or has expired. Send /ticket to start again.")
+        return
+    draft = state.get("draft") or ""
 
     logger.info("TICKET DEPT SELECT: dept_key=%s callback_data=%s", dept_key, raw)
 
@@ -304,10 +357,7 @@ async def on_dept_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         "status": "OPEN",
         "manager_id": manager_id,
     }
-    data = await load_data()
-    data.setdefault("tickets", {})
-    data["tickets"][ticket_id] = ticket
-    await save_data(data)
+    TICKETS.put(ticket)
 
     msg_body = _format_ticket_card(ticket)
     status_kb = _status_keyboard(ticket_id)
@@ -321,13 +371,15 @@ async def on_dept_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     )
     try:
         # 1) Send ticket card to destination group only
-        sent_msg = await context.bot.send_message(destination_chat_id, msg_body, reply_markup=status_kb)
+        sent_msg = await outbound.send_message(
+            context.bot, destination_chat_id, msg_body, priority=PRIORITY_CARD, reply_markup=status_kb,
+        )
         # 2) Store destination_message_id for later status edits
         destination_message_id = sent_msg.message_id
+        edits.remember(destination_chat_id, destination_message_id, msg_body, status_kb)
         ticket["destination_chat_id"] = destination_chat_id
         ticket["destination_message_id"] = destination_message_id
-        data["tickets"][ticket_id] = ticket
-        await save_data(data)
+        TICKETS.put(ticket)
         # 3) Log
         logger.info(
             "Ticket routed: ticket_id=%s dept=%s source_chat=%s dest_chat=%s dest_msg=%s",
@@ -335,7 +387,7 @@ async def on_dept_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         )
         # 4) Only then send confirmation to source chat (only on success)
         confirmation = f"✅ Ticket {ticket_id} routed to IT group." if dept_key == "IT" else f"✅ Ticket {ticket_id} routed to NodeWest marketing group."
-        await query.edit_message_text(confirmation)
+        await outbound.submit(source_chat_id, PRIORITY_CARD, lambda: query.edit_message_text(confirmation))
     except Exception as e:
         logger.exception("Failed to send ticket %s to chat_id=%s: %s", ticket_id, destination_chat_id, e)
         await query.edit_message_text("❌ Failed to route ticket to department group.")
@@ -351,37 +403,41 @@ async def on_status_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
         return
     parts = raw.split("_", 2)
     action, ticket_id = parts[1], parts[2]
-    data = await load_data()
-    ticket = data.get("tickets", {}).get(ticket_id)
-    if not ticket:
-        await query.answer("Ticket not found.", show_alert=True)
-        return
-    manager_id = ticket.get("manager_id")
-    user_id = update.effective_user.id if update.effective_user else 0
-    if user_id != manager_id and user_id != HAMID_ID:
-        await query.answer("Not authorized to change status.", show_alert=True)
-        return
-    ticket["status"] = "IN_PROGRESS" if action == "p" else "DONE"
-    await save_data(data)
+    # The read-modify-write runs under the ticket's lock; the (debounced) edit runs after it,
+    # and the edit coalescer keeps the newest card text if presses overlap.
+    async with locks(("ticket", ticket_id)):
+        ticket = TICKETS.get(ticket_id)
+        if not ticket:
+            await query.answer("Ticket not found.", show_alert=True)
+            return
+        manager_id = ticket.get("manager_id")
+        user_id = update.effective_user.id if update.effective_user else 0
+        if user_id != manager_id and user_id != HAMID_ID:
+            await query.answer("Not authorized to change status.", show_alert=True)
+            return
+        ticket["status"] = "IN_PROGRESS" if action == "p" else "DONE"
+        TICKETS.put(ticket)
+        new_msg_body = _format_ticket_card(ticket)
 
     destination_chat_id = ticket.get("destination_chat_id")
     destination_message_id = ticket.get("destination_message_id")
     if destination_chat_id is None or destination_message_id is None:
         await query.answer("Cannot update ticket message (missing message_id).", show_alert=True)
         return
-    new_msg_body = _format_ticket_card(ticket)
     updated_kb = _status_keyboard(ticket_id)
+    # Answer before the edit: the edit waits out the debounce window and the group's rate limit,
+    # and a callback query left unanswered that long expires.
+    await query.answer("Updated")
     try:
-        await context.bot.edit_message_text(
-            chat_id=destination_chat_id,
-            message_id=destination_message_id,
-            text=new_msg_body,
-            reply_markup=updated_kb,
-        )
-        await query.answer("Updated")
+        # Debounced; skipped when the card already shows this status.
+        await edits.edit(context.bot, destination_chat_id, destination_message_id, new_msg_body, reply_markup=updated_kb)
     except Exception as e:
         logger.exception("Failed to edit ticket message %s: %s", ticket_id, e)
-        await query.answer("Status saved but could not update message.", show_alert=True)
+        await outbound.send_message(
+            context.bot, destination_chat_id,
+            f"⚠️ Ticket {ticket_id}: status saved as {ticket['status']}, but its message could not be updated.",
+            priority=PRIORITY_NOTICE,
+        )
 
 
 async def cmd_status(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -393,8 +449,11 @@ async def cmd_status(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
         await update.message.reply_text("Usage: /status <ticket_id>")
         return
     ticket_id = args[0].strip()
-    data = await load_data()
-    ticket = data.get("tickets", {}).get(ticket_id)
+    ticket = TICKETS.get(ticket_id)
+    archived = ticket is None
+    if archived:
+        # Finished tickets move to the monthly archive after ARCHIVE_AFTER_DAYS (database/archive.py).
+        ticket = await archive.lookup("ticket", ticket_id)
     if not ticket:
         await update.message.reply_text(f"Ticket not found: {ticket_id}")
         return
@@ -403,7 +462,7 @@ async def cmd_status(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
     by_str = by_.get("username", by_.get("user_id", "?"))
     text = (
         f"Ticket: {ticket_id}\n"
-        f"Status: {ticket.get('status', '?')}\n"
+        f"Status: {ticket.get('status', '?')}{' (archived)' if archived else ''}\n"
         f"Department: {ticket.get('department', '?')}\n"
         f"Created: {created} by {by_str}\n"
         f"Message: {ticket.get('message_text', '')[:200]}"
@@ -411,6 +470,64 @@ async def cmd_status(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
     await update.message.reply_text(text)
 
 
+SEARCH_PAGE_SIZE = 8
+SEARCH_KEEP = 20  # result messages per chat whose terms are kept for Prev/Next
+
+
+async def _search_page(terms: str, offset: int):
+    """Render one page of /search results; returns (text, keyboard)."""
+    rows = await db.search(terms, limit=SEARCH_PAGE_SIZE + 1, offset=offset)
+    has_next = len(rows) > SEARCH_PAGE_SIZE
+    rows = rows[:SEARCH_PAGE_SIZE]
+    if not rows:
+        return (f"No results for: {terms}" if offset == 0 else "No more results."), None
+    lines = [f"🔎 {terms} — results {offset + 1}–{offset + len(rows)}\n"]
+    for r in rows:
+        ref = f"🗂 TASK-{r['task_id']:04d}" if r["kind"] == "task" else f"🎫 {r['ticket_id']}"
+        text = " ".join((r.get("text") or "").split())
+        lines.append(f"{ref} · {r.get('department') or '?'} · {r.get('status') or '?'}\n   {text[:80]}")
+    buttons = []
+    if offset > 0:
+        buttons.append(InlineKeyboardButton("⬅️ Prev", callback_data=f"Q_{max(0, offset - SEARCH_PAGE_SIZE)}"))
+    if has_next:
+        buttons.append(InlineKeyboardButton("Next ➡️", callback_data=f"Q_{offset + SEARCH_PAGE_SIZE}"))
+    return "\n".join(lines), InlineKeyboardMarkup([buttons]) if buttons else None
+
+
+async def cmd_search(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Full-text search over ticket and task texts: /search <terms>."""
+    if not update.message:
+        return
+    terms = " ".join(context.args or []).strip()
+    if not terms:
+        await update.message.reply_text("Usage: /search <terms>")
+        return
+    await TICKETS.flush()  # make tickets changed in the last few seconds searchable
+    text, keyboard = await _search_page(terms, 0)
+    sent = await update.message.reply_text(text, reply_markup=keyboard)
+    if keyboard is not None:
+        # Keyed by results message so paging an older search keeps its own terms.
+        searches = context.chat_data.setdefault("search_terms", {})
+        searches[sent.message_id] = terms
+        while len(searches) > SEARCH_KEEP:
+            del searches[next(iter(searches))]
+
+
+async def on_search_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Prev/Next on /search results (callback data Q_<offset>; terms kept in chat_data per results message)."""
+    query = update.callback_query
+    if not query or not query.message:
+        return
+    raw = (query.data or "")[2:]
+    terms = context.chat_data.get("search_terms", {}).get(query.message.message_id)
+    if not raw.isdigit() or not terms:
+        await query.answer("Search expired. Run /search again.", show_alert=True)
+        return
+    await query.answer()
+    text, keyboard = await _search_page(terms, int(raw))
+    await edits.edit(context.bot, query.message.chat_id, query.message.message_id, text, reply_markup=keyboard)
+
+
 async def cmd_close(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Close a ticket. Only Hamid or the ticket's department manager."""
     if not update.message or not update.effective_user:
@@ -420,18 +537,18 @@ async def cmd_close(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         await update.message.reply_text("Usage: /close <ticket_id>")
         return
     ticket_id = args[0].strip()
-    data = await load_data()
-    ticket = data.get("tickets", {}).get(ticket_id)
-    if not ticket:
-        await update.message.reply_text(f"Ticket not found: {ticket_id}")
-        return
-    user_id = update.effective_user.id
-    manager_id = ticket.get("manager_id")
-    if user_id != manager_id and user_id != HAMID_ID:
-        await update.message.reply_text("You are not allowed to close this ticket.")
-        return
-    ticket["status"] = "CLOSED"
-    await save_data(data)
+    async with locks(("ticket", ticket_id)):
+        ticket = TICKETS.get(ticket_id)
+        if not ticket:
+            await update.message.reply_text(f"Ticket not found: {ticket_id}")
+            return
+        user_id = update.effective_user.id
+        manager_id = ticket.get("manager_id")
+        if user_id != manager_id and user_id != HAMID_ID:
+            await update.message.reply_text("You are not allowed to close this ticket.")
+            return
+        ticket["status"] = "CLOSED"
+        TICKETS.put(ticket)
     await update.message.reply_text(f"Ticket {ticket_id} closed.")
 
 
@@ -440,27 +557,21 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> N
     logger.error("Update %s caused error: %s", update, context.error, exc_info=context.error)
 
 
-def main() -> None:
-    """Validate config, build app, run polling."""
-    print("BOT LOADED FROM:", __file__)  # اگر این را ندیدی یعنی فایل دیگری اجرا می‌شود
-    logger.info("BOT_TOKEN: %s", "OK" if (BOT_TOKEN and BOT_TOKEN.strip()) else "NOT SET")
-    if not BOT_TOKEN or not BOT_TOKEN.strip():
-        logger.error("BOT_TOKEN is not set. Set it in the environment and restart.")
-        raise SystemExit(1)
-    if HAMID_ID is None:
-        logger.error("HAMID_ID is not set. Set it in the environment (e.g. HAMID_ID=722627622).")
-        raise SystemExit(1)
-    if AMIR_ID is None:
-        logger.warning("AMIR_ID is not set. IT tickets will be assigned to Hamid. Set AMIR_ID for IT manager.")
-    if MOTAB_ID is None:
-        logger.warning("MOTAB_ID is not set. Set MOTAB_ID for Marketing manager (routing uses hardcoded groups).")
-
+def build_application(token: str, request=None) -> Application:
+    """The Application with every handler registered. main() runs it; tools/bench.py drives it with a fake request."""
     app = (
         Application.builder()
-        .token(BOT_TOKEN.strip())
-        .post_init(_drop_webhook)
+        .token(token)
+        # Same pool size as PTB's default request; records per-method Bot API latency (utils/metrics.py).
+        .request(request or InstrumentedRequest(connection_pool_size=256))
+        # Updates for different tickets run in parallel; same-ticket/user work is serialized by utils/locks.py.
+        .concurrent_updates(CONCURRENT_UPDATES)
+        .post_init(_post_init)
+        .post_shutdown(_post_shutdown)
         .build()
     )
+    # Group -1 runs first: drops group chatter before any other handler is tried.
+    app.add_handler(TypeHandler(Update, INGRESS.check), group=-1)
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("id", show_id))
     app.add_handler(CommandHandler("whoami", whoami))
@@ -469,8 +580,10 @@ def main() -> None:
     app.add_handler(CommandHandler("task", cmd_ticket_or_task))
     app.add_handler(CommandHandler("status", cmd_status))
     app.add_handler(CommandHandler("close", cmd_close))
+    app.add_handler(CommandHandler("search", cmd_search))
     app.add_handler(CallbackQueryHandler(on_dept_callback, pattern=r"^D_"))
     app.add_handler(CallbackQueryHandler(on_status_callback, pattern=r"^S_"))
+    app.add_handler(CallbackQueryHandler(on_search_page_callback, pattern=r"^Q_"))
     app.add_handler(
         MessageHandler(
             (filters.ChatType.PRIVATE | filters.ChatType.GROUP | filters.ChatType.SUPERGROUP)
@@ -488,10 +601,124 @@ def main() -> None:
         group=1,
     )
     app.add_error_handler(error_handler)
+    metrics.instrument_application(app)
+    return app
+
+
+def main() -> None:
+    """Validate config, build app, run polling or webhook (BOT_MODE)."""
+    print("BOT LOADED FROM:", __file__)  # اگر این را ندیدی یعنی فایل دیگری اجرا می‌شود
+    logger.info("BOT_TOKEN: %s", "OK" if (BOT_TOKEN and BOT_TOKEN.strip()) else "NOT SET")
+    if not BOT_TOKEN or not BOT_TOKEN.strip():
+        logger.error("BOT_TOKEN is not set. Set it in the environment and restart.")
+        raise SystemExit(1)
+    if HAMID_ID is None:
+        logger.error("HAMID_ID is not set. Set it in the environment (e.g. HAMID_ID=722627622).")
+        raise SystemExit(1)
+    if AMIR_ID is None:
+        logger.warning("AMIR_ID is not set. IT tickets will be assigned to Hamid. Set AMIR_ID for IT manager.")
+    if MOTAB_ID is None:
+        logger.warning("MOTAB_ID is not set. Set MOTAB_ID for Marketing manager (routing uses hardcoded groups).")
+    if BOT_MODE not in ("polling", "webhook"):
+        logger.error("BOT_MODE must be 'polling' or 'webhook', got %r.", BOT_MODE)
+        raise SystemExit(1)
+    if BOT_MODE == "webhook" and (not WEBHOOK_URL or not WEBHOOK_SECRET):
+        logger.error("BOT_MODE=webhook needs WEBHOOK_URL and WEBHOOK_SECRET. Set them in the environment.")
+        raise SystemExit(1)
+
+    app = build_application(BOT_TOKEN.strip())
+
+    if BOT_MODE == "webhook":
+        # run_webhook registers WEBHOOK_URL/WEBHOOK_PATH with Telegram; updates queued while we were down are kept.
+        logger.info(
+            "Starting webhook on %s:%s/%s (drop_pending_updates=False).", WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH,
+        )
+        app.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            webhook_url=f"{WEBHOOK_URL}/{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET,
+            drop_pending_updates=False,
+            allowed_updates=allowed_updates(app),
+        )
+        return
+
+    # Webhook در post_init (_drop_webhook) صفر می‌شود. allowed_updates فقط نوع‌هایی که هندلرها لازم دارند (پیام گروه هم شامل است).
+    updates = allowed_updates(app)
+    logger.info("Starting polling (drop_pending_updates=True, allowed_updates=%s).", updates)
+    app.run_polling(drop_pending_updates=True, allowed_updates=updates)
+
+
+async def _post_init(application: Application) -> None:
+    """Load the ticket store once, start the write-behind flush, then clear any webhook (polling mode)."""
+    await TICKETS.load()
+    await db.init_db()
+    if len(TICKETS.journal) and not await db.count_tickets():
+        # First start with search: mirror existing tickets once (later flushes keep it current).
+        await db.upsert_tickets((await load_data())["tickets"].values())
+    await CONVERSATIONS.load()
+    application.job_queue.run_repeating(
+        CONVERSATIONS.flush_job, interval=CONVERSATIONS.flush_interval, first=CONVERSATIONS.flush_interval,
+        name="conversations_flush",
+    )
+    application.job_queue.run_repeating(
+        CONVERSATIONS.sweep_job, interval=SWEEP_INTERVAL, first=SWEEP_INTERVAL, name="conversations_sweep",
+    )
+    # Resume attachment downloads accepted before the last shutdown.
+    await downloads.start(application.bot)
+    # Auto-escalate hub tasks past their department SLA (wakes only at the next deadline).
+    await sla.start(application)
+    # Retry announcement deliveries that failed before the last shutdown.
+    application.job_queue.run_once(resume_announcement_retries, when=0, name="announce_resume")
+    metrics.gauge("topping_update_queue_depth", "Updates waiting for a handler.", application.update_queue.qsize)
+    metrics.gauge("topping_outbound_queue_depth", "Outbound sends waiting for a rate-limit slot.",
+                  lambda: outbound.stats()["queue_depth"])
+    metrics.gauge("topping_tickets_pending_flush", "Changed tickets not yet written to the journal.",
+                  lambda: TICKETS.pending)
+    metrics.gauge("topping_conversations_live", "Users between /ticket and the department pick.",
+                  lambda: len(CONVERSATIONS))
+    metrics.gauge("topping_downloads_queued", "Attachment downloads waiting for a worker.",
+                  lambda: downloads.stats()["queued"])
+    application.bot_data["metrics_server"] = await metrics.serve()
+    # Seed from the legacy per-day map in tickets.json, then drop it: the
+    # allocator keeps only today's counter, so the next snapshot prunes old days.
+    await TICKET_IDS.load(TICKETS.journal.counters)
+    TICKETS.journal.counters.clear()
+    application.job_queue.run_repeating(
+        TICKETS.flush_job, interval=TICKETS.flush_interval, first=TICKETS.flush_interval, name="tickets_flush",
+    )
+    application.job_queue.run_repeating(_archive_job, interval=ARCHIVE_INTERVAL, first=60, name="archive")
+    application.job_queue.run_repeating(_log_outbound_stats, interval=300, first=300, name="outbound_stats")
+    if BOT_MODE == "polling":
+        await _drop_webhook(application)
+
+
+async def _archive_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Move finished tickets and tasks older than ARCHIVE_AFTER_DAYS to the cold archive."""
+    try:
+        await archive.run(TICKETS)
+    except Exception:
+        logger.exception("Archive run failed; will retry on next interval")
+
+
+async def _log_outbound_stats(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Periodic metrics: outbound queue, edits saved, render cache hits, downloads, ingress, lock contention, archive."""
+    logger.info(
+        "OUTBOUND STATS: %s EDITS: %s RENDER CACHE: %s DOWNLOADS: %s INGRESS: %s LOCKS: %s SLA: %s ARCHIVED: %s",
+        outbound.stats(), edits.stats(), render_cache.stats(), downloads.stats(), INGRESS.stats(), locks.stats(),
+        sla.stats(), archive.stats(),
+    )
+
 
-    # Webhook در post_init (_drop_webhook) صفر می‌شود. allowed_updates=ALL_TYPES تا گروه/سوپرگروه بیاید.
-    logger.info("Starting polling (drop_pending_updates=True, allowed_updates=Update.ALL_TYPES).")
-    app.run_polling(drop_pending_updates=True, allowed_updates=Update.ALL_TYPES)
+async def _post_shutdown(application: Application) -> None:
+    """Flush pending tickets and conversations, close the journal and the task database."""
+    server = application.bot_data.get("metrics_server")
+    if server is not None:
+        server.close()
+    await TICKETS.close()
+    await CONVERSATIONS.close()
+    await db.close_db()
 
 
 async def _drop_webhook(application: Application) -> None:
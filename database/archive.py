@@ -0,0 +1,124 @@
+"""
+Hot/cold archival of finished tickets and tasks.
+
+A daily job moves DONE/CLOSED tickets (journal) and Done tasks (tasks table)
+whose last change is older than ARCHIVE_AFTER_DAYS into gzip-compressed JSONL
+partitions by creation month, e.g. archive/tickets-2026-01.jsonl.gz. Each run
+appends one gzip member per partition. The archive_index table maps every id
+to its partition, so lookup() decompresses a single month instead of searching
+them all.
+
+Order per batch: append to the partition (fsync), index, then delete from the
+hot store. A crash in between only leaves a duplicate line in the partition;
+lookup() returns the last copy.
+"""
+import asyncio
+import gzip
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from database import db
+
+logger = logging.getLogger("topping_bot.archive")
+
+ARCHIVE_DIR = Path(os.getenv("ARCHIVE_DIR", "archive"))
+ARCHIVE_AFTER_DAYS = float(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVE_INTERVAL = float(os.getenv("ARCHIVE_INTERVAL", str(24 * 3600)))  # seconds
+ARCHIVE_BATCH = 1000
+TICKET_FINISHED = ("DONE", "CLOSED")
+
+
+def _dumps(obj) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+class Archive:
+    def __init__(self, root: Path = ARCHIVE_DIR, after_days: float = ARCHIVE_AFTER_DAYS):
+        self.root = Path(root)
+        self.after_days = after_days
+        self.archived = {"ticket": 0, "task": 0}
+
+    def _append(self, partition: str, records: list) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.root / partition, "ab") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="ab") as f:
+                f.write("".join(_dumps(r) + "\n" for r in records).encode("utf-8"))
+            raw.flush()
+            os.fsync(raw.fileno())
+
+    async def _write(self, kind: str, records: list, id_key: str) -> None:
+        by_partition = {}
+        for r in records:
+            month = str(r.get("created_at") or "")[:7] or "unknown"
+            by_partition.setdefault(f"{kind}s-{month}.jsonl.gz", []).append(r)
+        for partition, batch in by_partition.items():
+            await asyncio.to_thread(self._append, partition, batch)
+        await db.add_archive_index(
+            kind, ((r[id_key], partition) for partition, batch in by_partition.items() for r in batch)
+        )
+
+    def _scan(self, partition: str, id_key: str, item_id: str):
+        path = self.root / partition
+        if not path.exists():
+            return None
+        found = None
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if item_id not in line:
+                    continue  # cheap filter before parsing
+                record = json.loads(line)
+                if str(record.get(id_key)) == item_id:
+                    found = record
+        return found
+
+    async def lookup(self, kind: str, item_id):
+        """Archived ticket/task record, or None if it was never archived."""
+        partition = await db.get_archive_partition(kind, item_id)
+        if partition is None:
+            return None
+        return await asyncio.to_thread(self._scan, partition, "ticket_id" if kind == "ticket" else "task_id", str(item_id))
+
+    def cutoff(self) -> datetime:
+        return datetime.utcnow() - timedelta(days=self.after_days)
+
+    async def archive_tickets(self, repo) -> int:
+        """Move finished tickets out of the journal (and its SQLite mirror)."""
+        await repo.flush()
+        tickets = await asyncio.to_thread(repo.journal.finished_before, TICKET_FINISHED, self.cutoff().isoformat())
+        moved = 0
+        for i in range(0, len(tickets), ARCHIVE_BATCH):
+            batch = tickets[i:i + ARCHIVE_BATCH]
+            await self._write("ticket", batch, "ticket_id")
+            deleted = await repo.delete(batch)  # a ticket changed meanwhile is kept
+            await db.delete_tickets(deleted)
+            moved += len(deleted)
+        return moved
+
+    async def archive_tasks(self) -> int:
+        """Move Done tasks (with their attachment links) out of the tasks table."""
+        before = self.cutoff().isoformat(" ")
+        moved = 0
+        while True:
+            tasks = await db.get_archivable_tasks(before, ARCHIVE_BATCH)
+            if not tasks:
+                return moved
+            await self._write("task", tasks, "task_id")
+            deleted = await db.delete_archived_tasks(tasks)
+            moved += len(deleted)  # a task changed meanwhile is kept (and, updated since, not selected again)
+
+    async def run(self, repo=None) -> dict:
+        moved = {"ticket": await self.archive_tickets(repo) if repo is not None else 0, "task": await self.archive_tasks()}
+        for kind, n in moved.items():
+            self.archived[kind] += n
+        if any(moved.values()):
+            logger.info("Archived %d tickets and %d tasks older than %g days", moved["ticket"], moved["task"], self.after_days)
+        return moved
+
+    def stats(self) -> dict:
+        return dict(self.archived)
+
+
+archive = Archive()
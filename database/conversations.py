@@ -0,0 +1,117 @@
+"""
+Persisted, TTL-bounded conversation state for the /ticket draft flow.
+
+Memory holds only live conversations (one small dict per user who is between
+/ticket and the department pick), so lookups never touch the database. Every
+entry expires CONVERSATION_TTL seconds after its last change; sweep() drops
+expired ones from memory and from the conversations table, and a hard cap
+evicts the entries closest to expiry first. Changes are written behind in one
+transaction per flush, and load() restores unexpired drafts after a restart.
+"""
+import asyncio
+import heapq
+import logging
+import os
+import time
+
+from database import db
+
+logger = logging.getLogger("topping_bot.conversations")
+
+CONVERSATION_TTL = float(os.getenv("CONVERSATION_TTL", str(24 * 3600)))  # seconds
+MAX_CONVERSATIONS = int(os.getenv("MAX_CONVERSATIONS", "50000"))
+SWEEP_INTERVAL = 600.0  # seconds
+
+
+class ConversationStore:
+    def __init__(self, ttl: float = CONVERSATION_TTL, max_entries: int = MAX_CONVERSATIONS, flush_interval: float = 2.0):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.flush_interval = flush_interval
+        self._entries = {}  # user_id -> {"step", "draft", "expires_at"}
+        self._dirty = set()  # user ids to upsert (or delete, if no longer in _entries)
+        self._flush_lock = asyncio.Lock()
+        self.evicted = 0
+
+    async def load(self) -> None:
+        """Restore unexpired conversations at startup."""
+        for row in await db.load_conversations(time.time()):
+            self._entries[row["user_id"]] = {"step": row["step"], "draft": row["draft"], "expires_at": row["expires_at"]}
+
+    def get(self, user_id: int):
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        if entry["expires_at"] <= time.time():
+            self.clear(user_id)
+            return None
+        return entry
+
+    def set(self, user_id: int, step: str, draft: str = None) -> None:
+        self._entries[user_id] = {"step": step, "draft": draft, "expires_at": time.time() + self.ttl}
+        self._dirty.add(user_id)
+        if len(self._entries) > self.max_entries:
+            self._evict(len(self._entries) - self.max_entries)
+
+    def pop(self, user_id: int):
+        """Remove and return the user's live conversation (None if there is none)."""
+        entry = self.get(user_id)
+        if entry is not None:
+            self.clear(user_id)
+        return entry
+
+    def clear(self, user_id: int) -> None:
+        if self._entries.pop(user_id, None) is not None:
+            self._dirty.add(user_id)
+
+    def _evict(self, n: int) -> None:
+        for user_id, _entry in heapq.nsmallest(n, self._entries.items(), key=lambda kv: kv[1]["expires_at"]):
+            self.clear(user_id)
+            self.evicted += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def flush(self) -> int:
+        """Write all changed conversations in one transaction; returns how many rows changed."""
+        async with self._flush_lock:
+            if not self._dirty:
+                return 0
+            dirty, self._dirty = self._dirty, set()
+            upserts, deletes = [], []
+            for user_id in dirty:
+                entry = self._entries.get(user_id)
+                if entry is None:
+                    deletes.append(user_id)
+                else:
+                    upserts.append((user_id, entry["step"], entry["draft"], entry["expires_at"]))
+            try:
+                await db.save_conversations(upserts, deletes)
+            except Exception:
+                self._dirty |= dirty
+                raise
+            return len(dirty)
+
+    async def sweep(self) -> int:
+        """Forget expired conversations in memory and on disk; returns rows deleted from the table."""
+        now = time.time()
+        for user_id in [uid for uid, e in self._entries.items() if e["expires_at"] <= now]:
+            del self._entries[user_id]  # the DELETE below covers the row
+        return await db.delete_expired_conversations(now)
+
+    async def flush_job(self, context) -> None:
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Conversation flush failed; will retry on next interval")
+
+    async def sweep_job(self, context) -> None:
+        try:
+            removed = await self.sweep()
+            if removed:
+                logger.info("Swept %d expired conversations", removed)
+        except Exception:
+            logger.exception("Conversation sweep failed")
+
+    async def close(self) -> None:
+        await self.flush()
@@ -1,129 +1,1039 @@
+import asyncio
+import functools
+import json
 import sqlite3
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+from utils import metrics
+
 DB_PATH = os.path.join(os.path.dirname(__file__), "topping_ops.db")
 
+# One long-lived WAL connection, only ever touched from this single-thread
+# executor: handlers await the calls below instead of blocking the event loop.
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="topping-db")
+_conn = None
 
-def get_conn():
-    conn = sqlite3.connect(DB_PATH)
+
+def connect(path=None):
+    conn = sqlite3.connect(path or DB_PATH, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=5000")
     return conn
 
 
-def init_db():
-    with get_conn() as conn:
-        conn.executescript("""
-        CREATE TABLE IF NOT EXISTS tasks (
-            task_id     INTEGER PRIMARY KEY AUTOINCREMENT,
-            department  TEXT NOT NULL,
-            creator     TEXT,
-            assigned_to TEXT,
-            description TEXT,
-            status      TEXT NOT NULL DEFAULT 'Open',
-            file_path   TEXT,
-            message_id  INTEGER,
-            chat_id     INTEGER,
-            created_at  DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
-            updated_at  DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
-        );
+def get_conn():
+    global _conn
+    if _conn is None:
+        conn = connect()
+        try:
+            migrate(conn)
+        except Exception:
+            conn.close()
+            raise
+        _conn = conn  # only a fully migrated connection is shared
+    return _conn
+
+
+async def _run(fn, *args):
+    """Run fn(conn, *args) on the DB thread; latency (including the wait for the thread) goes to metrics."""
+    def call():
+        return fn(get_conn(), *args)
+    op = getattr(fn, "func", fn).__name__.lstrip("_")
+    started = time.perf_counter()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_executor, call)
+    except Exception:
+        metrics.inc("topping_storage_errors_total", op=op)
+        raise
+    finally:
+        metrics.observe("topping_storage_seconds", time.perf_counter() - started, op=op)
+
+
+def _now():
+    return datetime.utcnow().isoformat(" ")
+
+
+def _row(row):
+    return dict(row) if row else None
+
+
+# Versioned schema: entry N brings the database to PRAGMA user_version N.
+# Append new entries; never edit one that has shipped.
+MIGRATIONS = [
+    # 1: base schema
+    """
+    CREATE TABLE IF NOT EXISTS tasks (
+        task_id     INTEGER PRIMARY KEY AUTOINCREMENT,
+        department  TEXT NOT NULL,
+        creator     TEXT,
+        assigned_to TEXT,
+        description TEXT,
+        status      TEXT NOT NULL DEFAULT 'Open',
+        file_path   TEXT,
+        message_id  INTEGER,
+        chat_id     INTEGER,
+        created_at  DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        updated_at  DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+
+    CREATE TABLE IF NOT EXISTS announcements (
+        id       INTEGER PRIMARY KEY AUTOINCREMENT,
+        sender   TEXT,
+        message  TEXT,
+        sent_at  DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+    """,
+    # 2: lookup by card message, and open-task listings (partial indexes only hold
+    # rows with status != 'Done'; rowid order gives ORDER BY task_id for free)
+    """
+    CREATE INDEX IF NOT EXISTS idx_tasks_message ON tasks(chat_id, message_id);
+    CREATE INDEX IF NOT EXISTS idx_tasks_open ON tasks(task_id) WHERE status != 'Done';
+    CREATE INDEX IF NOT EXISTS idx_tasks_open_department ON tasks(department) WHERE status != 'Done';
+    CREATE INDEX IF NOT EXISTS idx_tasks_open_creator ON tasks(creator) WHERE status != 'Done';
+    """,
+    # 3: bot.py tickets mirrored from tickets.json (tools/tickets_transfer.py); data = full record as JSON
+    """
+    CREATE TABLE IF NOT EXISTS tickets (
+        ticket_id   TEXT PRIMARY KEY,
+        department  TEXT,
+        status      TEXT,
+        created_at  TEXT,
+        data        TEXT NOT NULL
+    ) WITHOUT ROWID;
+    """,
+    # 4: per-target outcome of each announcement fan-out
+    """
+    CREATE TABLE IF NOT EXISTS announcement_deliveries (
+        announcement_id INTEGER NOT NULL REFERENCES announcements(id),
+        chat_id         INTEGER NOT NULL,
+        status          TEXT NOT NULL,
+        attempts        INTEGER NOT NULL DEFAULT 0,
+        latency_ms      INTEGER,
+        message_id      INTEGER,
+        error           TEXT,
+        updated_at      DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (announcement_id, chat_id)
+    );
+    CREATE INDEX IF NOT EXISTS idx_deliveries_failed
+        ON announcement_deliveries(announcement_id) WHERE status = 'failed';
+    """,
+    # 5: the pinned live dashboard message per department in the GM chat
+    """
+    CREATE TABLE IF NOT EXISTS dashboard_messages (
+        department  TEXT PRIMARY KEY,
+        chat_id     INTEGER NOT NULL,
+        message_id  INTEGER NOT NULL
+    );
+    """,
+    # 6: full-text search over task descriptions and ticket message_text, kept in sync by triggers
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(
+        description, content='tasks', content_rowid='task_id', tokenize='unicode61 remove_diacritics 2'
+    );
+    CREATE TRIGGER IF NOT EXISTS tasks_fts_ai AFTER INSERT ON tasks BEGIN
+        INSERT INTO tasks_fts(rowid, description) VALUES (new.task_id, new.description);
+    END;
+    CREATE TRIGGER IF NOT EXISTS tasks_fts_ad AFTER DELETE ON tasks BEGIN
+        INSERT INTO tasks_fts(tasks_fts, rowid, description) VALUES ('delete', old.task_id, old.description);
+    END;
+    CREATE TRIGGER IF NOT EXISTS tasks_fts_au AFTER UPDATE OF description ON tasks BEGIN
+        INSERT INTO tasks_fts(tasks_fts, rowid, description) VALUES ('delete', old.task_id, old.description);
+        INSERT INTO tasks_fts(rowid, description) VALUES (new.task_id, new.description);
+    END;
+    INSERT INTO tasks_fts(tasks_fts) VALUES ('rebuild');
 
-        CREATE TABLE IF NOT EXISTS announcements (
-            id       INTEGER PRIMARY KEY AUTOINCREMENT,
-            sender   TEXT,
-            message  TEXT,
-            sent_at  DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+    CREATE VIRTUAL TABLE IF NOT EXISTS tickets_fts USING fts5(
+        ticket_id UNINDEXED, message_text, tokenize='unicode61 remove_diacritics 2'
+    );
+    CREATE TRIGGER IF NOT EXISTS tickets_fts_ai AFTER INSERT ON tickets BEGIN
+        INSERT INTO tickets_fts(ticket_id, message_text)
+        VALUES (new.ticket_id, json_extract(new.data, '$.message_text'));
+    END;
+    -- message_text is fixed once a ticket exists, so status-only upserts never touch the index
+    CREATE TRIGGER IF NOT EXISTS tickets_fts_au AFTER UPDATE ON tickets
+    WHEN json_extract(old.data, '$.message_text') IS NOT json_extract(new.data, '$.message_text') BEGIN
+        DELETE FROM tickets_fts WHERE ticket_id = old.ticket_id;
+        INSERT INTO tickets_fts(ticket_id, message_text)
+        VALUES (new.ticket_id, json_extract(new.data, '$.message_text'));
+    END;
+    INSERT INTO tickets_fts(ticket_id, message_text)
+        SELECT ticket_id, json_extract(data, '$.message_text') FROM tickets;
+    """,
+    # 7: content-addressed attachments (utils/attachments.py): one stored blob per
+    # Telegram file_unique_id, shared by sha256; task_files links any number per task
+    """
+    CREATE TABLE IF NOT EXISTS files (
+        file_unique_id TEXT PRIMARY KEY,
+        sha256         TEXT NOT NULL,
+        path           TEXT NOT NULL,
+        size           INTEGER NOT NULL,
+        created_at     DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_files_sha256 ON files(sha256);
+
+    CREATE TABLE IF NOT EXISTS task_files (
+        task_id        INTEGER NOT NULL REFERENCES tasks(task_id),
+        file_unique_id TEXT NOT NULL REFERENCES files(file_unique_id),
+        file_name      TEXT,
+        added_by       TEXT,
+        added_at       DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (task_id, file_unique_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_task_files_file ON task_files(file_unique_id);
+
+    -- tasks.file_path keeps pre-migration attachments (storage/task_<id>/); file_count drives the card
+    ALTER TABLE tasks ADD COLUMN file_count INTEGER NOT NULL DEFAULT 0;
+    UPDATE tasks SET file_count = 1 WHERE file_path IS NOT NULL;
+    """,
+    # 8: attachment downloads accepted but not finished yet; replayed on startup
+    """
+    CREATE TABLE IF NOT EXISTS pending_downloads (
+        id               INTEGER PRIMARY KEY AUTOINCREMENT,
+        task_id          INTEGER NOT NULL REFERENCES tasks(task_id),
+        file_id          TEXT NOT NULL,
+        file_unique_id   TEXT NOT NULL,
+        file_name        TEXT,
+        added_by         TEXT,
+        chat_id          INTEGER,
+        reply_message_id INTEGER,
+        attempts         INTEGER NOT NULL DEFAULT 0,
+        error            TEXT,
+        created_at       DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+    """,
+    # 9: /ticket draft conversations (database/conversations.py); rows past expires_at are swept
+    """
+    CREATE TABLE IF NOT EXISTS conversations (
+        user_id     INTEGER PRIMARY KEY,
+        step        TEXT NOT NULL,
+        draft       TEXT,
+        expires_at  REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_conversations_expires ON conversations(expires_at);
+    """,
+    # 10: tasks still on the SLA clock (handlers/sla.py), oldest first
+    """
+    CREATE INDEX IF NOT EXISTS idx_tasks_sla ON tasks(created_at) WHERE status IN ('Open', 'InProgress');
+    """,
+    # 11: /report statistics, maintained by triggers. task_stats and task_resolution have one
+    # row per (department, UTC day) plus an all-time row under day '*'; resolution times are
+    # counted into the buckets of RESOLUTION_BUCKETS. A task marked Done twice counts twice.
+    """
+    CREATE TABLE IF NOT EXISTS task_status_counts (
+        department  TEXT NOT NULL,
+        status      TEXT NOT NULL,
+        n           INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (department, status)
+    ) WITHOUT ROWID;
+
+    CREATE TABLE IF NOT EXISTS task_stats (
+        department       TEXT NOT NULL,
+        day              TEXT NOT NULL,
+        created          INTEGER NOT NULL DEFAULT 0,
+        done             INTEGER NOT NULL DEFAULT 0,
+        escalated        INTEGER NOT NULL DEFAULT 0,
+        resolve_seconds  REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (department, day)
+    ) WITHOUT ROWID;
+
+    CREATE TABLE IF NOT EXISTS task_resolution (
+        department  TEXT NOT NULL,
+        day         TEXT NOT NULL,
+        bucket      INTEGER NOT NULL,
+        n           INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (department, day, bucket)
+    ) WITHOUT ROWID;
+
+    CREATE TRIGGER IF NOT EXISTS task_stats_ai AFTER INSERT ON tasks BEGIN
+        INSERT INTO task_status_counts (department, status, n) VALUES (new.department, new.status, 1)
+            ON CONFLICT(department, status) DO UPDATE SET n = n + 1;
+        INSERT INTO task_stats (department, day, created)
+            SELECT new.department, d, 1 FROM (SELECT date(new.created_at) AS d UNION ALL SELECT '*') WHERE true
+            ON CONFLICT(department, day) DO UPDATE SET created = created + 1;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS task_stats_ad AFTER DELETE ON tasks BEGIN
+        UPDATE task_status_counts SET n = n - 1 WHERE department = old.department AND status = old.status;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS task_stats_au AFTER UPDATE OF status ON tasks
+    WHEN old.status IS NOT new.status BEGIN
+        UPDATE task_status_counts SET n = n - 1 WHERE department = old.department AND status = old.status;
+        INSERT INTO task_status_counts (department, status, n) VALUES (new.department, new.status, 1)
+            ON CONFLICT(department, status) DO UPDATE SET n = n + 1;
+        INSERT INTO task_stats (department, day, escalated)
+            SELECT new.department, d, 1 FROM (SELECT date(new.updated_at) AS d UNION ALL SELECT '*')
+            WHERE new.status = 'Escalated'
+            ON CONFLICT(department, day) DO UPDATE SET escalated = escalated + 1;
+        INSERT INTO task_stats (department, day, done, resolve_seconds)
+            SELECT new.department, d, 1, r FROM (SELECT date(new.updated_at) AS d UNION ALL SELECT '*'),
+                (SELECT (julianday(new.updated_at) - julianday(new.created_at)) * 86400 AS r)
+            WHERE new.status = 'Done'
+            ON CONFLICT(department, day) DO UPDATE SET done = done + 1, resolve_seconds = resolve_seconds + excluded.resolve_seconds;
+        INSERT INTO task_resolution (department, day, bucket, n)
+            SELECT new.department, d, CASE
+                    WHEN r < 3600 THEN 0 WHEN r < 14400 THEN 1 WHEN r < 28800 THEN 2 WHEN r < 86400 THEN 3
+                    WHEN r < 259200 THEN 4 WHEN r < 604800 THEN 5 ELSE 6 END, 1
+            FROM (SELECT date(new.updated_at) AS d UNION ALL SELECT '*'),
+                (SELECT (julianday(new.updated_at) - julianday(new.created_at)) * 86400 AS r)
+            WHERE new.status = 'Done'
+            ON CONFLICT(department, day, bucket) DO UPDATE SET n = n + 1;
+    END;
+
+    -- Backfill from existing tasks; Done tasks count as resolved at their updated_at
+    INSERT INTO task_status_counts (department, status, n)
+        SELECT department, status, COUNT(*) FROM tasks GROUP BY department, status;
+    INSERT INTO task_stats (department, day, created)
+        SELECT department, date(created_at), COUNT(*) FROM tasks GROUP BY department, date(created_at);
+    INSERT INTO task_stats (department, day, created)
+        SELECT department, '*', COUNT(*) FROM tasks GROUP BY department;
+    INSERT INTO task_stats (department, day, done, resolve_seconds)
+        SELECT department, d, COUNT(*), SUM(r) FROM (
+            SELECT department, date(updated_at) AS d, (julianday(updated_at) - julianday(created_at)) * 86400 AS r
+            FROM tasks WHERE status = 'Done'
+            UNION ALL
+            SELECT department, '*', (julianday(updated_at) - julianday(created_at)) * 86400
+            FROM tasks WHERE status = 'Done'
+        ) GROUP BY department, d
+        ON CONFLICT(department, day) DO UPDATE SET done = excluded.done, resolve_seconds = excluded.resolve_seconds;
+    INSERT INTO task_resolution (department, day, bucket, n)
+        SELECT department, d, CASE
+                WHEN r < 3600 THEN 0 WHEN r < 14400 THEN 1 WHEN r < 28800 THEN 2 WHEN r < 86400 THEN 3
+                WHEN r < 259200 THEN 4 WHEN r < 604800 THEN 5 ELSE 6 END AS bucket, COUNT(*)
+        FROM (
+            SELECT department, date(updated_at) AS d, (julianday(updated_at) - julianday(created_at)) * 86400 AS r
+            FROM tasks WHERE status = 'Done'
+            UNION ALL
+            SELECT department, '*', (julianday(updated_at) - julianday(created_at)) * 86400
+            FROM tasks WHERE status = 'Done'
+        ) GROUP BY department, d, bucket;
+    """,
+    # 12: hot/cold archival (database/archive.py): where each archived ticket/task went, the Done
+    # tasks the retention job scans, and removing deleted tickets from search
+    """
+    CREATE TABLE IF NOT EXISTS archive_index (
+        kind       TEXT NOT NULL,
+        item_id    TEXT NOT NULL,
+        partition  TEXT NOT NULL,
+        PRIMARY KEY (kind, item_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_tasks_done ON tasks(updated_at) WHERE status = 'Done';
+    CREATE TRIGGER IF NOT EXISTS tickets_fts_ad AFTER DELETE ON tickets BEGIN
+        DELETE FROM tickets_fts WHERE ticket_id = old.ticket_id;
+    END;
+    """,
+    # 13: tickets_fts rows addressed by rowid. ticket_id is UNINDEXED in FTS5, so deleting by it
+    # scanned the whole index; tickets_fts_rowid maps each ticket to its (newest-last) fts rowid.
+    """
+    DROP TRIGGER IF EXISTS tickets_fts_ai;
+    DROP TRIGGER IF EXISTS tickets_fts_au;
+    DROP TRIGGER IF EXISTS tickets_fts_ad;
+    DROP TABLE IF EXISTS tickets_fts;
+
+    CREATE TABLE IF NOT EXISTS tickets_fts_rowid (
+        fts_rowid  INTEGER PRIMARY KEY AUTOINCREMENT,
+        ticket_id  TEXT NOT NULL UNIQUE
+    );
+    CREATE VIRTUAL TABLE IF NOT EXISTS tickets_fts USING fts5(
+        ticket_id UNINDEXED, message_text, tokenize='unicode61 remove_diacritics 2'
+    );
+    INSERT INTO tickets_fts_rowid (ticket_id) SELECT ticket_id FROM tickets ORDER BY created_at, ticket_id;
+    INSERT INTO tickets_fts (rowid, ticket_id, message_text)
+        SELECT m.fts_rowid, t.ticket_id, json_extract(t.data, '$.message_text')
+        FROM tickets_fts_rowid m JOIN tickets t ON t.ticket_id = m.ticket_id;
+
+    CREATE TRIGGER IF NOT EXISTS tickets_fts_ai AFTER INSERT ON tickets BEGIN
+        INSERT INTO tickets_fts_rowid (ticket_id) VALUES (new.ticket_id);
+        INSERT INTO tickets_fts (rowid, ticket_id, message_text) VALUES (
+            (SELECT fts_rowid FROM tickets_fts_rowid WHERE ticket_id = new.ticket_id),
+            new.ticket_id, json_extract(new.data, '$.message_text')
         );
-        """)
+    END;
+    -- message_text is fixed once a ticket exists, so status-only upserts never touch the index
+    CREATE TRIGGER IF NOT EXISTS tickets_fts_au AFTER UPDATE ON tickets
+    WHEN json_extract(old.data, '$.message_text') IS NOT json_extract(new.data, '$.message_text') BEGIN
+        DELETE FROM tickets_fts WHERE rowid = (SELECT fts_rowid FROM tickets_fts_rowid WHERE ticket_id = old.ticket_id);
+        INSERT INTO tickets_fts (rowid, ticket_id, message_text) VALUES (
+            (SELECT fts_rowid FROM tickets_fts_rowid WHERE ticket_id = new.ticket_id),
+            new.ticket_id, json_extract(new.data, '$.message_text')
+        );
+    END;
+    CREATE TRIGGER IF NOT EXISTS tickets_fts_ad AFTER DELETE ON tickets BEGIN
+        DELETE FROM tickets_fts WHERE rowid = (SELECT fts_rowid FROM tickets_fts_rowid WHERE ticket_id = old.ticket_id);
+        DELETE FROM tickets_fts_rowid WHERE ticket_id = old.ticket_id;
+    END;
+    """,
+    # 14: all-department /report reads (by day, across departments) and archived tasks'
+    # pending downloads (by task) without full scans
+    """
+    CREATE INDEX IF NOT EXISTS idx_task_stats_day ON task_stats(day);
+    CREATE INDEX IF NOT EXISTS idx_task_resolution_day ON task_resolution(day);
+    CREATE INDEX IF NOT EXISTS idx_pending_downloads_task ON pending_downloads(task_id);
+    """,
+]
 
+# Upper bounds (seconds) of the task_resolution buckets in migration 11; the last one is open-ended.
+RESOLUTION_BUCKETS = (3600, 4 * 3600, 8 * 3600, 86400, 3 * 86400, 7 * 86400, None)
 
-def create_task(department, creator, description, chat_id, message_id=None):
-    with get_conn() as conn:
-        cur = conn.execute(
+
+def migrate(conn):
+    """Apply pending MIGRATIONS, each in its own transaction; returns the schema version.
+    A failing step is rolled back completely, so it is retried from scratch on the next start."""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for target in range(version + 1, len(MIGRATIONS) + 1):
+        try:
+            conn.executescript(
+                "BEGIN;\n" + MIGRATIONS[target - 1] + f"\nPRAGMA user_version={target};\nCOMMIT;"
+            )
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+    return max(version, len(MIGRATIONS))
+
+
+async def init_db():
+    return await _run(migrate)
+
+
+async def close_db():
+    def close(conn):
+        global _conn
+        conn.close()
+        _conn = None
+    if _conn is not None:
+        await _run(close)
+
+
+def _create_task(conn, department, creator, description, chat_id, message_id):
+    with conn:
+        row = conn.execute(
             """INSERT INTO tasks (department, creator, description, chat_id, message_id)
-               VALUES (?, ?, ?, ?, ?)""",
+               VALUES (?, ?, ?, ?, ?) RETURNING *""",
             (department.upper(), creator, description, chat_id, message_id),
+        ).fetchone()
+    return _row(row)
+
+
+async def create_task(department, creator, description, chat_id, message_id=None):
+    return await _run(_create_task, department, creator, description, chat_id, message_id)
+
+
+def _create_tasks(conn, rows):
+    with conn:
+        # Inserts are serialized on this thread, so the new AUTOINCREMENT ids are exactly those above `last`.
+        last = conn.execute("SELECT COALESCE(MAX(task_id), 0) FROM tasks").fetchone()[0]
+        conn.executemany(
+            "INSERT INTO tasks (department, creator, description, chat_id) VALUES (?, ?, ?, ?)",
+            ((department.upper(), creator, description, chat_id) for department, creator, description, chat_id in rows),
         )
-        return get_task(cur.lastrowid)
+        return [dict(r) for r in conn.execute("SELECT * FROM tasks WHERE task_id > ? ORDER BY task_id", (last,))]
 
 
-def get_task(task_id):
-    with get_conn() as conn:
-        row = conn.execute("SELECT * FROM tasks WHERE task_id=?", (task_id,)).fetchone()
-        return dict(row) if row else None
+async def create_tasks(rows):
+    """Insert (department, creator, description, chat_id) rows in one transaction; returns the new tasks in order."""
+    return await _run(_create_tasks, list(rows))
 
 
-def update_task_message(task_id, chat_id, message_id):
-    with get_conn() as conn:
-        conn.execute(
+def _update_task_messages(conn, cards):
+    now = _now()
+    with conn:
+        conn.executemany(
             "UPDATE tasks SET chat_id=?, message_id=?, updated_at=? WHERE task_id=?",
-            (chat_id, message_id, datetime.utcnow(), task_id),
+            ((chat_id, message_id, now, task_id) for task_id, chat_id, message_id in cards),
         )
 
 
-def update_task_status(task_id, status=None, assigned_to=None):
-    with get_conn() as conn:
-        if status and assigned_to:
-            conn.execute(
-                "UPDATE tasks SET status=?, assigned_to=?, updated_at=? WHERE task_id=?",
-                (status, assigned_to, datetime.utcnow(), task_id),
-            )
-        elif status:
-            conn.execute(
-                "UPDATE tasks SET status=?, updated_at=? WHERE task_id=?",
-                (status, datetime.utcnow(), task_id),
-            )
-        elif assigned_to:
-            conn.execute(
-                "UPDATE tasks SET assigned_to=?, updated_at=? WHERE task_id=?",
-                (assigned_to, datetime.utcnow(), task_id),
-            )
-    return get_task(task_id)
+async def update_task_messages(cards):
+    """Record posted cards, (task_id, chat_id, message_id) each, in one transaction."""
+    await _run(_update_task_messages, list(cards))
 
 
-def update_task_file(task_id, file_path):
-    with get_conn() as conn:
-        conn.execute(
-            "UPDATE tasks SET file_path=?, updated_at=? WHERE task_id=?",
-            (file_path, datetime.utcnow(), task_id),
+def _get_task(conn, task_id):
+    row = conn.execute("SELECT * FROM tasks WHERE task_id=?", (task_id,)).fetchone()
+    return _row(row)
+
+
+async def get_task(task_id):
+    return await _run(_get_task, task_id)
+
+
+def _update_task(conn, task_id, **fields):
+    """UPDATE the given columns (plus updated_at) and return the new row in the same statement."""
+    if not fields:
+        return _get_task(conn, task_id)
+    cols = ", ".join(f"{name}=?" for name in fields)
+    with conn:
+        row = conn.execute(
+            f"UPDATE tasks SET {cols}, updated_at=? WHERE task_id=? RETURNING *",
+            (*fields.values(), _now(), task_id),
+        ).fetchone()
+    return _row(row)
+
+
+async def update_task_message(task_id, chat_id, message_id):
+    return await _run(functools.partial(_update_task, chat_id=chat_id, message_id=message_id), task_id)
+
+
+async def update_task_status(task_id, status=None, assigned_to=None):
+    fields = {}
+    if status:
+        fields["status"] = status
+    if assigned_to:
+        fields["assigned_to"] = assigned_to
+    return await _run(functools.partial(_update_task, **fields), task_id)
+
+
+async def update_task_file(task_id, file_path):
+    return await _run(functools.partial(_update_task, file_path=file_path), task_id)
+
+
+def _get_file(conn, file_unique_id):
+    row = conn.execute("SELECT * FROM files WHERE file_unique_id=?", (file_unique_id,)).fetchone()
+    return _row(row)
+
+
+async def get_file(file_unique_id):
+    """The stored blob for a Telegram file_unique_id, or None if it was never downloaded."""
+    return await _run(_get_file, file_unique_id)
+
+
+def _add_file(conn, file_unique_id, sha256, path, size):
+    with conn:
+        row = conn.execute(
+            """INSERT INTO files (file_unique_id, sha256, path, size) VALUES (?, ?, ?, ?)
+               ON CONFLICT(file_unique_id) DO UPDATE SET
+                   sha256=excluded.sha256, path=excluded.path, size=excluded.size RETURNING *""",
+            (file_unique_id, sha256, path, size),
+        ).fetchone()
+    return _row(row)
+
+
+async def add_file(file_unique_id, sha256, path, size):
+    return await _run(_add_file, file_unique_id, sha256, path, size)
+
+
+def _attach_file(conn, task_id, file_unique_id, file_name, added_by):
+    with conn:
+        cur = conn.execute(
+            "INSERT OR IGNORE INTO task_files (task_id, file_unique_id, file_name, added_by) VALUES (?, ?, ?, ?)",
+            (task_id, file_unique_id, file_name, added_by),
         )
+        if not cur.rowcount:
+            return None
+        row = conn.execute(
+            "UPDATE tasks SET file_count=file_count+1, updated_at=? WHERE task_id=? RETURNING *",
+            (_now(), task_id),
+        ).fetchone()
+    return _row(row)
+
+
+async def attach_file(task_id, file_unique_id, file_name, added_by=None):
+    """Link a stored file to a task; returns the updated task, or None if it was already attached."""
+    return await _run(_attach_file, task_id, file_unique_id, file_name, added_by)
+
+
+def _get_task_files(conn, task_id):
+    rows = conn.execute(
+        """SELECT tf.*, f.sha256, f.path, f.size FROM task_files tf
+           JOIN files f USING (file_unique_id) WHERE tf.task_id=? ORDER BY tf.added_at""",
+        (task_id,),
+    ).fetchall()
+    return [dict(r) for r in rows]
+
+
+async def get_task_files(task_id):
+    return await _run(_get_task_files, task_id)
+
+
+def _get_task_files_size(conn, task_id):
+    return conn.execute(
+        "SELECT COALESCE(SUM(f.size), 0) FROM task_files tf JOIN files f USING (file_unique_id) WHERE tf.task_id=?",
+        (task_id,),
+    ).fetchone()[0]
+
 
+async def get_task_files_size(task_id):
+    return await _run(_get_task_files_size, task_id)
 
-def get_task_by_message(chat_id, message_id):
-    with get_conn() as conn:
+
+def _get_storage_usage(conn, top=5):
+    # Several file_unique_ids can share one blob (same sha256): count each blob once.
+    blobs, stored = conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM (SELECT MAX(size) AS size FROM files GROUP BY sha256)"
+    ).fetchone()
+    links, referenced = conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(f.size), 0) FROM task_files JOIN files f USING (file_unique_id)"
+    ).fetchone()
+    top_tasks = conn.execute(
+        """SELECT tf.task_id, COUNT(*) AS files, SUM(f.size) AS bytes FROM task_files tf
+           JOIN files f USING (file_unique_id) GROUP BY tf.task_id ORDER BY bytes DESC LIMIT ?""",
+        (top,),
+    ).fetchall() if top else []
+    return {
+        "blobs": blobs,
+        "stored_bytes": stored,
+        "attachments": links,
+        "referenced_bytes": referenced,
+        "top_tasks": [dict(r) for r in top_tasks],
+    }
+
+
+async def get_storage_usage(top=5):
+    """Blob count and bytes on disk vs. bytes referenced by tasks, plus the largest tasks."""
+    return await _run(_get_storage_usage, top)
+
+
+def _add_pending_download(conn, task_id, file_id, file_unique_id, file_name, added_by, chat_id, reply_message_id):
+    with conn:
         row = conn.execute(
-            "SELECT * FROM tasks WHERE chat_id=? AND message_id=?",
-            (chat_id, message_id),
+            """INSERT INTO pending_downloads
+                   (task_id, file_id, file_unique_id, file_name, added_by, chat_id, reply_message_id)
+               VALUES (?, ?, ?, ?, ?, ?, ?) RETURNING *""",
+            (task_id, file_id, file_unique_id, file_name, added_by, chat_id, reply_message_id),
         ).fetchone()
-        return dict(row) if row else None
-
-
-def get_open_tasks(department=None, creator=None):
-    with get_conn() as conn:
-        if department:
-            rows = conn.execute(
-                "SELECT * FROM tasks WHERE status != 'Done' AND department=? ORDER BY task_id DESC",
-                (department.upper(),),
-            ).fetchall()
-        elif creator:
-            rows = conn.execute(
-                "SELECT * FROM tasks WHERE status != 'Done' AND creator=? ORDER BY task_id DESC",
-                (creator,),
-            ).fetchall()
-        else:
-            rows = conn.execute(
-                "SELECT * FROM tasks WHERE status != 'Done' ORDER BY task_id DESC"
-            ).fetchall()
-        return [dict(r) for r in rows]
+    return _row(row)
+
+
+async def add_pending_download(task_id, file_id, file_unique_id, file_name, added_by, chat_id, reply_message_id):
+    return await _run(
+        _add_pending_download, task_id, file_id, file_unique_id, file_name, added_by, chat_id, reply_message_id
+    )
+
+
+def _get_pending_downloads(conn):
+    return [dict(r) for r in conn.execute("SELECT * FROM pending_downloads ORDER BY id").fetchall()]
+
+
+async def get_pending_downloads():
+    return await _run(_get_pending_downloads)
+
+
+def _fail_pending_download(conn, download_id, error):
+    with conn:
+        row = conn.execute(
+            "UPDATE pending_downloads SET attempts=attempts+1, error=? WHERE id=? RETURNING *",
+            (error, download_id),
+        ).fetchone()
+    return _row(row)
+
+
+async def fail_pending_download(download_id, error):
+    """Count a failed attempt; returns the updated row."""
+    return await _run(_fail_pending_download, download_id, error)
+
+
+def _delete_pending_download(conn, download_id):
+    with conn:
+        conn.execute("DELETE FROM pending_downloads WHERE id=?", (download_id,))
+
+
+async def delete_pending_download(download_id):
+    await _run(_delete_pending_download, download_id)
+
+
+def _get_task_by_message(conn, chat_id, message_id):
+    row = conn.execute(
+        "SELECT * FROM tasks WHERE chat_id=? AND message_id=?",
+        (chat_id, message_id),
+    ).fetchone()
+    return _row(row)
+
+
+async def get_task_by_message(chat_id, message_id):
+    return await _run(_get_task_by_message, chat_id, message_id)
 
 
-def get_all_open_tasks():
-    return get_open_tasks()
+def _get_open_tasks(conn, department=None, creator=None, before_id=None, after_id=None, limit=None):
+    where = ["status != 'Done'"]
+    params = []
+    if department:
+        where.append("department=?")
+        params.append(department.upper())
+    elif creator:
+        where.append("creator=?")
+        params.append(creator)
+    # Keyset pagination: before_id pages towards older tasks, after_id towards newer ones.
+    if before_id is not None:
+        where.append("task_id < ?")
+        params.append(before_id)
+    elif after_id is not None:
+        where.append("task_id > ?")
+        params.append(after_id)
+    order = "ASC" if after_id is not None and before_id is None else "DESC"
+    sql = f"SELECT * FROM tasks WHERE {' AND '.join(where)} ORDER BY task_id {order}"
+    if limit:
+        sql += " LIMIT ?"
+        params.append(limit)
+    rows = [dict(r) for r in conn.execute(sql, params).fetchall()]
+    if order == "ASC":
+        rows.reverse()
+    return rows
 
 
-def log_announcement(sender, message):
-    with get_conn() as conn:
+async def get_open_tasks(department=None, creator=None, before_id=None, after_id=None, limit=None):
+    """Not-Done tasks, newest first. With limit, before_id/after_id select the page older/newer than that id."""
+    return await _run(_get_open_tasks, department, creator, before_id, after_id, limit)
+
+
+async def get_all_open_tasks():
+    return await get_open_tasks()
+
+
+SLA_STATUSES = ("Open", "InProgress")
+
+
+def _get_sla_tasks(conn):
+    rows = conn.execute(
+        "SELECT task_id, department, status, created_at, updated_at FROM tasks "
+        "WHERE status IN ('Open', 'InProgress') ORDER BY created_at"
+    ).fetchall()
+    return [dict(r) for r in rows]
+
+
+async def get_sla_tasks():
+    """Tasks whose SLA clock is running (Open/InProgress), oldest first."""
+    return await _run(_get_sla_tasks)
+
+
+def _escalate_overdue(conn, task_id):
+    with conn:
+        row = conn.execute(
+            "UPDATE tasks SET status='Escalated', updated_at=? "
+            "WHERE task_id=? AND status IN ('Open', 'InProgress') RETURNING *",
+            (_now(), task_id),
+        ).fetchone()
+    return _row(row)
+
+
+async def escalate_overdue(task_id):
+    """Escalate the task if it is still Open/InProgress; returns the new row, or None if it moved on."""
+    return await _run(_escalate_overdue, task_id)
+
+
+def _get_archivable_tasks(conn, before, limit):
+    tasks = [dict(r) for r in conn.execute(
+        "SELECT * FROM tasks WHERE status='Done' AND updated_at < ? ORDER BY updated_at LIMIT ?", (before, limit)
+    )]
+    for task in tasks:
+        task["files"] = [dict(r) for r in conn.execute(
+            "SELECT file_unique_id, file_name, added_by, added_at FROM task_files WHERE task_id=?", (task["task_id"],)
+        )]
+    return tasks
+
+
+async def get_archivable_tasks(before, limit=1000):
+    """Done tasks last updated before `before` (UTC 'YYYY-MM-DD HH:MM:SS'), oldest first, each with its files."""
+    return await _run(_get_archivable_tasks, before, limit)
+
+
+def _delete_archived_tasks(conn, tasks):
+    """Delete the archived rows of tasks still Done and unchanged since (a task reopened, or reopened
+    and done again, stays); returns the deleted ids."""
+    deleted = []
+    with conn:
+        for task in tasks:
+            task_id = task["task_id"]
+            if conn.execute(
+                "DELETE FROM tasks WHERE task_id=? AND status='Done' AND updated_at=?", (task_id, task["updated_at"])
+            ).rowcount:
+                conn.execute("DELETE FROM task_files WHERE task_id=?", (task_id,))
+                conn.execute("DELETE FROM pending_downloads WHERE task_id=?", (task_id,))
+                deleted.append(task_id)
+    return deleted
+
+
+async def delete_archived_tasks(tasks):
+    """tasks: the rows from get_archivable_tasks that were written to the archive."""
+    return await _run(_delete_archived_tasks, list(tasks))
+
+
+def _delete_tickets(conn, ticket_ids):
+    with conn:
+        conn.executemany(TICKET_DELETE, ((tid,) for tid in ticket_ids))
+
+
+async def delete_tickets(ticket_ids):
+    """Drop archived tickets from the SQLite mirror (and tickets_fts)."""
+    await _run(_delete_tickets, list(ticket_ids))
+
+
+def _add_archive_index(conn, kind, entries):
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO archive_index (kind, item_id, partition) VALUES (?, ?, ?)",
+            ((kind, str(item_id), partition) for item_id, partition in entries),
+        )
+
+
+async def add_archive_index(kind, entries):
+    """entries: (item_id, partition file name) pairs, one transaction."""
+    await _run(_add_archive_index, kind, list(entries))
+
+
+def _get_archive_partition(conn, kind, item_id):
+    row = conn.execute(
+        "SELECT partition FROM archive_index WHERE kind=? AND item_id=?", (kind, str(item_id))
+    ).fetchone()
+    return row[0] if row else None
+
+
+async def get_archive_partition(kind, item_id):
+    return await _run(_get_archive_partition, kind, item_id)
+
+
+def _get_open_counts(conn, department):
+    rows = conn.execute(
+        "SELECT status, n FROM task_status_counts WHERE department=? AND status != 'Done' AND n > 0",
+        (department.upper(),),
+    ).fetchall()
+    return {status: n for status, n in rows}
+
+
+async def get_open_counts(department):
+    """{status: count} of not-Done tasks in one department."""
+    return await _run(_get_open_counts, department)
+
+
+def _get_report(conn, department, since):
+    where, args = ("department=? AND ", [department.upper()]) if department else ("", [])
+    days = ("day >= ?", since) if since else ("day = ?", "*")  # '*' sorts before every date
+    counts = {}
+    for status, n in conn.execute(
+        f"SELECT status, SUM(n) FROM task_status_counts WHERE {where}n > 0 GROUP BY status", args
+    ):
+        counts[status] = n
+    row = conn.execute(
+        "SELECT COALESCE(SUM(created), 0), COALESCE(SUM(done), 0), COALESCE(SUM(escalated), 0),"
+        f" COALESCE(SUM(resolve_seconds), 0) FROM task_stats WHERE {where}{days[0]}",
+        (*args, days[1]),
+    ).fetchone()
+    histogram = [0] * len(RESOLUTION_BUCKETS)
+    for bucket, n in conn.execute(
+        f"SELECT bucket, SUM(n) FROM task_resolution WHERE {where}{days[0]} GROUP BY bucket", (*args, days[1])
+    ):
+        histogram[bucket] = n
+    return {
+        "counts": counts, "created": row[0], "done": row[1], "escalated": row[2],
+        "resolve_seconds": row[3], "histogram": histogram,
+    }
+
+
+async def get_report(department=None, since=None):
+    """Counters from the task_stats tables: current {status: count}, plus created/done/escalated and the
+    resolution histogram over days >= since ('YYYY-MM-DD', UTC) or all time. Cost depends on the number
+    of days, not of tasks."""
+    return await _run(_get_report, department, since)
+
+
+def _get_dashboard_message(conn, department):
+    row = conn.execute("SELECT * FROM dashboard_messages WHERE department=?", (department,)).fetchone()
+    return _row(row)
+
+
+async def get_dashboard_message(department):
+    return await _run(_get_dashboard_message, department)
+
+
+def _set_dashboard_message(conn, department, chat_id, message_id):
+    with conn:
         conn.execute(
-            "INSERT INTO announcements (sender, message) VALUES (?, ?)",
+            """INSERT INTO dashboard_messages (department, chat_id, message_id) VALUES (?, ?, ?)
+               ON CONFLICT(department) DO UPDATE SET chat_id=excluded.chat_id, message_id=excluded.message_id""",
+            (department, chat_id, message_id),
+        )
+
+
+async def set_dashboard_message(department, chat_id, message_id):
+    await _run(_set_dashboard_message, department, chat_id, message_id)
+
+
+def _log_announcement(conn, sender, message):
+    with conn:
+        row = conn.execute(
+            "INSERT INTO announcements (sender, message) VALUES (?, ?) RETURNING *",
             (sender, message),
+        ).fetchone()
+    return _row(row)
+
+
+async def log_announcement(sender, message):
+    return await _run(_log_announcement, sender, message)
+
+
+def _record_deliveries(conn, announcement_id, results):
+    """results: iterable of (chat_id, status, attempts, latency_ms, message_id, error)."""
+    now = _now()
+    with conn:
+        conn.executemany(
+            """INSERT INTO announcement_deliveries
+                   (announcement_id, chat_id, status, attempts, latency_ms, message_id, error, updated_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT(announcement_id, chat_id) DO UPDATE SET
+                   status=excluded.status, attempts=excluded.attempts, latency_ms=excluded.latency_ms,
+                   message_id=excluded.message_id, error=excluded.error, updated_at=excluded.updated_at""",
+            [(announcement_id, *r, now) for r in results],
         )
+
+
+async def record_deliveries(announcement_id, results):
+    await _run(_record_deliveries, announcement_id, list(results))
+
+
+def _get_failed_deliveries(conn, announcement_id):
+    rows = conn.execute(
+        "SELECT * FROM announcement_deliveries WHERE announcement_id=? AND status='failed'",
+        (announcement_id,),
+    ).fetchall()
+    return [dict(r) for r in rows]
+
+
+async def get_failed_deliveries(announcement_id):
+    return await _run(_get_failed_deliveries, announcement_id)
+
+
+def _get_pending_deliveries(conn, max_attempts):
+    rows = conn.execute(
+        "SELECT d.announcement_id, d.chat_id, d.attempts, a.sender, a.message "
+        "FROM announcement_deliveries d JOIN announcements a ON a.id = d.announcement_id "
+        "WHERE d.status='failed' AND d.attempts < ? ORDER BY d.announcement_id",
+        (max_attempts,),
+    ).fetchall()
+    return [dict(r) for r in rows]
+
+
+async def get_pending_deliveries(max_attempts):
+    """Failed deliveries with retries left (idx_deliveries_failed), with their announcement; for resuming at startup."""
+    return await _run(_get_pending_deliveries, max_attempts)
+
+
+def _load_conversations(conn, now):
+    rows = conn.execute("SELECT * FROM conversations WHERE expires_at > ?", (now,)).fetchall()
+    return [dict(r) for r in rows]
+
+
+async def load_conversations(now):
+    """Unexpired conversation rows."""
+    return await _run(_load_conversations, now)
+
+
+def _save_conversations(conn, upserts, deletes):
+    with conn:
+        conn.executemany(
+            """INSERT INTO conversations (user_id, step, draft, expires_at) VALUES (?, ?, ?, ?)
+               ON CONFLICT(user_id) DO UPDATE SET
+                   step=excluded.step, draft=excluded.draft, expires_at=excluded.expires_at""",
+            upserts,
+        )
+        conn.executemany("DELETE FROM conversations WHERE user_id=?", [(uid,) for uid in deletes])
+
+
+async def save_conversations(upserts, deletes):
+    """One transaction: upserts are (user_id, step, draft, expires_at), deletes are user ids."""
+    await _run(_save_conversations, list(upserts), list(deletes))
+
+
+def _delete_expired_conversations(conn, now):
+    with conn:
+        return conn.execute("DELETE FROM conversations WHERE expires_at <= ?", (now,)).rowcount
+
+
+async def delete_expired_conversations(now):
+    return await _run(_delete_expired_conversations, now)
+
+
+TICKET_UPSERT = """
+INSERT INTO tickets (ticket_id, department, status, created_at, data) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT(ticket_id) DO UPDATE SET
+    department=excluded.department, status=excluded.status,
+    created_at=excluded.created_at, data=excluded.data
+"""
+TICKET_DELETE = "DELETE FROM tickets WHERE ticket_id=?"
+
+
+def ticket_row(ticket):
+    return (
+        ticket["ticket_id"],
+        ticket.get("department"),
+        ticket.get("status"),
+        ticket.get("created_at"),
+        json.dumps(ticket, ensure_ascii=False, separators=(",", ":")),
+    )
+
+
+def _upsert_tickets(conn, tickets):
+    with conn:
+        conn.executemany(TICKET_UPSERT, [ticket_row(t) for t in tickets])
+
+
+async def upsert_tickets(tickets):
+    """Mirror bot.py tickets into the tickets table (feeds tickets_fts)."""
+    await _run(_upsert_tickets, list(tickets))
+
+
+def _count_tickets(conn):
+    return conn.execute("SELECT COUNT(*) FROM tickets").fetchone()[0]
+
+
+async def count_tickets():
+    return await _run(_count_tickets)
+
+
+# bm25 ranking runs over at most this many newest matches per index, which keeps
+# the cost of very common words bounded however large the history gets.
+SEARCH_WINDOW = 500
+
+
+def fts_query(terms):
+    """User words -> FTS5 query: each word a quoted term, all required."""
+    words = [w.replace('"', '""') for w in terms.split() if w.strip('"')]
+    return " ".join(f'"{w}"' for w in words)
+
+
+def _search(conn, terms, limit=10, offset=0):
+    query = fts_query(terms)
+    if not query:
+        return []
+    # Newest SEARCH_WINDOW matches from each index (rowid order stops early), ranked by
+    # bm25 (the fts5 rank column); details are joined for the returned page only.
+    rows = conn.execute(
+        """
+        SELECT kind, ref, rank FROM (
+            SELECT * FROM (
+                SELECT 'task' AS kind, rowid AS ref, rank FROM tasks_fts
+                WHERE tasks_fts MATCH :q ORDER BY rowid DESC LIMIT :window
+            )
+            UNION ALL
+            SELECT * FROM (
+                SELECT 'ticket' AS kind, ticket_id AS ref, rank FROM tickets_fts
+                WHERE tickets_fts MATCH :q ORDER BY rowid DESC LIMIT :window
+            )
+        ) ORDER BY rank LIMIT :limit OFFSET :offset
+        """,
+        {"q": query, "window": SEARCH_WINDOW, "limit": limit, "offset": offset},
+    ).fetchall()
+    results = []
+    for kind, ref, _rank in rows:
+        if kind == "task":
+            row = conn.execute(
+                "SELECT task_id, department, status, description AS text FROM tasks WHERE task_id=?", (ref,)
+            ).fetchone()
+        else:
+            row = conn.execute(
+                "SELECT ticket_id, department, status, json_extract(data, '$.message_text') AS text "
+                "FROM tickets WHERE ticket_id=?",
+                (ref,),
+            ).fetchone()
+        if row:
+            results.append({"kind": kind, **dict(row)})
+    return results
+
+
+async def search(terms, limit=10, offset=0):
+    """Ranked matches over task descriptions and ticket texts: [{kind, task_id|ticket_id, department, status, text}]."""
+    return await _run(_search, terms, limit, offset)
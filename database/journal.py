@@ -0,0 +1,241 @@
+"""
+Append-only journal storage for the bot.py ticket flow.
+
+On disk (next to the data file, e.g. tickets.json):
+- tickets.json          compact snapshot {"tickets": {...}, "daily_counter": {...}, "journal_seq": N}
+- tickets.json.<seq>.log one compact JSON record per line, appended on every mutation
+                        ({"t": ticket}, {"c": [day, n]}, or {"d": ticket_id} when a ticket is archived)
+
+State = snapshot + every segment with seq > journal_seq, replayed in order.
+Each write appends one line, so its cost does not depend on how many tickets
+the store holds. Once the journal outgrows the live data it is folded back
+into the snapshot on a background thread.
+"""
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+
+logger = logging.getLogger("topping_bot.journal")
+
+# Fold the journal into the snapshot after this many records, or after as many
+# records as there are live tickets, whichever is larger (keeps compaction amortized O(1)).
+COMPACT_MIN_RECORDS = 10_000
+
+
+def _dumps(obj) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+class TicketJournal:
+    """In-memory index ticket_id -> latest record, backed by snapshot + append-only log."""
+
+    def __init__(self, path: Path, compact_min_records: int = COMPACT_MIN_RECORDS):
+        self.path = Path(path)
+        self.compact_min_records = compact_min_records
+        self.counters: dict = {}
+        self._index: dict = {}  # ticket_id -> compact JSON string of the latest state
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._fh = None
+        self._records = 0  # records appended since the last snapshot
+        self._compacting = False
+        self._compact_thread = None
+
+    # -- open / replay -------------------------------------------------------
+    def _segment(self, seq: int) -> Path:
+        return self.path.with_name(f"{self.path.name}.{seq}.log")
+
+    def segments(self, after: int = 0):
+        """Journal segment paths with seq > after, in replay order."""
+        return [self._segment(seq) for seq in self._segments() if seq > after]
+
+    def _segments(self):
+        prefix = self.path.name + "."
+        seqs = []
+        for p in self.path.parent.glob(f"{self.path.name}.*.log"):
+            middle = p.name[len(prefix):-len(".log")]
+            if middle.isdigit():
+                seqs.append(int(middle))
+        return sorted(seqs)
+
+    def open(self) -> None:
+        """Load snapshot, replay journal segments, start a fresh segment."""
+        base_seq = 0
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                snap = json.load(f)
+            self._index = {tid: _dumps(t) for tid, t in (snap.get("tickets") or {}).items()}
+            self.counters = dict(snap.get("daily_counter") or {})
+            base_seq = int(snap.get("journal_seq", 0))
+
+        seqs = self._segments()
+        for seq in seqs:
+            if seq <= base_seq:
+                # Already folded into the snapshot; compaction died before cleanup.
+                self._segment(seq).unlink(missing_ok=True)
+                continue
+            self._records += self._replay(self._segment(seq))
+
+        self._seq = max([base_seq] + seqs) + 1
+        self._fh = open(self._segment(self._seq), "a", encoding="utf-8")
+        logger.info(
+            "Ticket journal opened: %d tickets, %d journal records replayed",
+            len(self._index), self._records,
+        )
+
+    def _replay(self, seg: Path) -> int:
+        n = 0
+        with open(seg, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    # Torn tail from a crash mid-append; everything before it is intact.
+                    logger.warning("Skipping corrupt journal record in %s", seg.name)
+                    continue
+                self._apply(rec)
+                n += 1
+        return n
+
+    def _apply(self, rec: dict) -> None:
+        if "t" in rec:
+            t = rec["t"]
+            self._index[t["ticket_id"]] = _dumps(t)
+        elif "c" in rec:
+            day, n = rec["c"]
+            self.counters[day] = n
+        elif "d" in rec:
+            self._index.pop(rec["d"], None)
+
+    # -- reads ---------------------------------------------------------------
+    def get(self, ticket_id: str):
+        raw = self._index.get(ticket_id)
+        return json.loads(raw) if raw is not None else None
+
+    def __contains__(self, ticket_id) -> bool:
+        return ticket_id in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def finished_before(self, statuses, cutoff: str) -> list:
+        """Tickets in one of `statuses` last changed before `cutoff` (ISO string); O(n), for the archive job."""
+        needles = tuple(f'"status":{_dumps(s)}' for s in statuses)
+        found = []
+        for raw in list(self._index.values()):
+            if not any(n in raw for n in needles):
+                continue  # skip parsing the (usually many) tickets that cannot match
+            t = json.loads(raw)
+            if t.get("status") in statuses and (t.get("updated_at") or t.get("created_at") or "")[:19] < cutoff[:19]:
+                found.append(t)
+        return found
+
+    def document(self) -> dict:
+        """Full {"tickets", "daily_counter"} document (O(n); not for hot paths)."""
+        return {
+            "tickets": {tid: json.loads(raw) for tid, raw in list(self._index.items())},
+            "daily_counter": dict(self.counters),
+        }
+
+    # -- writes --------------------------------------------------------------
+    def append(self, tickets=(), counters=(), deletes=()) -> int:
+        """Append one record per ticket / (day, n) counter / deleted ticket id; returns bytes written."""
+        lines = []
+        with self._lock:
+            for t in tickets:
+                raw = _dumps(t)
+                self._index[t["ticket_id"]] = raw
+                lines.append('{"t":' + raw + "}\n")
+            for day, n in counters:
+                self.counters[day] = n
+                lines.append(_dumps({"c": [day, n]}) + "\n")
+            for ticket_id in deletes:
+                if self._index.pop(ticket_id, None) is not None:
+                    lines.append(_dumps({"d": ticket_id}) + "\n")
+            if not lines:
+                return 0
+            chunk = "".join(lines)
+            self._fh.write(chunk)
+            self._fh.flush()
+            self._records += len(lines)
+            due = self._records >= max(self.compact_min_records, len(self._index))
+        if due:
+            self.compact_in_background()
+        return len(chunk.encode("utf-8"))
+
+    def replace(self, data: dict) -> None:
+        """Replace the whole store with `data` and write a fresh snapshot."""
+        with self._lock:
+            self._index = {tid: _dumps(t) for tid, t in (data.get("tickets") or {}).items()}
+            self.counters = dict(data.get("daily_counter") or {})
+        self.compact()
+
+    # -- compaction ----------------------------------------------------------
+    def compact_in_background(self) -> None:
+        with self._lock:
+            if self._compacting:
+                return
+            self._compacting = True
+        self._compact_thread = threading.Thread(target=self._compact_claimed, name="journal-compact", daemon=True)
+        self._compact_thread.start()
+
+    def compact(self) -> None:
+        """Fold every closed segment into a new snapshot (waits for a running background pass)."""
+        running = self._compact_thread
+        if running is not None and running is not threading.current_thread():
+            running.join()
+        with self._lock:
+            if self._compacting:
+                return
+            self._compacting = True
+        self._compact_claimed()
+
+    def _compact_claimed(self) -> None:
+        try:
+            with self._lock:
+                # Rotate: new appends go to a fresh segment while the snapshot is written.
+                covered = self._seq
+                self._fh.close()
+                self._seq += 1
+                self._fh = open(self._segment(self._seq), "a", encoding="utf-8")
+                self._records = 0
+                index = self._index.copy()
+                counters = dict(self.counters)
+            self._write_snapshot(index, counters, covered)
+            for seq in self._segments():
+                if seq <= covered:
+                    self._segment(seq).unlink(missing_ok=True)
+        except Exception:
+            logger.exception("Journal compaction failed")
+        finally:
+            with self._lock:
+                self._compacting = False
+
+    def _write_snapshot(self, index: dict, counters: dict, covered: int) -> None:
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write('{"tickets":{')
+            first = True
+            for tid, raw in index.items():
+                if not first:
+                    f.write(",")
+                f.write(_dumps(tid) + ":" + raw)
+                first = False
+            f.write('},"daily_counter":' + _dumps(counters))
+            f.write(',"journal_seq":' + str(covered) + "}")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        logger.info("Ticket journal compacted: %d tickets (segments <= %d folded)", len(index), covered)
+
+    def close(self) -> None:
+        if self._compact_thread is not None:
+            self._compact_thread.join()
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
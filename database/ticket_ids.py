@@ -0,0 +1,69 @@
+"""
+Ticket ID allocator: PREFIX-YYYYMMDD-NNNN, one counter per UTC day shared by all prefixes.
+
+IDs are issued from memory under an asyncio lock. Only a reserved high-water
+mark is persisted (atomic write + fsync), once per block of IDs, so issuing an
+ID is O(1) and almost never touches disk. After a crash the counter resumes
+from the reserved mark: IDs may skip a few numbers but are never reused.
+The file holds the current day only, so old days are pruned automatically.
+"""
+import asyncio
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+RESERVE_BLOCK = 32
+
+
+def _today() -> str:
+    return datetime.utcnow().strftime("%Y%m%d")
+
+
+class TicketIdAllocator:
+    def __init__(self, path: Path, block: int = RESERVE_BLOCK):
+        self.path = Path(path)
+        self.block = block
+        self._day = None
+        self._issued = 0
+        self._reserved = 0
+        self._lock = asyncio.Lock()
+
+    def _read_sync(self):
+        if not self.path.exists():
+            return None, 0
+        with open(self.path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        return state.get("day"), int(state.get("reserved", 0))
+
+    def _write_sync(self, day: str, reserved: int) -> None:
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"day": day, "reserved": reserved}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    async def load(self, legacy_counters: dict | None = None) -> None:
+        """Resume today's counter; `legacy_counters` is the old tickets.json daily_counter map."""
+        day, reserved = await asyncio.to_thread(self._read_sync)
+        today = _today()
+        issued = reserved if day == today else 0
+        if legacy_counters:
+            issued = max(issued, int(legacy_counters.get(today, 0)))
+        self._day = today
+        self._issued = issued
+        self._reserved = issued
+
+    async def next_id(self, prefix: str) -> str:
+        async with self._lock:
+            today = _today()
+            if today != self._day:
+                self._day, self._issued, self._reserved = today, 0, 0
+            n = self._issued + 1
+            if n > self._reserved:
+                reserved = self._issued + self.block
+                await asyncio.to_thread(self._write_sync, today, reserved)
+                self._reserved = reserved
+            self._issued = n
+        return f"{prefix}-{today}-{str(n).zfill(4)}"
@@ -0,0 +1,103 @@
+"""
+In-memory ticket repository with write-behind flushing.
+
+Reads are served from memory (pending changes first, then the journal index).
+put() only marks a ticket dirty; flush() writes every dirty ticket to the
+journal in one append, so a burst of updates to the same ticket costs one
+record and a burst across tickets costs one disk write.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime
+
+from database.journal import TicketJournal
+from utils import metrics
+
+logger = logging.getLogger("topping_bot.tickets")
+
+
+class TicketRepository:
+    def __init__(self, journal: TicketJournal, flush_interval: float = 2.0, mirror=None):
+        self.journal = journal
+        self.flush_interval = flush_interval
+        self.mirror = mirror  # optional async callable(batch) run after each flush, e.g. db.upsert_tickets
+        self._dirty: dict = {}  # ticket_id -> live ticket dict awaiting flush
+        self._flush_lock = asyncio.Lock()
+
+    async def load(self) -> None:
+        """Replay the journal once at startup."""
+        await asyncio.to_thread(self.journal.open)
+
+    def get(self, ticket_id: str):
+        ticket = self._dirty.get(ticket_id)
+        if ticket is not None:
+            return ticket
+        return self.journal.get(ticket_id)
+
+    def put(self, ticket: dict) -> None:
+        """Record a new or changed ticket; written on the next flush. Stamps updated_at (card cache version)."""
+        ticket["updated_at"] = datetime.utcnow().isoformat() + "Z"
+        self._dirty[ticket["ticket_id"]] = ticket
+
+    @property
+    def pending(self) -> int:
+        return len(self._dirty)
+
+    async def flush(self) -> int:
+        """Append all dirty tickets to the journal in one write; returns bytes written."""
+        async with self._flush_lock:
+            if not self._dirty:
+                return 0
+            # Copy on the event loop so handlers can keep mutating their dicts
+            # while the writer thread serializes.
+            batch = [dict(t) for t in self._dirty.values()]
+            self._dirty.clear()
+            started = time.perf_counter()
+            try:
+                written = await asyncio.to_thread(self.journal.append, batch)
+            except Exception:
+                metrics.inc("topping_storage_errors_total", op="journal_append")
+                # Put them back unless a newer version arrived meanwhile.
+                for t in batch:
+                    self._dirty.setdefault(t["ticket_id"], t)
+                raise
+            finally:
+                metrics.observe("topping_storage_seconds", time.perf_counter() - started, op="journal_append")
+            if self.mirror is not None:
+                # The journal is the source of truth; a failed mirror only lags until the next write.
+                try:
+                    await self.mirror(batch)
+                except Exception:
+                    logger.exception("Ticket mirror failed for %d tickets", len(batch))
+            return written
+
+    async def delete(self, tickets) -> list:
+        """Drop tickets from the store in one journal append; returns the ids dropped.
+        `tickets` are the copies the caller read (and archived); any ticket changed
+        since (pending in _dirty, or flushed with a different updated_at/status) is kept."""
+        async with self._flush_lock:
+            # Under the flush lock the journal cannot change between this check and the append.
+            ids = []
+            for t in tickets:
+                tid = t["ticket_id"]
+                if tid in self._dirty:
+                    continue
+                current = self.journal.get(tid)
+                if current is None or (current.get("updated_at"), current.get("status")) != (t.get("updated_at"), t.get("status")):
+                    continue
+                ids.append(tid)
+            if ids:
+                await asyncio.to_thread(self.journal.append, deletes=ids)
+        return ids
+
+    async def flush_job(self, context) -> None:
+        """JobQueue callback for the periodic flush."""
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Ticket flush failed; will retry on next interval")
+
+    async def close(self) -> None:
+        await self.flush()
+        await asyncio.to_thread(self.journal.close)
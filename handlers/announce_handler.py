@@ -1,7 +1,14 @@
+import asyncio
+import logging
 import os
+import time
 from telegram import Update
+from telegram.error import BadRequest, Forbidden
 from telegram.ext import ContextTypes
 from database import db
+from utils.outbound import PRIORITY_NOTICE, outbound
+
+logger = logging.getLogger("topping_bot.announce")
 
 TASKS_HUB_CHAT_ID = int(os.getenv("TASKS_HUB_CHAT_ID", "0"))
 GM_DASHBOARD_CHAT_ID = int(os.getenv("GM_DASHBOARD_CHAT_ID", "0"))
@@ -10,6 +17,95 @@ GENERAL_GROUP_CHAT_ID = int(os.getenv("GENERAL_GROUP_CHAT_ID", "0"))
 ALLOWED_ANNOUNCE_CHATS = {TASKS_HUB_CHAT_ID, GM_DASHBOARD_CHAT_ID}
 
 
+def _parse_chat_ids(raw):
+    ids = []
+    for part in (raw or "").replace(";", ",").split(","):
+        part = part.strip()
+        if part:
+            try:
+                ids.append(int(part))
+            except ValueError:
+                logger.warning("Ignoring invalid chat id in ANNOUNCE_CHAT_IDS: %r", part)
+    return ids
+
+
+# Comma-separated target chat ids; defaults to the hub, general and GM groups.
+ANNOUNCE_CHAT_IDS = _parse_chat_ids(os.getenv("ANNOUNCE_CHAT_IDS")) or [
+    TASKS_HUB_CHAT_ID, GENERAL_GROUP_CHAT_ID, GM_DASHBOARD_CHAT_ID,
+]
+ANNOUNCE_CONCURRENCY = int(os.getenv("ANNOUNCE_CONCURRENCY", "8"))
+ANNOUNCE_MAX_ATTEMPTS = int(os.getenv("ANNOUNCE_MAX_ATTEMPTS", "5"))
+ANNOUNCE_RETRY_DELAY = 30  # seconds, doubled after every retry round
+
+_retry_tasks = set()
+
+
+async def _deliver(bot, chat_id, text, sem, attempts):
+    """Send to one chat; returns a delivery row (chat_id, status, attempts, latency_ms, message_id, error).
+    status is "sent", "failed" (retried later) or "rejected" (bot removed, chat not found: never retried)."""
+    async with sem:
+        started = time.monotonic()
+        try:
+            sent = await outbound.send_message(bot, chat_id, text, priority=PRIORITY_NOTICE)
+        except (BadRequest, Forbidden) as e:
+            latency_ms = int(1000 * (time.monotonic() - started))
+            logger.warning("Announcement to chat %s rejected: %s", chat_id, e)
+            return chat_id, "rejected", attempts, latency_ms, None, f"{type(e).__name__}: {e}"[:500]
+        except Exception as e:
+            latency_ms = int(1000 * (time.monotonic() - started))
+            logger.warning("Announcement to chat %s failed (attempt %d): %s", chat_id, attempts, e)
+            return chat_id, "failed", attempts, latency_ms, None, f"{type(e).__name__}: {e}"[:500]
+        latency_ms = int(1000 * (time.monotonic() - started))
+        return chat_id, "sent", attempts, latency_ms, sent.message_id, None
+
+
+async def fan_out(bot, announcement_id, text, targets, attempts=1):
+    """Send to all targets concurrently (bounded), record every outcome; returns the result rows."""
+    sem = asyncio.Semaphore(ANNOUNCE_CONCURRENCY)
+    results = await asyncio.gather(*(_deliver(bot, chat_id, text, sem, attempts) for chat_id in targets))
+    await db.record_deliveries(announcement_id, results)
+    return results
+
+
+async def _retry_failed(bot, announcement_id, text):
+    delay = ANNOUNCE_RETRY_DELAY
+    while True:
+        await asyncio.sleep(delay)
+        failed = [
+            d for d in await db.get_failed_deliveries(announcement_id)
+            if d["attempts"] < ANNOUNCE_MAX_ATTEMPTS
+        ]
+        if not failed:
+            return
+        attempts = max(d["attempts"] for d in failed) + 1
+        results = await fan_out(bot, announcement_id, text, [d["chat_id"] for d in failed], attempts)
+        if all(r[1] != "failed" for r in results):
+            logger.info("Announcement %s: retries finished", announcement_id)
+            return
+        delay *= 2
+
+
+def _start_retries(bot, announcement_id, text) -> None:
+    task = asyncio.create_task(_retry_failed(bot, announcement_id, text))
+    _retry_tasks.add(task)
+    task.add_done_callback(_retry_tasks.discard)
+
+
+def _announcement_text(sender, msg) -> str:
+    return f"📢 Announcement from @{sender}:\n\n{msg}"
+
+
+async def resume_retries(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """JobQueue callback at startup: retry failed deliveries left over from before the restart."""
+    pending = {}
+    for d in await db.get_pending_deliveries(ANNOUNCE_MAX_ATTEMPTS):
+        pending.setdefault(d["announcement_id"], d)
+    for announcement_id, d in pending.items():
+        _start_retries(context.bot, announcement_id, _announcement_text(d["sender"], d["message"]))
+    if pending:
+        logger.info("Resumed retries for %d announcement(s)", len(pending))
+
+
 async def announce(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_chat.id not in ALLOWED_ANNOUNCE_CHATS:
         return
@@ -21,16 +117,19 @@ async def announce(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     user = update.effective_user
     sender = user.username or str(user.id)
-    db.log_announcement(sender, msg)
+    row = await db.log_announcement(sender, msg)
 
-    text = f"📢 Announcement from @{sender}:\n\n{msg}"
-    sent_count = 0
-    for chat_id in {TASKS_HUB_CHAT_ID, GENERAL_GROUP_CHAT_ID, GM_DASHBOARD_CHAT_ID}:
-        if chat_id and chat_id != update.effective_chat.id:
-            try:
-                await context.bot.send_message(chat_id, text)
-                sent_count += 1
-            except Exception:
-                pass
+    text = _announcement_text(sender, msg)
+    targets = [c for c in dict.fromkeys(ANNOUNCE_CHAT_IDS) if c and c != update.effective_chat.id]
+    results = await fan_out(context.bot, row["id"], text, targets)
+    sent_count = sum(1 for r in results if r[1] == "sent")
+    failed_count = sum(1 for r in results if r[1] == "failed")
+    rejected_count = len(results) - sent_count - failed_count
 
-    await update.message.reply_text(f"✅ Announcement sent to {sent_count} group(s).")
+    reply = f"✅ Announcement sent to {sent_count} group(s)."
+    if rejected_count:
+        reply += f" ❌ {rejected_count} rejected (bot removed or chat not found)."
+    if failed_count:
+        _start_retries(context.bot, row["id"], text)
+        reply += f" ⏳ {failed_count} failed; retrying in the background."
+    await update.message.reply_text(reply)
@@ -1,15 +1,21 @@
-import os
 from telegram import Update
 from telegram.ext import ContextTypes
 from database import db
 from utils.formatter import format_task_card, build_task_keyboard
-
-GM_DASHBOARD_CHAT_ID = int(os.getenv("GM_DASHBOARD_CHAT_ID", "0"))
+from utils.edits import edits
+from utils.locks import locks
+from handlers.dashboard import dashboard
+from handlers.sla import sla
 
 
 def parse_callback(data: str):
-    parts = data.split("_", 2)
-    return parts if len(parts) == 3 else (None, None, None)
+    """STATUS_<PROGRESS|DONE>_<id> -> (kind, action, id); ASSIGN_<id> / ESCALATE_<id> -> (kind, None, id)."""
+    parts = (data or "").split("_", 2)
+    if len(parts) == 3 and parts[0] == "STATUS" and parts[1] in ("PROGRESS", "DONE") and parts[2].isdigit():
+        return parts[0], parts[1], parts[2]
+    if len(parts) == 2 and parts[0] in ("ASSIGN", "ESCALATE") and parts[1].isdigit():
+        return parts[0], None, parts[1]
+    return None, None, None
 
 
 async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -17,38 +23,41 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await q.answer()
 
     kind, action, id_str = parse_callback(q.data)
-    if not id_str:
+    if kind is None:
         return
 
     task_id = int(id_str)
-    task = db.get_task(task_id)
-    if not task:
-        await q.answer("Task not found.", show_alert=True)
-        return
-
     user = update.effective_user
     username = user.username or str(user.id)
 
-    if kind == "STATUS":
-        new_status = "InProgress" if action == "PROGRESS" else "Done"
-        task = db.update_task_status(task_id, status=new_status)
-        gm_msg = f"{'✅' if new_status == 'Done' else '🟡'} TASK-{task_id:04d} → {new_status} (by @{username})"
+    # Read, update and render under the task's lock so the card matches the write;
+    # the edit itself goes through the coalescer afterwards.
+    async with locks(("task", task_id)):
+        task = await db.get_task(task_id)
+        if not task:
+            await q.answer("Task not found.", show_alert=True)
+            return
 
-    elif kind == "ASSIGN":
-        task = db.update_task_status(task_id, assigned_to=username)
-        gm_msg = f"👤 TASK-{task_id:04d} assigned to @{username}"
+        if kind == "STATUS":
+            new_status = "InProgress" if action == "PROGRESS" else "Done"
+            task = await db.update_task_status(task_id, status=new_status)
+            gm_msg = f"{'✅' if new_status == 'Done' else '🟡'} TASK-{task_id:04d} → {new_status} (by @{username})"
 
-    elif kind == "ESCALATE":
-        task = db.update_task_status(task_id, status="Escalated")
-        gm_msg = f"🚨 TASK-{task_id:04d} ESCALATED by @{username}"
+        elif kind == "ASSIGN":
+            task = await db.update_task_status(task_id, assigned_to=username)
+            gm_msg = f"👤 TASK-{task_id:04d} assigned to @{username}"
 
-    else:
-        return
+        elif kind == "ESCALATE":
+            task = await db.update_task_status(task_id, status="Escalated")
+            gm_msg = f"🚨 TASK-{task_id:04d} ESCALATED by @{username}"
+
+        else:
+            return
 
-    text = format_task_card(task)
+        text = format_task_card(task)
+        sla.track(task)
     keyboard = build_task_keyboard(task_id)
 
-    await q.edit_message_text(text, reply_markup=keyboard)
+    await edits.edit(context.bot, q.message.chat_id, q.message.message_id, text, reply_markup=keyboard)
 
-    if GM_DASHBOARD_CHAT_ID and GM_DASHBOARD_CHAT_ID != q.message.chat_id:
-        await context.bot.send_message(GM_DASHBOARD_CHAT_ID, gm_msg)
+    dashboard.record(context.bot, task["department"], gm_msg)
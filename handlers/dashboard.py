@@ -0,0 +1,97 @@
+"""
+Live GM dashboard: one pinned message per department in the GM chat.
+
+Handlers call record() for every task event. Departments with new events are
+re-rendered once per DASHBOARD_INTERVAL and their message is updated with a
+single (diff-aware) edit, so API calls per interval are bounded by the number
+of departments, not by the number of events.
+"""
+import asyncio
+import logging
+import os
+from collections import deque
+
+from telegram.error import BadRequest
+
+from database import db
+from utils.edits import edits
+from utils.formatter import DEPARTMENTS, STATUS_EMOJI
+from utils.outbound import PRIORITY_NOTICE, outbound
+
+logger = logging.getLogger("topping_bot.dashboard")
+
+GM_DASHBOARD_CHAT_ID = int(os.getenv("GM_DASHBOARD_CHAT_ID", "0"))
+DASHBOARD_INTERVAL = float(os.getenv("DASHBOARD_INTERVAL", "15"))  # seconds
+RECENT_EVENTS = 5
+
+
+class Dashboard:
+    def __init__(self, chat_id: int, interval: float = DASHBOARD_INTERVAL):
+        self.chat_id = chat_id
+        self.interval = interval
+        self.bot = None
+        self._events = {}  # department -> deque of recent event lines
+        self._dirty = set()
+        self._wake = None
+        self._loop_task = None
+
+    def record(self, bot, department: str, event: str) -> None:
+        """Queue an event line for a department's dashboard; rendered on the next batch."""
+        if not self.chat_id:
+            return
+        self.bot = bot
+        self._events.setdefault(department, deque(maxlen=RECENT_EVENTS)).appendleft(event)
+        self._dirty.add(department)
+        if self._loop_task is None or self._loop_task.done():
+            self._wake = asyncio.Event()
+            self._loop_task = asyncio.get_running_loop().create_task(self._run())
+        self._wake.set()
+
+    async def _run(self) -> None:
+        while True:
+            await self._wake.wait()
+            await asyncio.sleep(self.interval)  # let events pile up into one render
+            self._wake.clear()
+            dirty, self._dirty = self._dirty, set()
+            for department in dirty:
+                try:
+                    await self.refresh(department)
+                except Exception:
+                    logger.exception("Dashboard refresh failed for %s", department)
+
+    async def render(self, department: str) -> str:
+        counts = await db.get_open_counts(department)
+        label = DEPARTMENTS.get(department, department)
+        lines = [
+            f"📊 {label} — live dashboard",
+            f"{STATUS_EMOJI['Open']} Open: {counts.get('Open', 0)}   "
+            f"{STATUS_EMOJI['InProgress']} In progress: {counts.get('InProgress', 0)}   "
+            f"{STATUS_EMOJI['Escalated']} Escalated: {counts.get('Escalated', 0)}",
+        ]
+        events = self._events.get(department)
+        if events:
+            lines.append("\nRecent:")
+            lines.extend(f"• {e}" for e in events)
+        return "\n".join(lines)
+
+    async def refresh(self, department: str) -> None:
+        text = await self.render(department)
+        msg = await db.get_dashboard_message(department)
+        if msg and msg["chat_id"] == self.chat_id:
+            try:
+                await edits.edit(self.bot, self.chat_id, msg["message_id"], text, priority=PRIORITY_NOTICE)
+                return
+            except BadRequest as e:
+                if "not found" not in str(e).lower():
+                    raise
+                logger.warning("Dashboard message for %s is gone; posting a new one", department)
+        sent = await outbound.send_message(self.bot, self.chat_id, text, priority=PRIORITY_NOTICE)
+        edits.remember(self.chat_id, sent.message_id, text)
+        await db.set_dashboard_message(department, self.chat_id, sent.message_id)
+        try:
+            await self.bot.pin_chat_message(self.chat_id, sent.message_id, disable_notification=True)
+        except Exception as e:
+            logger.warning("Could not pin dashboard for %s (bot needs pin rights): %s", department, e)
+
+
+dashboard = Dashboard(GM_DASHBOARD_CHAT_ID)
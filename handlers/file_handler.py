@@ -2,9 +2,12 @@ import os
 from telegram import Update
 from telegram.ext import ContextTypes
 from database import db
+from utils import attachments
+from utils.attachments import MB
+from utils.downloads import downloads
+from utils.edits import edits
 
 TASKS_HUB_CHAT_ID = int(os.getenv("TASKS_HUB_CHAT_ID", "0"))
-STORAGE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "storage")
 
 
 async def handle_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -15,7 +18,7 @@ async def handle_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     # Find task linked to the replied message
-    task = db.get_task_by_message(msg.chat.id, msg.reply_to_message.message_id)
+    task = await db.get_task_by_message(msg.chat.id, msg.reply_to_message.message_id)
     if not task:
         return
 
@@ -31,13 +34,54 @@ async def handle_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
     else:
         return
 
-    save_dir = os.path.join(STORAGE_DIR, f"task_{task_id}")
-    os.makedirs(save_dir, exist_ok=True)
-    save_path = os.path.join(save_dir, file_name)
+    reason = await attachments.check_caps(task_id, file_obj.file_size)
+    if reason:
+        await msg.reply_text(f"⚠️ Not attached to TASK-{task_id:04d}: {reason}")
+        return
+
+    user = update.effective_user
+    added_by = user.username or str(user.id)
+    stored = await attachments.get_stored(file_obj.file_unique_id)
+    if stored:
+        # Known content: link it right away, nothing to download.
+        task = await db.attach_file(task_id, stored["file_unique_id"], file_name, added_by)
+        if task is None:
+            await msg.reply_text(f"📎 Already attached to TASK-{task_id:04d}\n📄 {file_name}")
+        else:
+            await msg.reply_text(
+                f"📎 File attached to TASK-{task_id:04d}\n📄 {file_name} (already stored, not downloaded again)\n"
+                f"🗂 {task['file_count']} file(s) on this task"
+            )
+        return
 
-    tg_file = await file_obj.get_file()
-    await tg_file.download_to_drive(save_path)
+    # Acknowledge now; the download worker edits this reply when it is done.
+    ack = f"⏳ Downloading {file_name} for TASK-{task_id:04d}…"
+    reply = await msg.reply_text(ack)
+    edits.remember(reply.chat_id, reply.message_id, ack)
+    await downloads.submit(context.bot, task_id, file_obj, file_name, added_by, reply.chat_id, reply.message_id)
 
-    db.update_task_file(task_id, save_path)
 
-    await msg.reply_text(f"📎 File attached to TASK-{task_id:04d}\n📄 {file_name}")
+async def storage_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/storage: attachment disk usage (hub only)."""
+    if update.effective_chat.id != TASKS_HUB_CHAT_ID:
+        return
+    usage = await attachments.usage_report()
+    saved = usage["referenced_bytes"] - usage["stored_bytes"]
+    lines = [
+        "💾 Attachment storage",
+        f"Blobs on disk: {usage['blobs']} ({usage['stored_bytes'] / MB:.1f} MB"
+        f" of {attachments.MAX_STORAGE_BYTES / MB:.0f} MB)",
+        f"Attachments: {usage['attachments']} ({usage['referenced_bytes'] / MB:.1f} MB referenced,"
+        f" {max(saved, 0) / MB:.1f} MB saved by dedup)",
+    ]
+    queue = downloads.stats()
+    if queue["queued"] or queue["active"]:
+        lines.append(f"Downloads: {queue['active']} running, {queue['queued']} queued")
+    if usage["legacy_bytes"]:
+        lines.append(f"Legacy task folders: {usage['legacy_bytes'] / MB:.1f} MB")
+    if usage["top_tasks"]:
+        lines.append("\nLargest tasks:")
+        lines.extend(
+            f"• TASK-{t['task_id']:04d}: {t['files']} file(s), {t['bytes'] / MB:.1f} MB" for t in usage["top_tasks"]
+        )
+    await update.message.reply_text("\n".join(lines))
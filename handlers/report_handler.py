@@ -0,0 +1,102 @@
+"""
+/report [DEPT] [PERIOD]: department statistics from the trigger-maintained
+task_stats tables (migration 11), so answering never scans tasks.
+
+PERIOD is `today`, `<N>d` (e.g. 7d, 30d; at most MAX_REPORT_DAYS) or `all`;
+days are UTC. The median time to Done is reported as its histogram bucket.
+"""
+import os
+from datetime import datetime, timedelta
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from database import db
+from utils.formatter import DEPARTMENTS, STATUS_EMOJI
+
+TASKS_HUB_CHAT_ID = int(os.getenv("TASKS_HUB_CHAT_ID", "0"))
+GM_DASHBOARD_CHAT_ID = int(os.getenv("GM_DASHBOARD_CHAT_ID", "0"))
+
+DEFAULT_REPORT_DAYS = 7
+MAX_REPORT_DAYS = 366
+BUCKET_LABELS = ("< 1h", "1–4h", "4–8h", "8–24h", "1–3d", "3–7d", "> 7d")
+BAR_WIDTH = 12
+
+
+def parse_report_args(args):
+    """(department or None, days or None for all time); raises ValueError on anything unknown."""
+    department, days = None, DEFAULT_REPORT_DAYS
+    for arg in args:
+        word = arg.lower()
+        if arg.upper() in DEPARTMENTS:
+            department = arg.upper()
+        elif word == "all":
+            days = None
+        elif word == "today":
+            days = 1
+        elif word.endswith("d") and word[:-1].isdigit() and 1 <= int(word[:-1]) <= MAX_REPORT_DAYS:
+            days = int(word[:-1])
+        else:
+            raise ValueError(arg)
+    return department, days
+
+
+def median_bucket(histogram):
+    """Index of the resolution bucket holding the median time to Done, or None without data."""
+    half, seen = sum(histogram) / 2, 0
+    for i, n in enumerate(histogram):
+        seen += n
+        if n and seen >= half:
+            return i
+    return None
+
+
+def _duration(seconds):
+    if seconds < 60:
+        return f"{seconds:.0f}s"
+    if seconds < 3600:
+        return f"{seconds / 60:.0f}m"
+    if seconds < 86400:
+        return f"{seconds / 3600:.1f}h"
+    return f"{seconds / 86400:.1f}d"
+
+
+def format_report(report, department, days):
+    label = DEPARTMENTS.get(department, "All departments")
+    period = "all time" if days is None else "today (UTC)" if days == 1 else f"last {days} days"
+    counts = report["counts"]
+    lines = [
+        f"📈 {label} — {period}",
+        f"Now: {STATUS_EMOJI['Open']} {counts.get('Open', 0)}   "
+        f"{STATUS_EMOJI['InProgress']} {counts.get('InProgress', 0)}   "
+        f"{STATUS_EMOJI['Escalated']} {counts.get('Escalated', 0)}",
+        f"Created: {report['created']}   Done: {report['done']}   Escalated: {report['escalated']}",
+    ]
+    if report["done"]:
+        lines.append(
+            f"Time to Done: median {BUCKET_LABELS[median_bucket(report['histogram'])]},"
+            f" mean {_duration(report['resolve_seconds'] / report['done'])}"
+        )
+        peak = max(report["histogram"])
+        for name, n in zip(BUCKET_LABELS, report["histogram"]):
+            bar = "█" * round(BAR_WIDTH * n / peak) if n else ""
+            lines.append(f"{name}: {bar} {n}")
+    return "\n".join(lines)
+
+
+async def report_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/report [DEPT] [today|Nd|all] (hub and GM chat)."""
+    if update.effective_chat.id not in (TASKS_HUB_CHAT_ID, GM_DASHBOARD_CHAT_ID):
+        return
+    try:
+        department, days = parse_report_args(context.args or [])
+    except ValueError as e:
+        await update.message.reply_text(
+            f"❌ Unknown argument: {e}\n"
+            f"Usage: /report [DEPARTMENT] [today|7d|30d|all]\n"
+            f"Departments: {', '.join(DEPARTMENTS)}"
+        )
+        return
+    since = None if days is None else (datetime.utcnow().date() - timedelta(days=days - 1)).isoformat()
+    report = await db.get_report(department, since)
+    await update.message.reply_text(format_report(report, department, days))
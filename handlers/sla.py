@@ -0,0 +1,147 @@
+"""
+SLA scheduler: auto-escalate tasks left Open/InProgress past their department's SLA.
+
+Deadlines (created_at + SLA) live in a min-heap, seeded at startup from the
+idx_tasks_sla partial index and updated by track() whenever a task is created
+or changes status. One JobQueue run_once job is scheduled for the earliest
+deadline only, so nothing wakes up until a task actually becomes overdue.
+Overdue tasks are escalated, their card is edited, and the GM gets the event
+on the dashboard plus one summary notice per wake-up.
+
+A task changed after its deadline passed (e.g. an escalated task moved back to
+In Progress) was acknowledged by someone, so its clock restarts from that
+change (updated_at + SLA) instead of escalating it again at once.
+"""
+import heapq
+import logging
+import os
+import time
+from datetime import datetime, timezone
+
+from database import db
+from handlers.dashboard import GM_DASHBOARD_CHAT_ID, dashboard
+from utils.edits import edits
+from utils.formatter import DEPARTMENTS, build_task_keyboard, format_task_card
+from utils.locks import locks
+from utils.outbound import PRIORITY_NOTICE, outbound
+
+logger = logging.getLogger("topping_bot.sla")
+
+SLA_HOURS = float(os.getenv("SLA_HOURS", "24"))
+# Per department: SLA_HOURS_IT=4, SLA_HOURS_MARKETING=48, ...
+SLA_HOURS_BY_DEPARTMENT = {
+    dept: float(os.getenv(f"SLA_HOURS_{dept}") or SLA_HOURS) for dept in DEPARTMENTS
+}
+
+
+def _epoch(timestamp) -> float:
+    # tasks.created_at / updated_at are UTC, "YYYY-MM-DD HH:MM:SS[.ffffff]"
+    return datetime.fromisoformat(str(timestamp)).replace(tzinfo=timezone.utc).timestamp()
+
+
+class SlaScheduler:
+    def __init__(self):
+        self.bot = None
+        self.job_queue = None
+        self._heap = []  # (deadline, task_id); entries not matching _deadlines are stale
+        self._deadlines = {}  # task_id -> current deadline
+        self._job = None
+        self._job_at = None
+        self.escalated = 0
+
+    def sla_seconds(self, department: str) -> float:
+        return SLA_HOURS_BY_DEPARTMENT.get(department, SLA_HOURS) * 3600
+
+    async def start(self, application) -> None:
+        """Seed the heap from the database and schedule the first wake-up."""
+        self.bot = application.bot
+        self.job_queue = application.job_queue
+        for task in await db.get_sla_tasks():
+            self._push(task)
+        logger.info("SLA scheduler tracking %d tasks", len(self._deadlines))
+        self._reschedule()
+
+    def track(self, task: dict) -> None:
+        """Call after a task is created or its status changes."""
+        if task["status"] in db.SLA_STATUSES:
+            self._push(task)
+        else:
+            self._deadlines.pop(task["task_id"], None)  # its heap entry goes stale
+        self._reschedule()
+
+    def deadline(self, task: dict) -> float:
+        sla_seconds = self.sla_seconds(task["department"])
+        deadline = _epoch(task["created_at"]) + sla_seconds
+        if task.get("updated_at") and _epoch(task["updated_at"]) >= deadline:
+            deadline = _epoch(task["updated_at"]) + sla_seconds  # touched after the breach: restart the clock
+        return deadline
+
+    def _push(self, task: dict) -> None:
+        deadline = self.deadline(task)
+        if self._deadlines.get(task["task_id"]) == deadline:
+            return
+        self._deadlines[task["task_id"]] = deadline
+        heapq.heappush(self._heap, (deadline, task["task_id"]))
+
+    def _next_deadline(self):
+        while self._heap and self._deadlines.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def _reschedule(self) -> None:
+        if self.job_queue is None:
+            return  # not started yet; start() schedules from the full heap
+        deadline = self._next_deadline()
+        if deadline is None or (self._job_at is not None and self._job_at <= deadline):
+            return
+        if self._job is not None:
+            self._job.schedule_removal()
+        self._job_at = deadline
+        self._job = self.job_queue.run_once(self._fire, when=max(0.0, deadline - time.time()), name="sla_escalate")
+
+    async def _fire(self, context) -> None:
+        self._job = self._job_at = None
+        now = time.time()
+        escalated = []
+        while (deadline := self._next_deadline()) is not None and deadline <= now:
+            _, task_id = heapq.heappop(self._heap)
+            del self._deadlines[task_id]
+            try:
+                task = await self._escalate(task_id)
+            except Exception:
+                logger.exception("SLA escalation failed for TASK-%04d", task_id)
+                continue
+            if task:
+                escalated.append(task)
+        self._reschedule()
+        if escalated and GM_DASHBOARD_CHAT_ID:
+            lines = [f"⏰ SLA breached — {len(escalated)} task(s) auto-escalated:"]
+            lines.extend(f"• TASK-{t['task_id']:04d} [{t['department']}] {t['description'][:40]}" for t in escalated[:20])
+            if len(escalated) > 20:
+                lines.append(f"… and {len(escalated) - 20} more")
+            await outbound.send_message(self.bot, GM_DASHBOARD_CHAT_ID, "\n".join(lines), priority=PRIORITY_NOTICE)
+
+    async def _escalate(self, task_id: int):
+        async with locks(("task", task_id)):
+            task = await db.escalate_overdue(task_id)
+        if task is None:
+            return None  # Done/Escalated meanwhile
+        self.escalated += 1
+        hours = self.sla_seconds(task["department"]) / 3600
+        if task.get("chat_id") and task.get("message_id"):
+            try:
+                await edits.edit(
+                    self.bot, task["chat_id"], task["message_id"], format_task_card(task),
+                    reply_markup=build_task_keyboard(task_id), priority=PRIORITY_NOTICE,
+                )
+            except Exception as e:
+                logger.warning("Could not update card of TASK-%04d: %s", task_id, e)
+        dashboard.record(self.bot, task["department"], f"⏰ TASK-{task_id:04d} auto-escalated (SLA {hours:g}h)")
+        return task
+
+    def stats(self) -> dict:
+        return {"tracked": len(self._deadlines), "next_in_s": self._job_at and round(self._job_at - time.time()),
+                "escalated": self.escalated}
+
+
+sla = SlaScheduler()
@@ -1,69 +1,272 @@
+import asyncio
+import csv
+import io
+import logging
 import os
-from telegram import Update
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, ReplyParameters, Update
 from telegram.ext import ContextTypes
 from database import db
-from utils.formatter import format_task_card, build_task_keyboard, parse_task_command
+from database.archive import archive
+from utils.formatter import DEPARTMENTS, STATUS_EMOJI, format_task_card, build_task_keyboard, parse_task_command
+from utils.edits import edits
+from utils.outbound import PRIORITY_CARD, outbound
+from handlers.dashboard import dashboard
+from handlers.sla import sla
 
 TASKS_HUB_CHAT_ID = int(os.getenv("TASKS_HUB_CHAT_ID", "0"))
 GM_DASHBOARD_CHAT_ID = int(os.getenv("GM_DASHBOARD_CHAT_ID", "0"))
 GENERAL_GROUP_CHAT_ID = int(os.getenv("GENERAL_GROUP_CHAT_ID", "0"))
 
+logger = logging.getLogger("topping_bot.tasks")
 
-async def create_task(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    chat_id = update.effective_chat.id
-    if chat_id != TASKS_HUB_CHAT_ID:
-        return
+# Most tasks one multi-line /task or CSV upload may create; cards still go out at the group's send rate.
+BULK_MAX_TASKS = int(os.getenv("BULK_MAX_TASKS", "100"))
+BULK_MAX_CSV_BYTES = 256 * 1024
+# Card message ids are saved every this many posted cards, so replies to early cards work while the rest go out.
+CARD_ID_BATCH = 10
+
+# Tasks per /status page; keeps each listing well under Telegram's 4096-char limit.
+STATUS_PAGE_SIZE = 20
+
+
+USAGE = (
+    "❌ Usage: /task [DEPARTMENT] [description]\n"
+    "Departments: IT, MARKETING, OPS, RD, GENERAL\n\n"
+    "Example: /task IT Website is down\n"
+    "Several tasks: /task alone on the first line, then one DEPARTMENT description line per task,\n"
+    "or a .csv file of department,description rows."
+)
+
+
+def _task_rows_from_text(text: str):
+    """/task message -> ([(dept, description)], [bad line numbers]).
+
+    "/task DEPT description" is one task, whatever follows on later lines. A bare "/task" line
+    starts a list: each following line beginning with an uppercase department (IT, OPS, ...) is
+    a task, and any other line continues the previous task's description."""
+    lines = text.splitlines()
+    if len(lines[0].split()) > 1:
+        dept, description = parse_task_command(text)
+        return ([(dept, description)], []) if dept and description else ([], [1])
+    rows, bad = [], []
+    for n, line in enumerate(lines[1:], 2):
+        line = line.strip()
+        if not line:
+            continue
+        if line.split(None, 1)[0] in DEPARTMENTS:
+            dept, description = parse_task_command(f"/task {line}")
+            if dept and description:
+                rows.append((dept, description))
+            else:
+                bad.append(n)
+        elif rows:
+            rows[-1] = (rows[-1][0], f"{rows[-1][1]}\n{line}")
+        else:
+            bad.append(n)
+    return rows, bad
+
+
+def _task_rows_from_csv(data: bytes):
+    """department,description CSV (optional header row) -> ([(dept, description)], [bad row numbers])."""
+    rows, bad = [], []
+    reader = csv.reader(io.StringIO(data.decode("utf-8-sig", errors="replace")))
+    for n, cells in enumerate(reader, 1):
+        cells = [c.strip() for c in cells]
+        if not any(cells):
+            continue
+        if n == 1 and cells[0].lower() in ("department", "dept"):
+            continue
+        dept, description = parse_task_command(f"/task {cells[0]} {', '.join(c for c in cells[1:] if c)}")
+        if dept and description:
+            rows.append((dept, description))
+        else:
+            bad.append(n)
+    return rows, bad
 
-    dept, description = parse_task_command(update.message.text)
-    if not dept or not description:
-        await update.message.reply_text(
-            "❌ Usage: /task [DEPARTMENT] [description]\n"
-            "Departments: IT, MARKETING, OPS, RD, GENERAL\n\n"
-            "Example: /task IT Website is down"
-        )
-        return
 
+async def _post_card(bot, chat_id: int, task, reply_to=None):
+    """Send one task card (as a reply to message `reply_to`, if given); returns (task, text, keyboard, message or the exception)."""
+    text, kb = format_task_card(task), build_task_keyboard(task["task_id"])
+    kwargs = {"reply_parameters": ReplyParameters(reply_to, allow_sending_without_reply=True)} if reply_to else {}
+    try:
+        msg = await outbound.send_message(bot, chat_id, text, priority=PRIORITY_CARD, reply_markup=kb, **kwargs)
+    except Exception as e:
+        return task, text, kb, e
+    return task, text, kb, msg
+
+
+async def _create_tasks(bot, chat_id: int, creator: str, rows, reply_to=None):
+    """Insert all rows in one transaction, post every card (replying to `reply_to`) through the outbound
+    queue at once, and record card message ids in batches of CARD_ID_BATCH as they are posted.
+    Returns (created tasks, tasks whose card failed)."""
+    tasks = await db.create_tasks((dept, creator, description, chat_id) for dept, description in rows)
+    posted, failed = [], []
+    for done in asyncio.as_completed([_post_card(bot, chat_id, t, reply_to) for t in tasks]):
+        task, text, kb, msg = await done
+        if isinstance(msg, Exception):
+            logger.warning("Could not post card for TASK-%04d: %s", task["task_id"], msg)
+            failed.append(task)
+            continue
+        edits.remember(msg.chat_id, msg.message_id, text, kb)
+        posted.append((task["task_id"], msg.chat_id, msg.message_id))
+        if len(posted) >= CARD_ID_BATCH:
+            await db.update_task_messages(posted)
+            posted = []
+    if posted:
+        await db.update_task_messages(posted)
+    failed.sort(key=lambda t: t["task_id"])
+
+    for task in tasks:
+        sla.track(task)
+    by_dept = {}
+    for task in tasks:
+        by_dept.setdefault(task["department"], []).append(task)
+    for dept, dept_tasks in by_dept.items():
+        if len(dept_tasks) == 1:
+            t = dept_tasks[0]
+            dashboard.record(bot, dept, f"🆕 TASK-{t['task_id']:04d} by @{creator}: {t['description'][:40]}")
+        else:
+            dashboard.record(bot, dept, f"🆕 {len(dept_tasks)} tasks by @{creator} "
+                                        f"(TASK-{dept_tasks[0]['task_id']:04d}…TASK-{dept_tasks[-1]['task_id']:04d})")
+    return tasks, failed
+
+
+async def _create_from_rows(update: Update, context: ContextTypes.DEFAULT_TYPE, rows, bad, what: str):
+    if len(rows) > BULK_MAX_TASKS:
+        await update.message.reply_text(f"❌ {len(rows)} tasks in one {what}; the limit is {BULK_MAX_TASKS}.")
+        return
     user = update.effective_user
     creator = user.username or str(user.id)
-
-    task = db.create_task(
-        department=dept,
-        creator=creator,
-        description=description,
-        chat_id=chat_id,
+    tasks, failed = await _create_tasks(
+        context.bot, update.effective_chat.id, creator, rows, reply_to=update.message.message_id
     )
+    if len(tasks) == 1 and not bad and not failed:
+        return  # the card, posted as a reply to the command, is the confirmation
+    lines = []
+    if tasks:
+        lines.append(f"✅ Created {len(tasks)} task(s): TASK-{tasks[0]['task_id']:04d}…TASK-{tasks[-1]['task_id']:04d}")
+    if failed:
+        lines.append("⚠️ Card not posted for: " + ", ".join(f"TASK-{t['task_id']:04d}" for t in failed))
+    if bad:
+        lines.append(f"⚠️ Skipped {what} line(s) {', '.join(map(str, bad[:20]))}{'…' if len(bad) > 20 else ''}"
+                     f" (expected DEPARTMENT and description)")
+    await update.message.reply_text("\n".join(lines))
 
-    text = format_task_card(task)
-    keyboard = build_task_keyboard(task["task_id"])
-    sent = await update.message.reply_text(text, reply_markup=keyboard)
 
-    db.update_task_message(task["task_id"], sent.chat_id, sent.message_id)
+async def create_task(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/task DEPT description, or several DEPT description lines in one message."""
+    chat_id = update.effective_chat.id
+    if chat_id != TASKS_HUB_CHAT_ID:
+        return
 
-    if GM_DASHBOARD_CHAT_ID:
-        await context.bot.send_message(
-            GM_DASHBOARD_CHAT_ID,
-            f"🆕 New task:\n\n{text}",
-            reply_markup=keyboard,
-        )
+    rows, bad = _task_rows_from_text(update.message.text)
+    if not rows:
+        await update.message.reply_text(USAGE)
+        return
+    await _create_from_rows(update, context, rows, bad, "message")
 
 
-async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def create_tasks_from_csv(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """A .csv document posted in the hub (not as a reply): one task per department,description row."""
+    msg = update.message
+    if not msg or msg.chat.id != TASKS_HUB_CHAT_ID or not msg.document:
+        return
+    if (msg.document.file_size or 0) > BULK_MAX_CSV_BYTES:
+        await msg.reply_text(f"❌ CSV too large (max {BULK_MAX_CSV_BYTES // 1024} KB).")
+        return
+    tg_file = await context.bot.get_file(msg.document.file_id)
+    rows, bad = _task_rows_from_csv(bytes(await tg_file.download_as_bytearray()))
+    if not rows:
+        await msg.reply_text("❌ No tasks found. Expected rows like: IT,Website is down")
+        return
+    await _create_from_rows(update, context, rows, bad, "CSV")
+
+
+def _status_scope(update: Update):
+    """GM chat sees every open task; anyone else sees the tasks they created."""
+    if update.effective_chat.id == GM_DASHBOARD_CHAT_ID:
+        return {}
     user = update.effective_user
-    chat_id = update.effective_chat.id
+    return {"creator": user.username or str(user.id)}
 
-    # GM sees all
-    is_gm = (chat_id == GM_DASHBOARD_CHAT_ID)
-    tasks = db.get_open_tasks() if is_gm else db.get_open_tasks(creator=user.username or str(user.id))
 
+async def _status_page(scope: dict, before_id=None, after_id=None):
+    """One page of open tasks plus Prev/Next buttons; None when the page is empty."""
+    rows = await db.get_open_tasks(**scope, before_id=before_id, after_id=after_id, limit=STATUS_PAGE_SIZE + 1)
+    if after_id is not None:
+        # Rows come newest first; the extra row is the newest one and means another newer page exists.
+        has_newer, has_older = len(rows) > STATUS_PAGE_SIZE, True
+        tasks = rows[-STATUS_PAGE_SIZE:]
+    else:
+        has_newer, has_older = before_id is not None, len(rows) > STATUS_PAGE_SIZE
+        tasks = rows[:STATUS_PAGE_SIZE]
     if not tasks:
-        await update.message.reply_text("✅ No open tasks.")
-        return
+        return None, None
 
-    lines = [f"📋 Open Tasks ({len(tasks)})\n"]
+    lines = ["📋 Open Tasks\n"]
     for t in tasks:
-        from utils.formatter import STATUS_EMOJI
         emoji = STATUS_EMOJI.get(t["status"], "⚪")
         assigned = f" → @{t['assigned_to']}" if t.get("assigned_to") else ""
         lines.append(f"{emoji} TASK-{t['task_id']:04d} [{t['department']}] {t['description'][:40]}{assigned}")
 
-    await update.message.reply_text("\n".join(lines))
+    # The listing's scope rides in the callback data, so whoever presses Prev/Next pages this listing.
+    owner = f"_{scope['creator']}" if scope.get("creator") else ""
+    buttons = []
+    if has_newer:
+        buttons.append(InlineKeyboardButton("⬅️ Prev", callback_data=f"LIST_P_{tasks[0]['task_id']}{owner}"))
+    if has_older:
+        buttons.append(InlineKeyboardButton("Next ➡️", callback_data=f"LIST_N_{tasks[-1]['task_id']}{owner}"))
+    return "\n".join(lines), InlineKeyboardMarkup([buttons]) if buttons else None
+
+
+async def _task_status(update: Update, arg: str):
+    """/status TASK-0042 (or 42): the task's card, from the archive once it has been archived."""
+    raw = arg.upper().removeprefix("TASK-")
+    if not raw.isdigit():
+        await update.message.reply_text("Usage: /status [TASK-id]")
+        return
+    task = await db.get_task(int(raw))
+    archived = task is None
+    if archived:
+        task = await archive.lookup("task", int(raw))
+    if not task:
+        await update.message.reply_text(f"Task not found: TASK-{int(raw):04d}")
+        return
+    await update.message.reply_text(format_task_card(task) + ("\n🗄 Archived" if archived else ""))
+
+
+async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if context.args:
+        await _task_status(update, context.args[0])
+        return
+    text, keyboard = await _status_page(_status_scope(update))
+    if not text:
+        await update.message.reply_text("✅ No open tasks.")
+        return
+    await update.message.reply_text(text, reply_markup=keyboard)
+
+
+async def status_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Prev/Next on a /status listing (callback data LIST_P_<id>[_<creator>] / LIST_N_<id>[_<creator>])."""
+    q = update.callback_query
+    parts = (q.data or "").split("_", 3)
+    if len(parts) < 3 or parts[1] not in ("P", "N") or not parts[2].isdigit():
+        await q.answer()
+        return
+    if len(parts) == 4 and parts[3]:
+        scope = {"creator": parts[3]}
+    elif update.effective_chat.id == GM_DASHBOARD_CHAT_ID:
+        scope = {}  # the GM listing covers every open task
+    else:
+        await q.answer("Listing expired. Run /status again.", show_alert=True)
+        return
+    cursor = int(parts[2])
+    if parts[1] == "N":
+        text, keyboard = await _status_page(scope, before_id=cursor)
+    else:
+        text, keyboard = await _status_page(scope, after_id=cursor)
+    if not text:
+        await q.answer("No more tasks.")
+        return
+    await q.answer()
+    await edits.edit(context.bot, q.message.chat_id, q.message.message_id, text, reply_markup=keyboard)
@@ -0,0 +1,38 @@
+import asyncio
+import types
+
+from telegram.error import BadRequest, Forbidden, NetworkError
+
+from database import db
+from handlers import announce_handler
+
+
+def test_failed_deliveries_resume_after_restart_and_permanent_errors_stop(fresh_db, monkeypatch):
+    down = {-1: NetworkError("Bad Gateway"), -2: Forbidden("bot was kicked"), -3: BadRequest("Chat not found")}
+    sends = []
+
+    async def send_message(bot, chat_id, text, priority):
+        sends.append(chat_id)
+        if chat_id in down:
+            raise down[chat_id]
+        return types.SimpleNamespace(message_id=100 + len(sends))
+
+    monkeypatch.setattr(announce_handler.outbound, "send_message", send_message)
+    monkeypatch.setattr(announce_handler, "ANNOUNCE_RETRY_DELAY", 0)
+
+    async def run():
+        await db.init_db()
+        row = await db.log_announcement("alice", "meeting at 10")
+        await announce_handler.fan_out(None, row["id"], "text", [-1, -2, -3, -4])
+        # The bot restarts here: no retry task survives, only the table.
+        del down[-1]
+        await announce_handler.resume_retries(types.SimpleNamespace(bot=None))
+        await asyncio.gather(*announce_handler._retry_tasks)
+        rows = db.get_conn().execute(
+            "SELECT chat_id, status, attempts FROM announcement_deliveries ORDER BY chat_id DESC"
+        ).fetchall()
+        await db.close_db()
+        return [tuple(r) for r in rows]
+
+    assert asyncio.run(run()) == [(-1, "sent", 2), (-2, "rejected", 1), (-3, "rejected", 1), (-4, "sent", 1)]
+    assert sends == [-1, -2, -3, -4, -1]  # only the transient failure was retried
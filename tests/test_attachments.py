@@ -0,0 +1,47 @@
+import asyncio
+import types
+
+from database import db
+from utils import attachments
+
+
+class _Bot:
+    def __init__(self, contents):
+        self.contents = contents
+
+    async def get_file(self, file_id):
+        async def download_to_drive(path):
+            with open(path, "wb") as f:
+                f.write(self.contents[file_id])
+        return types.SimpleNamespace(download_to_drive=download_to_drive)
+
+
+def test_storage_cap_uses_a_running_total(fresh_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(attachments, "STORAGE_DIR", str(tmp_path / "storage"))
+    monkeypatch.setattr(attachments, "TMP_DIR", str(tmp_path / "storage" / "tmp"))
+    monkeypatch.setattr(attachments, "_stored_bytes", None)
+    monkeypatch.setattr(attachments, "MAX_STORAGE_BYTES", 250)
+    scans = []
+    real_usage = db.get_storage_usage
+
+    async def get_storage_usage(top=5):
+        scans.append(top)
+        return await real_usage(top)
+
+    monkeypatch.setattr(db, "get_storage_usage", get_storage_usage)
+    bot = _Bot({"a": b"x" * 100, "b": b"x" * 100, "c": b"y" * 100})
+
+    async def run():
+        await db.init_db()
+        await attachments.store(bot, "a", "uid-a")  # before the total is loaded: counted by the scan
+        assert await attachments.check_caps(1, 100) is None
+        await attachments.store(bot, "b", "uid-b")  # same content: no new blob
+        assert await attachments.check_caps(1, 100) is None
+        await attachments.store(bot, "c", "uid-c")
+        reason = await attachments.check_caps(1, 100)
+        return reason, await attachments.stored_bytes(), (await real_usage(top=0))["stored_bytes"]
+
+    reason, running, scanned = asyncio.run(run())
+    assert reason.startswith("attachment storage is full")
+    assert running == scanned == 200
+    assert scans == [0]  # one scan, on first use
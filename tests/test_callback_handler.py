@@ -0,0 +1,19 @@
+import pytest
+
+from handlers.callback_handler import parse_callback
+from utils.formatter import build_task_keyboard
+
+
+def test_every_card_button_parses():
+    buttons = [b.callback_data for row in build_task_keyboard(42).inline_keyboard for b in row]
+    assert sorted(parse_callback(data) for data in buttons) == [
+        ("ASSIGN", None, "42"),
+        ("ESCALATE", None, "42"),
+        ("STATUS", "DONE", "42"),
+        ("STATUS", "PROGRESS", "42"),
+    ]
+
+
+@pytest.mark.parametrize("data", ["", "ASSIGN", "ASSIGN_x", "STATUS_5", "STATUS_OPEN_5", "LIST_N_5", "ESCALATE_5_6"])
+def test_malformed_callbacks_are_ignored(data):
+    assert parse_callback(data) == (None, None, None)
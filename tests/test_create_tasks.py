@@ -0,0 +1,44 @@
+import asyncio
+import types
+
+from handlers import task_handler
+
+
+def test_card_ids_are_saved_while_cards_are_posted(monkeypatch):
+    saved = []  # (cards sent so far, ids saved in this call)
+    sent, replies = [], []
+
+    async def create_tasks(rows):
+        return [{"task_id": i, "department": dept, "description": text, "creator": creator,
+                 "status": "Open", "chat_id": chat_id}
+                for i, (dept, creator, text, chat_id) in enumerate(rows, 1)]
+
+    async def update_task_messages(cards):
+        saved.append((len(sent), [task_id for task_id, _, _ in cards]))
+
+    pace = asyncio.Lock()  # the outbound queue sends one card at a time
+
+    async def send_message(bot, chat_id, text, priority, reply_markup, reply_parameters=None):
+        async with pace:
+            await asyncio.sleep(0.001)
+            sent.append(text)
+            replies.append(reply_parameters.message_id)
+        if "📝 task 2" in text:
+            raise RuntimeError("Forbidden")
+        return types.SimpleNamespace(chat_id=chat_id, message_id=1000 + len(sent))
+
+    monkeypatch.setattr(task_handler.db, "create_tasks", create_tasks)
+    monkeypatch.setattr(task_handler.db, "update_task_messages", update_task_messages)
+    monkeypatch.setattr(task_handler.outbound, "send_message", send_message)
+    monkeypatch.setattr(task_handler.sla, "track", lambda task: None)
+    monkeypatch.setattr(task_handler.dashboard, "record", lambda *args: None)
+    monkeypatch.setattr(task_handler, "CARD_ID_BATCH", 4)
+
+    rows = [("IT", f"task {i}") for i in range(10)]
+    tasks, failed = asyncio.run(task_handler._create_tasks(None, -100, "alice", rows, reply_to=7))
+
+    assert len(tasks) == 10 and [t["task_id"] for t in failed] == [3]
+    assert [len(ids) for _, ids in saved] == [4, 4, 1]
+    assert saved[0][0] < len(rows)  # the first batch was saved before the last card went out
+    assert sorted(i for _, ids in saved for i in ids) == [1, 2, 4, 5, 6, 7, 8, 9, 10]
+    assert replies == [7] * 10  # every card replies to the command
@@ -0,0 +1,158 @@
+import asyncio
+import inspect
+import re
+import sqlite3
+
+import pytest
+
+from database import db
+
+# (function, table) pairs allowed to read the whole table, and why.
+FULL_SCANS_ALLOWED = {
+    ("count_tickets", "tickets"): "COUNT(*) of the mirror, once at startup",
+    ("get_storage_usage", "files"): "/storage totals over every stored file",
+    ("get_storage_usage", "tf"): "/storage totals over every attachment (task_files tf)",
+    ("get_pending_downloads", "pending_downloads"): "startup replay; the table only holds unfinished downloads",
+    ("get_report", "task_status_counts"): "at most one row per department and status",
+}
+
+
+def _exercise():
+    """Call every public coroutine in database/db.py once; returns {name: [SQL statements]}."""
+    ticket = {"ticket_id": "IT-20261018-0001", "department": "IT", "status": "OPEN",
+              "created_at": "2026-10-18T10:00:00Z", "message_text": "printer on fire"}
+    calls = [
+        ("create_task", lambda: db.create_task("it", "alice", "printer broken", -100, 10)),
+        ("create_tasks", lambda: db.create_tasks([("ops", "bob", "restock", -100), ("rd", "bob", "lab", -100)])),
+        ("update_task_messages", lambda: db.update_task_messages([(2, -100, 11), (3, -100, 12)])),
+        ("get_task", lambda: db.get_task(1)),
+        ("update_task_message", lambda: db.update_task_message(1, -100, 10)),
+        ("update_task_status", lambda: db.update_task_status(2, status="Done", assigned_to="carol")),
+        ("update_task_file", lambda: db.update_task_file(1, "storage/task_1/a.pdf")),
+        ("add_file", lambda: db.add_file("uid-1", "ab" * 32, "storage/blobs/ab/x", 10)),
+        ("get_file", lambda: db.get_file("uid-1")),
+        ("attach_file", lambda: db.attach_file(1, "uid-1", "a.pdf", "alice")),
+        ("get_task_files", lambda: db.get_task_files(1)),
+        ("get_task_files_size", lambda: db.get_task_files_size(1)),
+        ("get_storage_usage", lambda: db.get_storage_usage()),
+        ("add_pending_download", lambda: db.add_pending_download(1, "fid", "uid-2", "b.pdf", "alice", -100, 20)),
+        ("get_pending_downloads", lambda: db.get_pending_downloads()),
+        ("fail_pending_download", lambda: db.fail_pending_download(1, "timeout")),
+        ("delete_pending_download", lambda: db.delete_pending_download(1)),
+        ("get_task_by_message", lambda: db.get_task_by_message(-100, 10)),
+        ("get_open_tasks", lambda: db.get_open_tasks(department="IT", limit=20)),
+        ("get_open_tasks", lambda: db.get_open_tasks(creator="alice", before_id=5, limit=20)),
+        ("get_open_tasks", lambda: db.get_open_tasks(after_id=1, limit=20)),
+        ("get_all_open_tasks", lambda: db.get_all_open_tasks()),
+        ("get_sla_tasks", lambda: db.get_sla_tasks()),
+        ("escalate_overdue", lambda: db.escalate_overdue(3)),
+        ("get_archivable_tasks", lambda: db.get_archivable_tasks("2100-01-01 00:00:00", 10)),
+        ("delete_archived_tasks", lambda: db.delete_archived_tasks([{"task_id": 2, "updated_at": "2026-10-18 10:00:00"}])),
+        ("add_archive_index", lambda: db.add_archive_index("task", [(2, "tasks-2026-10.jsonl.gz")])),
+        ("get_archive_partition", lambda: db.get_archive_partition("task", 2)),
+        ("get_open_counts", lambda: db.get_open_counts("IT")),
+        ("get_report", lambda: db.get_report("IT", "2026-10-01")),
+        ("get_report", lambda: db.get_report(None, "2026-10-01")),
+        ("get_report", lambda: db.get_report(None, None)),
+        ("get_dashboard_message", lambda: db.get_dashboard_message("IT")),
+        ("set_dashboard_message", lambda: db.set_dashboard_message("IT", -200, 30)),
+        ("log_announcement", lambda: db.log_announcement("alice", "hello")),
+        ("record_deliveries", lambda: db.record_deliveries(1, [(-100, "failed", 3, 120, None, "Forbidden")])),
+        ("get_failed_deliveries", lambda: db.get_failed_deliveries(1)),
+        ("get_pending_deliveries", lambda: db.get_pending_deliveries(5)),
+        ("save_conversations", lambda: db.save_conversations([(7, "awaiting_task", None, 9e9)], [8])),
+        ("load_conversations", lambda: db.load_conversations(0)),
+        ("delete_expired_conversations", lambda: db.delete_expired_conversations(1e10)),
+        ("upsert_tickets", lambda: db.upsert_tickets([ticket])),
+        ("upsert_tickets", lambda: db.upsert_tickets([{**ticket, "message_text": "printer fixed"}])),
+        ("count_tickets", lambda: db.count_tickets()),
+        ("search", lambda: db.search("printer")),
+        ("delete_tickets", lambda: db.delete_tickets([ticket["ticket_id"]])),
+    ]
+
+    async def run():
+        await db.init_db()
+        executed = {}
+        for name, call in calls:
+            statements = executed.setdefault(name, [])
+            db._conn.set_trace_callback(statements.append)
+            await call()
+            db._conn.set_trace_callback(None)
+        await db.close_db()
+        return executed
+
+    return asyncio.run(run())
+
+
+def _full_scans(conn, sql):
+    plan = conn.execute("EXPLAIN QUERY PLAN " + sql).fetchall()
+    # "SCAN t" reads every row of t; "SCAN t USING INDEX i" walks a (partial) index, "SEARCH" seeks.
+    return [m.group(1) for row in plan if (m := re.fullmatch(r"SCAN (\w+)", row[3]))]
+
+
+def test_every_query_uses_an_index(fresh_db):
+    executed = _exercise()
+
+    public = {
+        name for name, fn in inspect.getmembers(db, inspect.iscoroutinefunction)
+        if not name.startswith("_") and name not in ("init_db", "close_db")
+    }
+    assert public <= executed.keys(), f"not exercised: {sorted(public - executed.keys())}"
+
+    conn = db.connect()
+    try:
+        offenders = []
+        for name, statements in executed.items():
+            for sql in dict.fromkeys(statements):
+                if sql.startswith("--") or sql.split(None, 1)[0].upper() in ("BEGIN", "COMMIT", "ROLLBACK", "PRAGMA"):
+                    continue  # transaction control, and FTS5's own internal statements
+                scans = [t for t in _full_scans(conn, sql) if (name, t) not in FULL_SCANS_ALLOWED]
+                if scans:
+                    offenders.append(f"{name}: {scans} in {sql!r}")
+        assert not offenders, "\n".join(offenders)
+    finally:
+        conn.close()
+
+
+def test_failed_migration_is_rolled_back(fresh_db, monkeypatch):
+    good = list(db.MIGRATIONS)
+    broken = good + ["CREATE TABLE half_done (x); INSERT INTO no_such_table VALUES (1);"]
+    monkeypatch.setattr(db, "MIGRATIONS", broken)
+
+    with pytest.raises(sqlite3.OperationalError):
+        db.get_conn()
+    assert db._conn is None  # the half-migrated connection is not shared
+
+    conn = db.connect()
+    try:
+        assert not conn.in_transaction
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == len(good)
+        assert conn.execute("SELECT name FROM sqlite_master WHERE name='half_done'").fetchone() is None
+    finally:
+        conn.close()
+
+    monkeypatch.setattr(db, "MIGRATIONS", good)
+    assert db.get_conn().execute("PRAGMA user_version").fetchone()[0] == len(good)
+
+
+def test_migrations_are_applied_in_order(fresh_db):
+    conn = db.get_conn()
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == len(db.MIGRATIONS)
+    assert db.migrate(conn) == len(db.MIGRATIONS)  # nothing left to do
+
+
+def test_archived_task_changed_meanwhile_is_kept(fresh_db):
+    async def run():
+        await db.init_db()
+        for task_id in (1, 2):
+            await db.create_task("IT", "alice", f"task {task_id}", -100, task_id)
+            await db.update_task_status(task_id, status="Done")
+        archived = await db.get_archivable_tasks("2100-01-01 00:00:00", 10)
+        await db.update_task_status(1, status="InProgress")  # reopened and done again after the archive read
+        await db.update_task_status(1, status="Done")
+        deleted = await db.delete_archived_tasks(archived)
+        return deleted, await db.get_task(1), await db.get_task(2)
+
+    deleted, reopened, archived = asyncio.run(run())
+    assert deleted == [2]
+    assert reopened["status"] == "Done" and archived is None
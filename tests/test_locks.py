@@ -0,0 +1,65 @@
+import asyncio
+import time
+
+import pytest
+
+from utils.locks import KeyedLock
+
+
+async def _hold(locks, key, active, peak, seconds=0.01):
+    async with locks(key):
+        active[key] = active.get(key, 0) + 1
+        peak[key] = max(peak.get(key, 0), active[key])
+        peak["all"] = max(peak.get("all", 0), sum(active.values()))
+        await asyncio.sleep(seconds)
+        active[key] -= 1
+
+
+def test_same_key_is_serialized_and_different_keys_run_in_parallel():
+    locks, active, peak = KeyedLock(), {}, {}
+
+    async def run():
+        await asyncio.gather(*(_hold(locks, ("ticket", i % 4), active, peak) for i in range(20)))
+
+    asyncio.run(run())
+    assert all(peak[("ticket", i)] == 1 for i in range(4))
+    assert peak["all"] == 4
+    assert locks.contended == 16
+
+
+def test_idle_keys_are_dropped():
+    locks = KeyedLock()
+
+    async def fail():
+        async with locks("boom"):
+            raise ValueError
+
+    async def run():
+        await asyncio.gather(*(_hold(locks, i, {}, {}, 0) for i in range(1000)))
+        with pytest.raises(ValueError):
+            await fail()
+        waiter = asyncio.ensure_future(_hold(locks, "held", {}, {}, 0))
+        async with locks("held"):
+            await asyncio.sleep(0)  # waiter is queued behind us
+            assert len(locks) == 1
+            waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+    asyncio.run(run())
+    assert len(locks) == 0
+
+
+def test_keyed_lock_beats_one_global_lock():
+    keys, per_update = 20, 0.02
+
+    async def elapsed(key_of):
+        locks = KeyedLock()
+        started = time.perf_counter()
+        await asyncio.gather(*(_hold(locks, key_of(i), {}, {}, per_update) for i in range(keys)))
+        return time.perf_counter() - started
+
+    global_lock = asyncio.run(elapsed(lambda i: "all"))
+    keyed = asyncio.run(elapsed(lambda i: ("ticket", i)))
+    assert global_lock >= keys * per_update
+    assert keyed < global_lock / 4
@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+from telegram.error import BadRequest, Forbidden, NetworkError, TimedOut
+
+from utils import outbound as outbound_mod
+from utils.outbound import OutboundQueue
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    async def sleep(_seconds):
+        pass
+    monkeypatch.setattr(outbound_mod.asyncio, "sleep", sleep)
+
+
+def _failing(exc, succeed_after=None):
+    calls = []
+
+    async def call():
+        calls.append(1)
+        if succeed_after is not None and len(calls) > succeed_after:
+            return "ok"
+        raise exc
+    return call, calls
+
+
+@pytest.mark.parametrize("exc", [BadRequest("Message is not modified"), Forbidden("bot was kicked")])
+def test_permanent_errors_are_not_retried(exc):
+    call, calls = _failing(exc)
+    with pytest.raises(type(exc)):
+        asyncio.run(OutboundQueue().submit(-100, outbound_mod.PRIORITY_EDIT, call))
+    assert len(calls) == 1
+
+
+def test_network_errors_are_retried():
+    call, calls = _failing(NetworkError("connection reset"), succeed_after=2)
+    assert asyncio.run(OutboundQueue().submit(-100, outbound_mod.PRIORITY_EDIT, call)) == "ok"
+    assert len(calls) == 3
+
+
+def test_timed_out_send_is_not_repeated():
+    call, calls = _failing(TimedOut())
+    with pytest.raises(TimedOut):
+        asyncio.run(OutboundQueue().submit(-100, outbound_mod.PRIORITY_CARD, call, retry_timeouts=False))
+    assert len(calls) == 1
+
+
+def test_timed_out_edit_is_retried():
+    call, calls = _failing(TimedOut(), succeed_after=1)
+    assert asyncio.run(OutboundQueue().submit(-100, outbound_mod.PRIORITY_EDIT, call)) == "ok"
+    assert len(calls) == 2
+
+
+def test_idle_chat_buckets_are_dropped(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(outbound_mod.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(outbound_mod, "CHAT_BUCKET_SWEEP", 4)
+    q = OutboundQueue()
+
+    for chat_id in range(1, 5):
+        q._bucket(chat_id).reserve()  # one send each: private buckets are empty for a second
+    q._bucket(-100).block(60)  # a group under RetryAfter
+    assert len(q._chats) == 5  # nothing idle yet, so the sweep kept everything
+
+    now[0] += 5
+    for chat_id in range(5, 15):
+        q._bucket(chat_id)
+    assert -100 in q._chats and 1 not in q._chats
+    assert q.stats()["chat_buckets"] < 15
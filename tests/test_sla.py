@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from handlers.sla import SlaScheduler
+
+
+class _Job:
+    def schedule_removal(self):
+        pass
+
+
+class _JobQueue:
+    def __init__(self):
+        self.runs = []
+
+    def run_once(self, callback, when, name=None):
+        self.runs.append(when)
+        return _Job()
+
+
+def _ago(hours):
+    return (datetime.utcnow() - timedelta(hours=hours)).isoformat(" ")
+
+
+@pytest.fixture
+def scheduler():
+    s = SlaScheduler()
+    s.job_queue = _JobQueue()
+    return s
+
+
+def test_overdue_task_is_escalated_at_once(scheduler):
+    # Never touched since its deadline (e.g. the bot was down): escalate now.
+    scheduler.track({"task_id": 1, "department": "IT", "status": "Open",
+                     "created_at": _ago(30), "updated_at": _ago(29)})
+    assert scheduler.job_queue.runs == [0.0]
+
+
+def test_escalated_task_moved_to_in_progress_gets_a_fresh_clock(scheduler):
+    sla = scheduler.sla_seconds("IT")
+    task = {"task_id": 1, "department": "IT", "status": "Escalated", "created_at": _ago(30), "updated_at": _ago(5)}
+    scheduler.track(task)  # auto-escalated: not on the clock
+    assert scheduler.job_queue.runs == []
+
+    scheduler.track({**task, "status": "InProgress", "updated_at": _ago(0)})  # manager acknowledges
+    [when] = scheduler.job_queue.runs
+    assert sla - 60 < when <= sla
+
+
+def test_task_within_sla_keeps_its_creation_deadline(scheduler):
+    scheduler.track({"task_id": 1, "department": "IT", "status": "InProgress",
+                     "created_at": _ago(2), "updated_at": _ago(1)})
+    [when] = scheduler.job_queue.runs
+    assert abs(when - (scheduler.sla_seconds("IT") - 2 * 3600)) < 60
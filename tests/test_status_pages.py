@@ -0,0 +1,64 @@
+import asyncio
+import types
+
+import pytest
+
+from handlers import task_handler
+
+
+def _task(task_id, creator):
+    return {"task_id": task_id, "status": "Open", "department": "IT", "description": f"task {task_id}",
+            "creator": creator, "assigned_to": None}
+
+
+@pytest.fixture
+def listing(monkeypatch):
+    calls, answers, edited = [], [], []
+
+    async def get_open_tasks(creator=None, department=None, before_id=None, after_id=None, limit=20):
+        calls.append({"creator": creator, "before_id": before_id, "after_id": after_id})
+        return [_task(i, creator) for i in range(30, 0, -1)][:limit]
+
+    async def edit(bot, chat_id, message_id, text, reply_markup=None):
+        edited.append(reply_markup)
+
+    monkeypatch.setattr(task_handler.db, "get_open_tasks", get_open_tasks)
+    monkeypatch.setattr(task_handler.edits, "edit", edit)
+    monkeypatch.setattr(task_handler, "GM_DASHBOARD_CHAT_ID", -200)
+    return calls, answers, edited
+
+
+def _press(data, user, chat_id, answers):
+    async def answer(text=None, show_alert=False):
+        answers.append(text)
+
+    query = types.SimpleNamespace(data=data, answer=answer, message=types.SimpleNamespace(chat_id=chat_id, message_id=5))
+    update = types.SimpleNamespace(callback_query=query, effective_chat=types.SimpleNamespace(id=chat_id),
+                                   effective_user=types.SimpleNamespace(username=user, id=1))
+    asyncio.run(task_handler.status_page_callback(update, types.SimpleNamespace(bot=None)))
+
+
+def test_next_page_keeps_the_owner_of_the_listing(listing):
+    calls, answers, edited = listing
+    text, keyboard = asyncio.run(task_handler._status_page({"creator": "alice"}))
+    [next_button] = keyboard.inline_keyboard[0]
+    assert next_button.callback_data == "LIST_N_11_alice"
+
+    _press(next_button.callback_data, "bob", -100, answers)  # bob pages alice's listing in the hub
+    assert calls[-1] == {"creator": "alice", "before_id": 11, "after_id": None}
+    assert edited and answers == [None]
+
+
+def test_usernames_with_underscores_survive(listing):
+    calls, answers, _ = listing
+    _press("LIST_P_5_dev_ops_lead", "bob", -100, answers)
+    assert calls[-1]["creator"] == "dev_ops_lead"
+
+
+def test_unscoped_listing_only_pages_in_the_gm_chat(listing):
+    calls, answers, _ = listing
+    _press("LIST_N_11", "gm", -200, answers)
+    assert calls[-1]["creator"] is None
+
+    _press("LIST_N_11", "bob", -100, answers)  # e.g. a listing posted before the scope was in the data
+    assert len(calls) == 1 and answers[-1] == "Listing expired. Run /status again."
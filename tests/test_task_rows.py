@@ -0,0 +1,35 @@
+from handlers.task_handler import _task_rows_from_csv, _task_rows_from_text
+
+
+def test_single_task_keeps_every_line_of_its_description():
+    text = "/task IT Website is down\nIt started at 9am\nGeneral users cannot log in"
+    rows, bad = _task_rows_from_text(text)
+    assert rows == [("IT", "Website is down\nIt started at 9am\nGeneral users cannot log in")]
+    assert bad == []
+
+
+def test_bare_task_starts_a_list_on_uppercase_departments():
+    text = "/task\nIT Website is down\nIt started at 9am\nOPS Restock the warehouse\n\nRD\nops lowercase continues"
+    rows, bad = _task_rows_from_text(text)
+    assert rows == [
+        ("IT", "Website is down\nIt started at 9am"),
+        ("OPS", "Restock the warehouse\nops lowercase continues"),
+    ]
+    assert bad == [6]  # "RD" with no description
+
+
+def test_bare_task_rejects_text_before_the_first_department():
+    rows, bad = _task_rows_from_text("/task\nsomething\nIT fix it")
+    assert rows == [("IT", "fix it")]
+    assert bad == [2]
+
+
+def test_invalid_single_task():
+    assert _task_rows_from_text("/task XX nothing") == ([], [1])
+
+
+def test_csv_rows():
+    data = 'department,description\nIT,"a, b"\nops,c,d\n,\nzz,q\n'.encode("utf-8-sig")
+    rows, bad = _task_rows_from_csv(data)
+    assert rows == [("IT", "a, b"), ("OPS", "c, d")]
+    assert bad == [5]
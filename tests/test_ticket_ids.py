@@ -0,0 +1,47 @@
+import asyncio
+
+from database import ticket_ids
+from database.ticket_ids import TicketIdAllocator
+
+
+def test_concurrent_allocations_are_unique_and_dense(tmp_path):
+    async def run():
+        alloc = TicketIdAllocator(tmp_path / "ticket_ids.json")
+        await alloc.load()
+        return await asyncio.gather(*(alloc.next_id(("IT", "OPS", "RD")[i % 3]) for i in range(5000)))
+
+    ids = asyncio.run(run())
+    numbers = sorted(int(tid.rsplit("-", 1)[1]) for tid in ids)
+    assert len(set(ids)) == 5000
+    assert numbers == list(range(1, 5001))  # one counter shared by every prefix
+
+
+def test_restart_never_reuses_an_id(tmp_path):
+    path = tmp_path / "ticket_ids.json"
+
+    async def issue(n, legacy=None):
+        alloc = TicketIdAllocator(path, block=32)
+        await alloc.load(legacy)
+        return [int((await alloc.next_id("IT")).rsplit("-", 1)[1]) for _ in range(n)]
+
+    first = asyncio.run(issue(40))  # "crash" without persisting the unused part of the block
+    second = asyncio.run(issue(5))
+    assert first == list(range(1, 41))
+    assert min(second) > max(first)
+
+    legacy = {ticket_ids._today(): 500}
+    assert asyncio.run(issue(1, legacy)) == [501]
+
+
+def test_counter_restarts_each_utc_day(tmp_path, monkeypatch):
+    async def run():
+        alloc = TicketIdAllocator(tmp_path / "ticket_ids.json")
+        monkeypatch.setattr(ticket_ids, "_today", lambda: "20261018")
+        await alloc.load()
+        a = [await alloc.next_id("IT") for _ in range(3)]
+        monkeypatch.setattr(ticket_ids, "_today", lambda: "20261019")
+        return a, await alloc.next_id("IT")
+
+    before, after = asyncio.run(run())
+    assert before[-1] == "IT-20261018-0003"
+    assert after == "IT-20261019-0001"
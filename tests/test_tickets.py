@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from database import archive as archive_module
+from database.journal import TicketJournal
+from database.tickets import TicketRepository
+
+FAR_FUTURE = "2100-01-01T00:00:00"
+
+
+@pytest.fixture
+def repo(tmp_path):
+    repo = TicketRepository(TicketJournal(tmp_path / "tickets.json"))
+    asyncio.run(repo.load())
+    yield repo
+    repo.journal.close()
+
+
+def _put_done(repo, ticket_id):
+    repo.put({"ticket_id": ticket_id, "status": "DONE", "created_at": "2026-01-05T10:00:00Z"})
+
+
+def _reopen(repo, ticket_id):
+    ticket = repo.get(ticket_id)
+    ticket["status"] = "OPEN"
+    repo.put(ticket)
+
+
+def test_delete_drops_unchanged_tickets(repo):
+    _put_done(repo, "IT-1")
+    _put_done(repo, "IT-2")
+    asyncio.run(repo.flush())
+    batch = repo.journal.finished_before(("DONE",), FAR_FUTURE)
+
+    assert sorted(asyncio.run(repo.delete(batch))) == ["IT-1", "IT-2"]
+    assert repo.get("IT-1") is None and len(repo.journal) == 0
+
+
+def test_delete_keeps_tickets_changed_since_read(repo):
+    for tid in ("IT-1", "IT-2", "IT-3"):
+        _put_done(repo, tid)
+    asyncio.run(repo.flush())
+    batch = repo.journal.finished_before(("DONE",), FAR_FUTURE)
+
+    _reopen(repo, "IT-1")
+    asyncio.run(repo.flush())  # reopened and already flushed
+    _reopen(repo, "IT-2")  # reopened, flush still pending
+
+    assert asyncio.run(repo.delete(batch)) == ["IT-3"]
+    assert repo.get("IT-1")["status"] == "OPEN"
+    assert repo.get("IT-2")["status"] == "OPEN"
+
+
+def test_archive_keeps_ticket_reopened_while_writing(repo, tmp_path, monkeypatch):
+    _put_done(repo, "IT-1")
+    _put_done(repo, "IT-2")
+    asyncio.run(repo.flush())
+    mirror_deletes = []
+
+    async def slow_write(kind, records, id_key):
+        _reopen(repo, "IT-1")
+        await repo.flush()  # reopened and flushed while the partition was being written
+
+    async def delete_tickets(ids):
+        mirror_deletes.extend(ids)
+
+    monkeypatch.setattr(archive_module.db, "delete_tickets", delete_tickets)
+    arc = archive_module.Archive(tmp_path / "archive", after_days=-36500)
+    monkeypatch.setattr(arc, "_write", slow_write)
+
+    assert asyncio.run(arc.archive_tickets(repo)) == 1
+    assert mirror_deletes == ["IT-2"]
+    assert repo.get("IT-1")["status"] == "OPEN"
@@ -0,0 +1,29 @@
+from database import db
+from database.journal import TicketJournal
+from tools.tickets_transfer import import_tickets
+
+
+def _ticket(ticket_id, status="OPEN"):
+    return {"ticket_id": ticket_id, "department": "IT", "status": status,
+            "created_at": "2026-10-18T10:00:00Z", "message_text": f"ticket {ticket_id}"}
+
+
+def test_import_applies_journal_deletes(tmp_path):
+    journal = TicketJournal(tmp_path / "tickets.json")
+    journal.open()
+    journal.append([_ticket("IT-1"), _ticket("IT-2"), _ticket("IT-3")])
+    journal.append(deletes=["IT-1", "IT-3"])  # archived
+    journal.append([_ticket("IT-2", "DONE")])
+    journal.close()
+
+    conn = db.connect(str(tmp_path / "topping_ops.db"))
+    try:
+        db.migrate(conn)
+        conn.execute("INSERT INTO tickets (ticket_id, data) VALUES ('IT-3', '{}')")  # left by an earlier import
+        conn.commit()
+        import_tickets(tmp_path / "tickets.json", conn, batch=2)
+
+        assert [tuple(r) for r in conn.execute("SELECT ticket_id, status FROM tickets")] == [("IT-2", "DONE")]
+        assert conn.execute("SELECT COUNT(*) FROM tickets_fts").fetchone()[0] == 1
+    finally:
+        conn.close()
@@ -0,0 +1,342 @@
+"""
+Synthetic load through the real Application, with the Bot API faked out.
+
+    python -m tools.bench [--users 500] [--concurrency 1] [--latency-ms 40] [--keep-limits] [--json]
+
+Two scenarios, each in a fresh temporary working directory:
+
+  tickets  bot.build_application() (the app main() runs): a group chatter
+           message, /ticket, free-text draft, D_ department pick, S_
+           in-progress/done by the manager, /status, /close.
+           Storage: tickets.json journal (+ SQLite mirror).
+  tasks    the handlers/ hub flows: /task, STATUS_/ASSIGN_/ESCALATE_ buttons,
+           a file reply (every 4th one a duplicate), /status and LIST_ paging.
+           Storage: SQLite.
+
+Bot API calls go to FakeRequest, which answers every method locally after
+--latency-ms and counts calls. Updates go through the Application's update
+processor with up to --concurrency users in flight (one synthetic user's
+updates stay in order); both apps then run at most CONCURRENT_UPDATES at
+once, so CONCURRENT_UPDATES=1 reproduces one-at-a-time dispatch. Reported
+per scenario: updates/sec, p50/p99 latency per update kind, Bot API calls,
+bytes written by the process (/proc/self/io wchar, Linux) and the size of
+the JSON and SQLite files afterwards.
+
+Outbound rate limits and the edit debounce are switched off so the numbers
+measure our code, not Telegram's per-chat limits; --keep-limits leaves them on.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+
+# Config is read from the environment at import time, so set it before importing the bot.
+HUB_CHAT_ID = -1000000000500
+GROUP_CHAT_ID = -1000000000600  # plain group chatter, dropped by the ingress filter
+os.environ.setdefault("BOT_TOKEN", "123456:bench")
+os.environ.setdefault("HAMID_ID", "1")
+os.environ.setdefault("AMIR_ID", "2")
+os.environ.setdefault("MOTAB_ID", "3")
+os.environ["TASKS_HUB_CHAT_ID"] = str(HUB_CHAT_ID)
+os.environ["GM_DASHBOARD_CHAT_ID"] = "0"
+os.environ["METRICS_PORT"] = "0"
+os.environ["BOT_MODE"] = "polling"
+
+from telegram import Update  # noqa: E402
+from telegram.ext import Application, CallbackQueryHandler, CommandHandler, MessageHandler, filters  # noqa: E402
+from telegram.request import BaseRequest  # noqa: E402
+
+import bot  # noqa: E402
+from database import db  # noqa: E402
+from handlers import callback_handler, file_handler, report_handler, task_handler  # noqa: E402
+from utils import attachments, outbound as outbound_mod  # noqa: E402
+from utils.downloads import downloads  # noqa: E402
+from utils.edits import edits  # noqa: E402
+
+BOT_ID = 999
+MANAGER_IDS = {"IT": 2, "MARKETING": 3}
+DEPARTMENTS = ("IT", "MARKETING", "OPS")
+FILE_BYTES = 64 * 1024
+
+
+class FakeRequest(BaseRequest):
+    """Answers Bot API methods locally after a fixed latency and counts them."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = Counter()
+        self.routed = {}  # (user chat, prompt message id) -> ticket id, from the routing confirmation
+        self._message_ids = itertools.count(1_000_000)
+
+    @property
+    def read_timeout(self):
+        return 5.0
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def _result(self, api_method: str, params: dict):
+        if api_method == "getMe":
+            return {"id": BOT_ID, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+        if api_method in ("sendMessage", "editMessageText"):
+            if api_method == "editMessageText" and params.get("text", "").startswith("✅ Ticket "):
+                self.routed[(int(params["chat_id"]), int(params["message_id"]))] = params["text"].split()[2]
+            message = {
+                "message_id": params.get("message_id") or next(self._message_ids),
+                "date": int(time.time()),
+                "chat": {"id": int(params["chat_id"]), "type": "private" if int(params["chat_id"]) > 0 else "supergroup"},
+                "from": {"id": BOT_ID, "is_bot": True, "first_name": "Bench"},
+                "text": params.get("text", ""),
+            }
+            if params.get("reply_markup"):
+                markup = params["reply_markup"]
+                message["reply_markup"] = json.loads(markup) if isinstance(markup, str) else markup
+            return message
+        if api_method == "getFile":
+            uid = params["file_id"].replace("fid-", "uid-")
+            return {"file_id": params["file_id"], "file_unique_id": uid, "file_size": FILE_BYTES,
+                    "file_path": f"documents/{uid}.bin"}
+        return True  # answerCallbackQuery, deleteWebhook, pinChatMessage, ...
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        if "/file/bot" in url:
+            self.calls["download"] += 1
+            name = url.rsplit("/", 1)[-1]
+            return 200, (name.encode() * (FILE_BYTES // len(name) + 1))[:FILE_BYTES]
+        api_method = url.rsplit("/", 1)[-1]
+        self.calls[api_method] += 1
+        params = request_data.parameters if request_data else {}
+        return 200, json.dumps({"ok": True, "result": self._result(api_method, params)}).encode()
+
+
+# -- synthetic updates -------------------------------------------------------
+_update_ids = itertools.count(1)
+_message_ids = itertools.count(1)
+
+
+def _user(user_id: int) -> dict:
+    return {"id": user_id, "is_bot": False, "first_name": f"u{user_id}", "username": f"user{user_id}"}
+
+
+def _chat(chat_id: int) -> dict:
+    if chat_id > 0:
+        return {"id": chat_id, "type": "private", "first_name": "bench"}
+    return {"id": chat_id, "type": "supergroup", "title": "Bench hub"}
+
+
+def message_update(app, user_id: int, chat_id: int, text: str = None, message_id: int = None, **extra) -> Update:
+    msg = {"message_id": message_id or next(_message_ids), "date": int(time.time()), "chat": _chat(chat_id),
+           "from": _user(user_id), **extra}
+    if text is not None:
+        msg["text"] = text
+        if text.startswith("/"):
+            msg["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return Update.de_json({"update_id": next(_update_ids), "message": msg}, app.bot)
+
+
+def callback_update(app, user_id: int, chat_id: int, message_id: int, data: str) -> Update:
+    message = {"message_id": message_id, "date": int(time.time()), "chat": _chat(chat_id),
+               "from": {"id": BOT_ID, "is_bot": True, "first_name": "Bench"}, "text": "card"}
+    query = {"id": str(next(_update_ids)), "from": _user(user_id), "chat_instance": "bench", "data": data,
+             "message": message}
+    return Update.de_json({"update_id": next(_update_ids), "callback_query": query}, app.bot)
+
+
+# -- flows: one synthetic user each, its updates sent in order through run() -
+async def ticket_flow(app, fake: FakeRequest, i: int, run):
+    user_id = 10_000 + i
+    dept = "IT" if i % 2 == 0 else "MARKETING"
+    await run("chatter", message_update(app, user_id, GROUP_CHAT_ID, f"lunch at {i % 12 + 1}?"))
+    await run("/ticket", message_update(app, user_id, user_id, "/ticket"))
+    await run("draft", message_update(app, user_id, user_id, f"pricing issue {i}: queue node {random.random():.6f}"))
+    prompt_id = next(_message_ids)
+    await run("D_", callback_update(app, user_id, user_id, prompt_id, f"D_{dept}"))
+    ticket_id = fake.routed.get((user_id, prompt_id))
+    if not ticket_id:
+        return
+    manager = MANAGER_IDS[dept]
+    await run("S_", callback_update(app, manager, -1, 1, f"S_p_{ticket_id}"))
+    await run("S_", callback_update(app, manager, -1, 1, f"S_d_{ticket_id}"))
+    await run("/status", message_update(app, user_id, user_id, f"/status {ticket_id}"))
+    await run("/close", message_update(app, manager, manager, f"/close {ticket_id}"))
+
+
+async def task_flow(app, fake: FakeRequest, i: int, run):
+    user_id = 20_000 + i
+    dept = DEPARTMENTS[i % len(DEPARTMENTS)]
+    await run("/task", message_update(app, user_id, HUB_CHAT_ID, f"/task {dept} website slow for order {i}"))
+    tasks = await db.get_open_tasks(creator=f"user{user_id}", limit=1)
+    if not tasks:
+        return
+    task = tasks[0]
+    card = task["message_id"]
+    for data in (f"ASSIGN_{task['task_id']}", f"STATUS_PROGRESS_{task['task_id']}"):
+        await run("button", callback_update(app, user_id, HUB_CHAT_ID, card, data))
+    uid = f"uid-{i // 4 * 4}"  # every 4 users share one file: exercises dedup
+    document = {"file_id": uid.replace("uid-", "fid-"), "file_unique_id": uid, "file_name": f"report{i}.pdf",
+                "file_size": FILE_BYTES}
+    reply_to = {"message_id": card, "date": int(time.time()), "chat": _chat(HUB_CHAT_ID),
+                "from": {"id": BOT_ID, "is_bot": True, "first_name": "Bench"}, "text": "card"}
+    await run("file", message_update(app, user_id, HUB_CHAT_ID, document=document, reply_to_message=reply_to))
+    await run("/status", message_update(app, user_id, HUB_CHAT_ID, "/status"))
+    await run("LIST_", callback_update(app, user_id, HUB_CHAT_ID, next(_message_ids), f"LIST_N_{task['task_id'] + 1}_user{user_id}"))
+    if i % 5 == 0:
+        await run("button", callback_update(app, user_id, HUB_CHAT_ID, card, f"STATUS_DONE_{task['task_id']}"))
+
+
+def hub_application(request) -> Application:
+    """The handlers/ task hub, registered the way a hub deployment wires it."""
+    app = Application.builder().token(os.environ["BOT_TOKEN"]).request(request).concurrent_updates(bot.CONCURRENT_UPDATES).build()
+    app.add_handler(CommandHandler("task", task_handler.create_task))
+    app.add_handler(CommandHandler("status", task_handler.status_command))
+    app.add_handler(CommandHandler("storage", file_handler.storage_command))
+    app.add_handler(CommandHandler("report", report_handler.report_command))
+    app.add_handler(CallbackQueryHandler(callback_handler.handle_callback, pattern=r"^(STATUS|ASSIGN|ESCALATE)_"))
+    app.add_handler(CallbackQueryHandler(task_handler.status_page_callback, pattern=r"^LIST_"))
+    app.add_handler(MessageHandler(filters.REPLY & (filters.Document.ALL | filters.PHOTO), file_handler.handle_file))
+    app.add_handler(MessageHandler(~filters.REPLY & filters.Document.FileExtension("csv"), task_handler.create_tasks_from_csv))
+    return app
+
+
+# -- measurement -------------------------------------------------------------
+def _wchar():
+    try:
+        with open("/proc/self/io") as f:
+            for line in f:
+                if line.startswith("wchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def _size(paths) -> int:
+    return sum(p.stat().st_size for p in paths if p.is_file())
+
+
+def _pct(values, q):
+    return round(values[min(len(values) - 1, int(len(values) * q))] * 1000, 2) if values else 0.0
+
+
+async def run_scenario(name: str, users: int, concurrency: int, latency: float) -> dict:
+    workdir = Path(tempfile.mkdtemp(prefix=f"bench-{name}-"))
+    os.chdir(workdir)
+    db.DB_PATH = str(workdir / "topping_ops.db")
+    attachments.STORAGE_DIR = str(workdir / "storage")
+    attachments.TMP_DIR = str(workdir / "storage" / "tmp")
+
+    fake = FakeRequest(latency)
+    if name == "tickets":
+        app, flow = bot.build_application(os.environ["BOT_TOKEN"], request=fake), ticket_flow
+    else:
+        app, flow = hub_application(fake), task_flow
+        await db.init_db()
+
+    latencies = defaultdict(list)
+    errors = Counter()
+    gate = asyncio.Semaphore(concurrency)
+
+    async def run(kind, update):
+        started = time.perf_counter()
+        try:
+            # The Application's own dispatch path, so CONCURRENT_UPDATES caps how many run at once.
+            await app.update_processor.process_update(update, app.process_update(update))
+        except Exception:
+            errors[kind] += 1
+        latencies[kind].append(time.perf_counter() - started)
+
+    async def user(i):
+        async with gate:
+            await flow(app, fake, i, run)
+
+    wchar_before = _wchar()
+    await app.initialize()
+    if app.post_init:
+        await app.post_init(app)
+    await app.start()
+    started = time.perf_counter()
+    await asyncio.gather(*(user(i) for i in range(users)))
+    if name == "tasks":
+        await downloads._queue.join()  # include background downloads in the wall time
+    elapsed = time.perf_counter() - started
+    await app.stop()
+    if app.post_shutdown:
+        await app.post_shutdown(app)
+    await app.shutdown()
+    await db.close_db()
+    wchar_after = _wchar()
+
+    all_latencies = sorted(v for vs in latencies.values() for v in vs)
+    return {
+        "concurrent_updates": app.update_processor.max_concurrent_updates,
+        "updates": len(all_latencies),
+        "updates_per_sec": round(len(all_latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": _pct(all_latencies, 0.5),
+        "p99_ms": _pct(all_latencies, 0.99),
+        "by_kind": {
+            kind: {"n": len(vs), "p50_ms": _pct(sorted(vs), 0.5), "p99_ms": _pct(sorted(vs), 0.99)}
+            for kind, vs in latencies.items()
+        },
+        "errors": dict(errors),
+        "bot_api_calls": dict(fake.calls),
+        "bytes_written": (wchar_after - wchar_before) if wchar_before is not None else None,
+        "disk_bytes": {
+            "json": _size([*workdir.glob("tickets.json*"), workdir / "ticket_ids.json"]),
+            "sqlite": _size(workdir.glob("topping_ops.db*")),
+            "attachments": sum(p.stat().st_size for p in (workdir / "storage").rglob("*") if p.is_file()),
+        },
+        "workdir": str(workdir),
+    }
+
+
+async def _main(args) -> dict:
+    if not args.keep_limits:
+        for name in ("GLOBAL_RATE", "PRIVATE_RATE", "GROUP_RATE"):
+            setattr(outbound_mod, name, 1e9)
+        for name in ("GLOBAL_BURST", "PRIVATE_BURST", "GROUP_BURST"):
+            setattr(outbound_mod, name, 10 ** 9)
+        outbound_mod.outbound._global = outbound_mod.TokenBucket(1e9, 10 ** 9)
+        edits.delay = 0
+    report = {}
+    for name in args.scenario:
+        report[name] = await run_scenario(name, args.users, args.concurrency, args.latency_ms / 1000)
+    return report
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=500, help="synthetic users per scenario")
+    parser.add_argument("--concurrency", type=int, default=1, help="users whose updates are in flight at once")
+    parser.add_argument("--latency-ms", type=float, default=40.0, help="fake Bot API latency per call")
+    parser.add_argument("--scenario", nargs="+", choices=("tickets", "tasks"), default=["tickets", "tasks"])
+    parser.add_argument("--keep-limits", action="store_true", help="keep outbound rate limits and edit debounce")
+    parser.add_argument("--json", action="store_true", help="print the full report as JSON")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    logging.getLogger().setLevel(logging.WARNING)
+    report = asyncio.run(_main(args))
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        return
+    for name, r in report.items():
+        print(f"{name} (concurrent_updates={r['concurrent_updates']}): {r['updates']} updates, {r['updates_per_sec']}/s, p50 {r['p50_ms']} ms, p99 {r['p99_ms']} ms, "
+              f"written {r['bytes_written']} B, disk {r['disk_bytes']}, errors {r['errors'] or 0}")
+        for kind, k in sorted(r["by_kind"].items()):
+            print(f"  {kind:8} n={k['n']:<6} p50 {k['p50_ms']:>8} ms  p99 {k['p99_ms']:>8} ms")
+
+
+if __name__ == "__main__":
+    main()
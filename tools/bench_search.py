@@ -0,0 +1,104 @@
+"""
+Benchmark /search (db.search) on a synthetic database.
+
+    python -m tools.bench_search [--rows 1000000] [--db /tmp/search_bench.db]
+
+Fills tasks (and a tenth as many tickets) with generated descriptions, then
+times db._search for common, rare and multi-word queries and prints p50/p99
+plus how many rows each query matches.
+An existing --db with enough rows is reused, so reruns skip the load.
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+
+from database import db
+
+# Zipf-like vocabulary: a few domain words are common, the long tail is rare,
+# roughly like real ticket text. Query mix covers common, two-word and rare terms.
+DOMAIN = (
+    "pricing algorithm queue node server website login payment invoice report "
+    "marketing campaign banner email deploy bug crash slow mobile android ios "
+    "database backup export import customer order refund shipping warehouse "
+    "سایت قیمت سفارش پرداخت گزارش"
+).split()
+VOCAB = [f"w{i}" for i in range(50_000)]
+for _i, _word in enumerate(DOMAIN):
+    VOCAB[50 + 40 * _i] = _word  # domain words land at ranks 50..1410 (roughly 0.1%-3% of rows)
+# w0 is stopword-like (in ~70% of rows): the worst case, where bm25 document frequency dominates.
+QUERIES = ["pricing", "pricing algorithm", "crash mobile ios", "قیمت", "w20000", "zzzrare", "w0"]
+
+
+def _weights():
+    acc, total = [], 0.0
+    for rank in range(1, len(VOCAB) + 1):
+        total += 1 / rank ** 1.07
+        acc.append(total)
+    return acc
+
+
+def _text(rng, cum):
+    return " ".join(rng.choices(VOCAB, cum_weights=cum, k=rng.randint(4, 14)))
+
+
+def fill(conn, rows: int, batch: int = 20000) -> None:
+    rng = random.Random(42)
+    cum = _weights()
+    have = conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+    for start in range(have, rows, batch):
+        n = min(batch, rows - start)
+        with conn:
+            conn.executemany(
+                "INSERT INTO tasks (department, creator, description, status) VALUES (?, ?, ?, ?)",
+                [(rng.choice(("IT", "MARKETING", "OPS")), "bench", _text(rng, cum), "Done") for _ in range(n)],
+            )
+            conn.executemany(
+                db.TICKET_UPSERT,
+                [
+                    db.ticket_row({"ticket_id": f"IT-B-{start + i}", "department": "IT", "status": "DONE",
+                                   "message_text": _text(rng, cum)})
+                    for i in range(0, n, 10)
+                ],
+            )
+    with conn:
+        conn.execute("INSERT INTO tasks (department, creator, description) VALUES ('IT', 'bench', 'zzzrare needle')")
+    conn.execute("INSERT INTO tasks_fts(tasks_fts) VALUES ('optimize')")
+    conn.execute("INSERT INTO tickets_fts(tickets_fts) VALUES ('optimize')")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--db", default="/tmp/search_bench.db")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    conn = db.connect(args.db)
+    db.migrate(conn)
+    t0 = time.perf_counter()
+    fill(conn, args.rows)
+    print(f"rows: {conn.execute('SELECT COUNT(*) FROM tasks').fetchone()[0]} tasks, "
+          f"{conn.execute('SELECT COUNT(*) FROM tickets').fetchone()[0]} tickets "
+          f"(load {time.perf_counter() - t0:.1f}s)")
+
+    report = {}
+    for q in QUERIES:
+        timings = []
+        for i in range(args.repeat):
+            started = time.perf_counter()
+            db._search(conn, q, limit=10, offset=(i % 3) * 10)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        report[q] = {
+            "matches": conn.execute("SELECT COUNT(*) FROM tasks_fts WHERE tasks_fts MATCH ?", (db.fts_query(q),)).fetchone()[0],
+            "p50_ms": round(statistics.median(timings), 2),
+            "p99_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.99))], 2),
+        }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+Stream tickets between tickets.json (+ journal segments) and the SQLite `tickets` table.
+
+    python -m tools.tickets_transfer import [--data tickets.json] [--db database/topping_ops.db]
+    python -m tools.tickets_transfer export --out backup.json [--db database/topping_ops.db]
+
+Import parses the snapshot incrementally (one ticket in memory at a time), then
+replays the journal segments on top (upserts, and deletes for archived
+tickets), in batched transactions with executemany. Export walks the table
+with a cursor and writes a compact snapshot that TicketJournal can open
+directly. Both report rows/sec and peak RSS.
+"""
+import argparse
+import json
+import resource
+import sys
+import time
+from pathlib import Path
+
+from database import db
+from database.journal import TicketJournal
+
+CHUNK = 1 << 16
+BATCH = 5000
+
+
+class _JsonStream:
+    """Minimal pull parser for a top-level JSON object, reading the file in chunks."""
+
+    def __init__(self, fp):
+        self.fp = fp
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _more(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.fp.read(CHUNK)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._more():
+                raise ValueError("unexpected end of JSON input")
+
+    def expect(self, ch: str) -> None:
+        if self.peek() != ch:
+            raise ValueError(f"expected {ch!r} at offset {self.pos}, got {self.buf[self.pos]!r}")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                obj, end = self.decoder.raw_decode(self.buf, self.pos)
+            except ValueError:
+                if self._more():
+                    continue
+                raise
+            # A number ending exactly at the buffer edge may continue in the next chunk.
+            if end == len(self.buf) and self._more():
+                continue
+            self.pos = end
+            return obj
+
+    def members(self):
+        """Yield (key, None) for each member and let the caller consume the value."""
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key
+            sep = self.peek()
+            self.pos += 1
+            if sep == "}":
+                return
+            if sep != ",":
+                raise ValueError(f"expected ',' or '}}' at offset {self.pos - 1}")
+
+
+def iter_snapshot(path: Path, meta: dict):
+    """Yield tickets from a tickets.json snapshot; other top-level keys land in `meta`."""
+    with open(path, "r", encoding="utf-8") as f:
+        stream = _JsonStream(f)
+        for key in stream.members():
+            if key == "tickets":
+                for _tid in stream.members():
+                    yield stream.value()
+            else:
+                meta[key] = stream.value()
+
+
+def iter_journal(segments):
+    """Yield ("t", ticket) and ("d", ticket_id) records from journal segments, in replay order."""
+    for seg in segments:
+        with open(seg, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue  # torn tail, same as TicketJournal replay
+                if "t" in rec:
+                    yield "t", rec["t"]
+                elif "d" in rec:
+                    yield "d", rec["d"]  # archived ticket
+
+
+def _execute(conn, op: str, rows: list) -> None:
+    with conn:
+        conn.executemany(db.TICKET_UPSERT if op == "t" else db.TICKET_DELETE, rows)
+
+
+def _apply_batched(conn, records, batch: int) -> int:
+    """Upsert ("t") / delete ("d") records in order, one transaction per batch of a single kind."""
+    total = 0
+    op, rows = None, []
+    for kind, value in records:
+        if rows and (kind != op or len(rows) >= batch):
+            _execute(conn, op, rows)
+            total += len(rows)
+            rows = []
+        op = kind
+        rows.append(db.ticket_row(value) if kind == "t" else (value,))
+    if rows:
+        _execute(conn, op, rows)
+        total += len(rows)
+    return total
+
+
+def import_tickets(data_path: Path, conn, batch: int = BATCH) -> int:
+    meta = {}
+    n = 0
+    if data_path.exists():
+        n += _apply_batched(conn, (("t", t) for t in iter_snapshot(data_path, meta)), batch)
+    covered = int(meta.get("journal_seq", 0))
+    n += _apply_batched(conn, iter_journal(TicketJournal(data_path).segments(after=covered)), batch)
+    return n
+
+
+def export_tickets(conn, out_path: Path, batch: int = BATCH) -> int:
+    n = 0
+    tmp = out_path.with_name(out_path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write('{"tickets":{')
+        cur = conn.execute("SELECT ticket_id, data FROM tickets ORDER BY ticket_id")
+        while True:
+            rows = cur.fetchmany(batch)
+            if not rows:
+                break
+            for ticket_id, data in rows:
+                if n:
+                    f.write(",")
+                f.write(json.dumps(ticket_id, ensure_ascii=False) + ":" + data)
+                n += 1
+        f.write('},"daily_counter":{}}')
+    tmp.replace(out_path)
+    return n
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("import", "export"))
+    parser.add_argument("--data", type=Path, default=Path("tickets.json"), help="tickets.json snapshot to import")
+    parser.add_argument("--out", type=Path, help="export destination (never the live tickets.json)")
+    parser.add_argument("--db", default=db.DB_PATH, help="SQLite database path")
+    parser.add_argument("--batch", type=int, default=BATCH, help="rows per transaction")
+    args = parser.parse_args(argv)
+
+    conn = db.connect(args.db)
+    db.migrate(conn)
+    started = time.perf_counter()
+    if args.command == "import":
+        n = import_tickets(args.data, conn, args.batch)
+    else:
+        if not args.out:
+            parser.error("export needs --out")
+        n = export_tickets(conn, args.out, args.batch)
+    elapsed = time.perf_counter() - started
+    conn.close()
+    rate = n / elapsed if elapsed > 0 else float(n)
+    print(f"{args.command}: {n} tickets in {elapsed:.2f}s ({rate:,.0f} rows/s), peak RSS {_peak_rss_mb():.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
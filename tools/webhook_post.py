@@ -0,0 +1,89 @@
+"""
+Local stand-in for Telegram in webhook mode: POST Update JSON to the bot's webhook server.
+
+    python -m tools.webhook_post --text "/status IT-20261018-0001"
+    python -m tools.webhook_post update1.json update2.json
+    python -m tools.webhook_post --callback S_p_IT-20261018-0001 --chat-id -1003894609250
+
+Defaults come from the same env vars as bot.py (WEBHOOK_PORT/PORT, WEBHOOK_PATH,
+WEBHOOK_SECRET). Prints the HTTP status for each update; 200 means accepted,
+403 means the secret token did not match.
+"""
+import argparse
+import itertools
+import json
+import os
+import time
+import urllib.error
+import urllib.request
+
+from dotenv import load_dotenv
+
+_ids = itertools.count(int(time.time()))
+
+
+def build_update(text=None, callback=None, chat_id=1, user_id=1, chat_type="private") -> dict:
+    now = int(time.time())
+    user = {"id": user_id, "is_bot": False, "first_name": "Local", "username": f"local{user_id}"}
+    chat = {"id": chat_id, "type": chat_type}
+    if chat_type != "private":
+        chat["title"] = "Local test group"
+    message = {"message_id": next(_ids) % 1_000_000, "date": now, "chat": chat, "from": user}
+    if callback is not None:
+        message["from"] = {"id": 0, "is_bot": True, "first_name": "bot"}
+        message["text"] = "card"
+        return {
+            "update_id": next(_ids),
+            "callback_query": {
+                "id": str(next(_ids)), "from": user, "chat_instance": "local",
+                "data": callback, "message": message,
+            },
+        }
+    message["text"] = text or "/start"
+    if message["text"].startswith("/"):
+        command = message["text"].split()[0]
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(command)}]
+    return {"update_id": next(_ids), "message": message}
+
+
+def post(url: str, secret: str, update: dict) -> int:
+    req = urllib.request.Request(
+        url,
+        data=json.dumps(update).encode("utf-8"),
+        headers={"Content-Type": "application/json", "X-Telegram-Bot-Api-Secret-Token": secret},
+        method="POST",
+    )
+    try:
+        with urllib.request.urlopen(req, timeout=10) as resp:
+            return resp.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def main(argv=None) -> None:
+    load_dotenv()
+    port = os.getenv("WEBHOOK_PORT") or os.getenv("PORT") or "8443"
+    path = (os.getenv("WEBHOOK_PATH") or "telegram").strip("/")
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*", help="files containing one Update JSON object each")
+    parser.add_argument("--url", default=f"http://127.0.0.1:{port}/{path}")
+    parser.add_argument("--secret", default=os.getenv("WEBHOOK_SECRET", ""))
+    parser.add_argument("--text", help="send a message update with this text")
+    parser.add_argument("--callback", help="send a callback_query update with this data")
+    parser.add_argument("--chat-id", type=int, default=1)
+    parser.add_argument("--user-id", type=int, default=1)
+    parser.add_argument("--chat-type", default="private", choices=("private", "group", "supergroup"))
+    args = parser.parse_args(argv)
+
+    updates = []
+    for name in args.files:
+        with open(name, "r", encoding="utf-8") as f:
+            updates.append(json.load(f))
+    if args.text or args.callback or not updates:
+        updates.append(build_update(args.text, args.callback, args.chat_id, args.user_id, args.chat_type))
+    for update in updates:
+        print(update["update_id"], post(args.url, args.secret, update))
+
+
+if __name__ == "__main__":
+    main()
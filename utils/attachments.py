@@ -0,0 +1,129 @@
+"""
+Content-addressed attachment store.
+
+Blobs live under storage/blobs/<aa>/<sha256>, so identical content is kept
+once whatever it was called. The files table maps Telegram's file_unique_id to
+its blob, which lets a repeat upload skip the download entirely; concurrent
+uploads of the same file share one download.
+"""
+import asyncio
+import hashlib
+import os
+import uuid
+
+from database import db
+
+STORAGE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "storage")
+BLOB_DIR = os.path.join(STORAGE_DIR, "blobs")
+TMP_DIR = os.path.join(STORAGE_DIR, "tmp")
+
+MB = 1 << 20
+# Bot API downloads stop at 20 MB anyway; the task and total caps bound disk use.
+MAX_FILE_BYTES = int(float(os.getenv("ATTACH_MAX_FILE_MB", "20")) * MB)
+MAX_TASK_BYTES = int(float(os.getenv("ATTACH_MAX_TASK_MB", "100")) * MB)
+MAX_STORAGE_BYTES = int(float(os.getenv("ATTACH_MAX_STORAGE_MB", "2048")) * MB)
+
+_inflight = {}  # file_unique_id -> asyncio.Task downloading it
+_stored_bytes = None  # running total of blob bytes for the storage cap; loaded on first use
+
+
+def blob_path(sha256: str) -> str:
+    """Path of a blob relative to STORAGE_DIR."""
+    return os.path.join("blobs", sha256[:2], sha256)
+
+
+def _hash_and_place(tmp_path: str):
+    """Move a download to its blob path; returns (sha256, relative path, size, whether the blob is new)."""
+    h = hashlib.sha256()
+    with open(tmp_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    sha = h.hexdigest()
+    size = os.path.getsize(tmp_path)
+    rel = blob_path(sha)
+    dest = os.path.join(STORAGE_DIR, rel)
+    if os.path.exists(dest):
+        os.remove(tmp_path)  # same content under another file_unique_id
+        return sha, rel, size, False
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    os.replace(tmp_path, dest)
+    return sha, rel, size, True
+
+
+async def _download(bot, file_id: str, file_unique_id: str) -> dict:
+    global _stored_bytes
+    os.makedirs(TMP_DIR, exist_ok=True)
+    tmp_path = os.path.join(TMP_DIR, uuid.uuid4().hex)
+    try:
+        tg_file = await bot.get_file(file_id)
+        await tg_file.download_to_drive(tmp_path)
+        sha, rel, size, new_blob = await asyncio.to_thread(_hash_and_place, tmp_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    row = await db.add_file(file_unique_id, sha, rel, size)
+    if new_blob and _stored_bytes is not None:
+        _stored_bytes += size
+    return row
+
+
+async def stored_bytes() -> int:
+    """Bytes held in blobs: one files scan on first use, then kept current by _download."""
+    global _stored_bytes
+    if _stored_bytes is None:
+        total = (await db.get_storage_usage(top=0))["stored_bytes"]
+        if _stored_bytes is None:  # a concurrent first call may have loaded it already
+            _stored_bytes = total
+    return _stored_bytes
+
+
+async def get_stored(file_unique_id: str):
+    """The files row for a file_unique_id whose blob is on disk, else None."""
+    existing = await db.get_file(file_unique_id)
+    if existing and os.path.exists(os.path.join(STORAGE_DIR, existing["path"])):
+        return existing
+    return None
+
+
+async def store(bot, file_id: str, file_unique_id: str):
+    """Return (files row, downloaded) for a Telegram file, downloading only if it is new."""
+    existing = await get_stored(file_unique_id)
+    if existing:
+        return existing, False
+    task = _inflight.get(file_unique_id)
+    if task is None:
+        task = _inflight[file_unique_id] = asyncio.ensure_future(_download(bot, file_id, file_unique_id))
+        task.add_done_callback(lambda _t: _inflight.pop(file_unique_id, None))
+    return await asyncio.shield(task), True
+
+
+async def check_caps(task_id: int, size):
+    """Return a user-facing reason if a new attachment of `size` bytes would exceed a cap, else None."""
+    if size and size > MAX_FILE_BYTES:
+        return f"file is {size / MB:.1f} MB; the limit is {MAX_FILE_BYTES / MB:.0f} MB per file"
+    used = await db.get_task_files_size(task_id)
+    if used + (size or 0) > MAX_TASK_BYTES:
+        return f"this task already holds {used / MB:.1f} MB; the limit is {MAX_TASK_BYTES / MB:.0f} MB per task"
+    if MAX_STORAGE_BYTES:
+        stored = await stored_bytes()
+        if stored + (size or 0) > MAX_STORAGE_BYTES:
+            return f"attachment storage is full ({stored / MB:.0f} of {MAX_STORAGE_BYTES / MB:.0f} MB)"
+    return None
+
+
+def _legacy_bytes() -> int:
+    """Bytes in pre-migration storage/task_<id>/ folders (not content-addressed)."""
+    total = 0
+    if not os.path.isdir(STORAGE_DIR):
+        return 0
+    for entry in os.scandir(STORAGE_DIR):
+        if entry.is_dir() and entry.name.startswith("task_"):
+            for root, _dirs, files in os.walk(entry.path):
+                total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return total
+
+
+async def usage_report() -> dict:
+    usage = await db.get_storage_usage()
+    usage["legacy_bytes"] = await asyncio.to_thread(_legacy_bytes)
+    return usage
@@ -0,0 +1,125 @@
+"""
+Bounded background queue for attachment downloads.
+
+handle_file persists a pending_downloads row, acknowledges the upload and
+returns; ATTACH_DOWNLOAD_WORKERS workers fetch, store and attach the file, then
+edit that acknowledgement with the outcome. Failed attempts are retried with
+backoff. Rows still pending at shutdown are picked up again by start().
+"""
+import asyncio
+import logging
+import os
+
+from database import db
+from utils import attachments
+from utils.edits import edits
+
+logger = logging.getLogger("topping_bot.downloads")
+
+ATTACH_DOWNLOAD_WORKERS = int(os.getenv("ATTACH_DOWNLOAD_WORKERS", "3"))
+ATTACH_DOWNLOAD_ATTEMPTS = int(os.getenv("ATTACH_DOWNLOAD_ATTEMPTS", "3"))
+RETRY_DELAY = 2.0  # seconds, doubled per failed attempt
+
+
+class DownloadQueue:
+    def __init__(self, workers: int = ATTACH_DOWNLOAD_WORKERS, max_attempts: int = ATTACH_DOWNLOAD_ATTEMPTS):
+        self.workers = max(1, workers)
+        self.max_attempts = max_attempts
+        self.bot = None
+        self._queue = None
+        self._tasks = []
+        self._started = None  # asyncio.Task replaying persisted rows, shared by concurrent callers
+        self.active = 0
+        # counters
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+
+    async def start(self, bot) -> None:
+        """Start the workers once and requeue downloads left over from the last run."""
+        self.bot = bot
+        if self._started is None:
+            self._started = asyncio.ensure_future(self._start())
+        await self._started
+
+    async def _start(self) -> None:
+        self._queue = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+        rows = await db.get_pending_downloads()
+        for row in rows:
+            self._queue.put_nowait(row)
+        if rows:
+            logger.info("Resuming %d pending attachment downloads", len(rows))
+
+    async def submit(self, bot, task_id, file_obj, file_name, added_by, chat_id, reply_message_id) -> dict:
+        """Persist a download and queue it; returns the pending_downloads row."""
+        await self.start(bot)
+        row = await db.add_pending_download(
+            task_id, file_obj.file_id, file_obj.file_unique_id, file_name, added_by, chat_id, reply_message_id
+        )
+        self._queue.put_nowait(row)
+        return row
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            self.active += 1
+            try:
+                await self._process(job)
+            except Exception:
+                logger.exception("Attachment download %s crashed", job["id"])
+            finally:
+                self.active -= 1
+                self._queue.task_done()
+
+    async def _process(self, job: dict) -> None:
+        task_id = job["task_id"]
+        try:
+            stored, downloaded = await attachments.store(self.bot, job["file_id"], job["file_unique_id"])
+        except Exception as e:
+            row = await db.fail_pending_download(job["id"], str(e)[:200])
+            if row and row["attempts"] < self.max_attempts:
+                self.retried += 1
+                delay = RETRY_DELAY * 2 ** (row["attempts"] - 1)
+                logger.warning("Download %s failed (%s); retry %d in %.0fs", job["id"], e, row["attempts"], delay)
+                asyncio.get_running_loop().call_later(delay, self._queue.put_nowait, row)
+                return
+            self.failed += 1
+            await db.delete_pending_download(job["id"])
+            await self._reply(job, f"❌ Could not download {job['file_name']} for TASK-{task_id:04d}: {e}")
+            return
+
+        task = await db.attach_file(task_id, stored["file_unique_id"], job["file_name"], job["added_by"])
+        await db.delete_pending_download(job["id"])
+        self.completed += 1
+        if task is None:
+            await self._reply(job, f"📎 Already attached to TASK-{task_id:04d}\n📄 {job['file_name']}")
+            return
+        note = "" if downloaded else " (already stored, not downloaded again)"
+        await self._reply(
+            job,
+            f"📎 File attached to TASK-{task_id:04d}\n📄 {job['file_name']}{note}\n"
+            f"🗂 {task['file_count']} file(s) on this task",
+        )
+
+    async def _reply(self, job: dict, text: str) -> None:
+        if not job.get("reply_message_id"):
+            return
+        try:
+            await edits.edit(self.bot, job["chat_id"], job["reply_message_id"], text)
+        except Exception as e:
+            logger.warning("Could not update download reply for %s: %s", job["id"], e)
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue else 0,
+            "active": self.active,
+            "workers": self.workers,
+            "completed": self.completed,
+            "failed": self.failed,
+            "retried": self.retried,
+        }
+
+
+downloads = DownloadQueue()
@@ -0,0 +1,116 @@
+"""
+Debounced, diff-aware message edits for ticket/task cards.
+
+Presses on the same card within EDIT_DEBOUNCE_SECONDS collapse into one
+edit carrying the latest text. An edit whose text and keyboard match what the
+card already shows is skipped instead of being sent and rejected by Telegram
+with "message is not modified".
+"""
+import asyncio
+import os
+from collections import OrderedDict
+
+from telegram.error import BadRequest
+
+from utils.outbound import PRIORITY_EDIT, outbound
+
+EDIT_DEBOUNCE_SECONDS = float(os.getenv("EDIT_DEBOUNCE_SECONDS", "0.7"))
+MAX_TRACKED_MESSAGES = 5000
+
+
+def _fingerprint(text, reply_markup):
+    return text, reply_markup.to_json() if reply_markup is not None else None
+
+
+class _Pending:
+    __slots__ = ("bot", "text", "reply_markup", "priority", "waiters")
+
+    def __init__(self, bot, text, reply_markup, priority):
+        self.bot = bot
+        self.text = text
+        self.reply_markup = reply_markup
+        self.priority = priority
+        self.waiters = []
+
+
+class EditCoalescer:
+    def __init__(self, delay: float = EDIT_DEBOUNCE_SECONDS, max_tracked: int = MAX_TRACKED_MESSAGES):
+        self.delay = delay
+        self.max_tracked = max_tracked
+        self._shown = OrderedDict()  # (chat_id, message_id) -> fingerprint currently on screen
+        self._pending = {}
+        # counters
+        self.requested = 0
+        self.sent = 0
+        self.coalesced = 0
+        self.skipped_unchanged = 0
+
+    def remember(self, chat_id, message_id, text, reply_markup=None) -> None:
+        """Record what a freshly sent card shows, so a no-op first edit is skipped."""
+        key = (chat_id, message_id)
+        self._shown[key] = _fingerprint(text, reply_markup)
+        self._shown.move_to_end(key)
+        while len(self._shown) > self.max_tracked:
+            self._shown.popitem(last=False)
+
+    async def edit(self, bot, chat_id, message_id, text, reply_markup=None, priority=PRIORITY_EDIT) -> bool:
+        """Edit the card; returns False if the edit was unnecessary. Raises if the edit failed."""
+        self.requested += 1
+        key = (chat_id, message_id)
+        pending = self._pending.get(key)
+        if pending is None:
+            if self._shown.get(key) == _fingerprint(text, reply_markup):
+                self.skipped_unchanged += 1
+                return False
+            pending = self._pending[key] = _Pending(bot, text, reply_markup, priority)
+            asyncio.get_running_loop().create_task(self._flush_later(key))
+        else:
+            self.coalesced += 1
+            pending.text, pending.reply_markup = text, reply_markup
+            pending.priority = min(pending.priority, priority)
+        waiter = asyncio.get_running_loop().create_future()
+        pending.waiters.append(waiter)
+        return await waiter
+
+    async def _flush_later(self, key) -> None:
+        await asyncio.sleep(self.delay)
+        pending = self._pending.pop(key)
+        fp = _fingerprint(pending.text, pending.reply_markup)
+        try:
+            if self._shown.get(key) == fp:
+                self.skipped_unchanged += 1
+                result = False
+            else:
+                try:
+                    await outbound.edit_message_text(
+                        pending.bot, key[0], key[1], pending.text,
+                        priority=pending.priority, reply_markup=pending.reply_markup,
+                    )
+                    self.sent += 1
+                    result = True
+                except BadRequest as e:
+                    if "not modified" not in str(e).lower():
+                        raise
+                    self.skipped_unchanged += 1
+                    result = False
+                self.remember(key[0], key[1], pending.text, pending.reply_markup)
+        except Exception as e:
+            for w in pending.waiters:
+                if not w.done():
+                    w.set_exception(e)
+            return
+        for w in pending.waiters:
+            if not w.done():
+                w.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "requested": self.requested,
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "skipped_unchanged": self.skipped_unchanged,
+            "saved": self.requested - self.sent,
+        }
+
+
+edits = EditCoalescer()
@@ -1,6 +1,8 @@
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from datetime import datetime
 
+from utils import render_cache
+
 DEPARTMENTS = {
     "IT": "🖥 IT",
     "MARKETING": "📣 Marketing",
@@ -18,10 +20,17 @@ STATUS_EMOJI = {
 
 
 def format_task_card(task: dict) -> str:
+    # updated_at changes on every write in database/db.py, so it versions the card.
+    key = ("task", task["task_id"], task.get("updated_at"))
+    return render_cache.cards.get_or_build(key, lambda: _render_task_card(task))
+
+
+def _render_task_card(task: dict) -> str:
     dept_label = DEPARTMENTS.get(task["department"], task["department"])
     status_label = f"{STATUS_EMOJI.get(task['status'], '⚪')} {task['status']}"
     assigned = f"\n👤 Assigned: @{task['assigned_to']}" if task.get("assigned_to") else ""
-    file_note = "\n📎 File attached" if task.get("file_path") else ""
+    files = task.get("file_count") or (1 if task.get("file_path") else 0)
+    file_note = f"\n📎 {files} file(s) attached" if files else ""
     created = task.get("created_at", "")
     try:
         dt = datetime.fromisoformat(str(created))
@@ -42,6 +51,10 @@ def format_task_card(task: dict) -> str:
 
 
 def build_task_keyboard(task_id: int) -> InlineKeyboardMarkup:
+    return render_cache.keyboards.get_or_build(("task", task_id), lambda: _task_keyboard(task_id))
+
+
+def _task_keyboard(task_id: int) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup([
         [
             InlineKeyboardButton("🟡 In Progress", callback_data=f"STATUS_PROGRESS_{task_id}"),
@@ -0,0 +1,69 @@
+"""
+Ingress stage: ask Telegram only for the update types our handlers use, and
+drop group chatter before it reaches the handler groups.
+
+allowed_updates() derives the polling/webhook allowed_updates list from the
+registered handlers. IngressFilter.check runs as a TypeHandler in group -1 and
+raises ApplicationHandlerStop for plain group messages from users who are not
+in a ticket flow, so no other handler (or its filters) is evaluated for them.
+"""
+import logging
+
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop, CallbackQueryHandler, CommandHandler, MessageHandler, TypeHandler
+
+from utils import metrics
+
+logger = logging.getLogger("topping_bot.ingress")
+
+# Update types each handler class can match. Edited messages are left out on
+# purpose: no flow reacts to edits. Unknown handler types fall back to ALL_TYPES.
+HANDLER_UPDATE_TYPES = {
+    CommandHandler: (Update.MESSAGE,),
+    MessageHandler: (Update.MESSAGE,),
+    CallbackQueryHandler: (Update.CALLBACK_QUERY,),
+}
+
+
+def allowed_updates(application) -> list:
+    """Minimal allowed_updates covering every registered handler (the ingress TypeHandler excluded)."""
+    types = set()
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            if isinstance(handler, TypeHandler) and getattr(handler.callback, "__ingress__", False):
+                continue
+            for cls, update_types in HANDLER_UPDATE_TYPES.items():
+                if isinstance(handler, cls):
+                    types.update(update_types)
+                    break
+            else:
+                return list(Update.ALL_TYPES)
+    return sorted(str(t) for t in types)
+
+
+class IngressFilter:
+    def __init__(self, in_flow):
+        self.in_flow = in_flow  # user_id -> bool: is this user expected to send a plain message now?
+        self.dispatched = 0
+        self.dropped = 0
+
+    async def check(self, update: Update, context) -> None:
+        """group=-1 TypeHandler callback: stop plain group messages nobody is waiting for."""
+        msg = update.message
+        if (
+            msg is not None
+            and msg.chat.type in ("group", "supergroup")
+            and not (msg.text or "").startswith("/")
+            and not (msg.from_user and self.in_flow(msg.from_user.id))
+        ):
+            self.dropped += 1
+            metrics.inc("topping_ingress_updates_total", outcome="dropped")
+            logger.debug("Dropped group message in %s", msg.chat.id)
+            raise ApplicationHandlerStop
+        self.dispatched += 1
+        metrics.inc("topping_ingress_updates_total", outcome="dispatched")
+
+    check.__ingress__ = True
+
+    def stats(self) -> dict:
+        return {"dispatched": self.dispatched, "dropped": self.dropped}
@@ -0,0 +1,42 @@
+"""
+Keyed asyncio locks for concurrent update processing.
+
+locks(("ticket", ticket_id)) serializes read-modify-write cycles on one ticket
+(or task, or user's draft) while different keys run in parallel. A key's lock
+exists only while someone holds or waits for it, so memory tracks in-flight
+work, not the number of tickets ever seen. Take keys in a fixed order when
+nesting: user, then ticket/task.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+
+
+class KeyedLock:
+    def __init__(self):
+        self._locks = {}  # key -> [asyncio.Lock, holders + waiters]
+        self.contended = 0
+
+    @asynccontextmanager
+    async def __call__(self, key):
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        elif entry[0].locked():
+            self.contended += 1
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+    def stats(self) -> dict:
+        return {"active_keys": len(self._locks), "contended": self.contended}
+
+
+locks = KeyedLock()
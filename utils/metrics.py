@@ -0,0 +1,215 @@
+"""
+In-process metrics exposed in Prometheus text format.
+
+Latency histograms and error counters for handlers (instrument_application),
+storage calls (observe() from database/db.py _run and bot.py load/save) and
+Bot API requests (InstrumentedRequest), plus gauges read at scrape time for
+queue depths. serve() answers GET /metrics on METRICS_HOST:METRICS_PORT;
+METRICS_PORT=0 (the default) keeps the endpoint off.
+"""
+import asyncio
+import functools
+import logging
+import os
+import time
+from bisect import bisect_left
+
+from telegram.ext import ApplicationHandlerStop
+from telegram.request import HTTPXRequest
+
+logger = logging.getLogger("topping_bot.metrics")
+
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+# Seconds; fine-grained at the low end where storage calls live, up to Bot API timeouts.
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+HELP = {
+    "topping_handler_seconds": "Handler callback latency.",
+    "topping_handler_errors_total": "Handler callbacks that raised.",
+    "topping_storage_seconds": "Storage call latency (SQLite calls include waiting for the DB thread).",
+    "topping_storage_errors_total": "Storage calls that raised.",
+    "topping_bot_api_seconds": "Bot API request latency.",
+    "topping_bot_api_errors_total": "Bot API requests that failed or returned a non-200 status.",
+    "topping_ingress_updates_total": "Updates passed on to handlers or dropped by the ingress filter.",
+}
+
+
+class Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+_histograms = {}  # (name, labels) -> Histogram, labels a sorted tuple of (key, value)
+_counters = {}  # (name, labels) -> int
+_gauges = {}  # name -> (help, callable returning a number)
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def observe(name: str, seconds: float, **labels) -> None:
+    key = _key(name, labels)
+    hist = _histograms.get(key)
+    if hist is None:
+        hist = _histograms[key] = Histogram()
+    hist.observe(seconds)
+
+
+def inc(name: str, amount: int = 1, **labels) -> None:
+    key = _key(name, labels)
+    _counters[key] = _counters.get(key, 0) + amount
+
+
+def gauge(name: str, help_text: str, read) -> None:
+    """Register a gauge whose value is read (read()) on every scrape."""
+    _gauges[name] = (help_text, read)
+
+
+def timed(name: str, errors: str, **labels):
+    """Decorator for coroutine functions: latency into `name`, exceptions into `errors`."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            except Exception:
+                inc(errors, **labels)
+                raise
+            finally:
+                observe(name, time.perf_counter() - started, **labels)
+        return wrapper
+    return wrap
+
+
+def _wrap_callback(callback):
+    name = getattr(callback, "__name__", type(callback).__name__)
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        started = time.perf_counter()
+        try:
+            return await callback(update, context)
+        except ApplicationHandlerStop:
+            raise
+        except Exception:
+            inc("topping_handler_errors_total", handler=name)
+            raise
+        finally:
+            observe("topping_handler_seconds", time.perf_counter() - started, handler=name)
+
+    wrapper.__metrics_wrapped__ = True
+    return wrapper
+
+
+def instrument_application(application) -> None:
+    """Wrap the callback of every handler registered so far, and the error handlers."""
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            if not getattr(handler.callback, "__metrics_wrapped__", False):
+                handler.callback = _wrap_callback(handler.callback)
+    for callback, block in list(application.error_handlers.items()):
+        if not getattr(callback, "__metrics_wrapped__", False):
+            del application.error_handlers[callback]
+            application.error_handlers[_wrap_callback(callback)] = block
+
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest that records latency and failures per Bot API method."""
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        api_method = url.rsplit("/", 1)[-1]
+        started = time.perf_counter()
+        try:
+            code, payload = await super().do_request(url, method, request_data, **kwargs)
+        except Exception as e:
+            inc("topping_bot_api_errors_total", method=api_method, reason=type(e).__name__)
+            raise
+        finally:
+            observe("topping_bot_api_seconds", time.perf_counter() - started, method=api_method)
+        if code != 200:
+            inc("topping_bot_api_errors_total", method=api_method, reason=str(code))
+        return code, payload
+
+
+def _labels(labels, extra=()):
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _k, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _v), v in zip(pairs, escaped)) + "}"
+
+
+def render() -> str:
+    """All metrics in Prometheus text exposition format 0.0.4."""
+    lines = []
+    seen = set()
+    for (name, labels), hist in sorted(_histograms.items()):
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# HELP {name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+        cumulative = 0
+        for bound, n in zip((*BUCKETS, "+Inf"), hist.counts):
+            cumulative += n
+            lines.append(f"{name}_bucket{_labels(labels, (('le', bound),))} {cumulative}")
+        lines.append(f"{name}_sum{_labels(labels)} {hist.total:.6f}")
+        lines.append(f"{name}_count{_labels(labels)} {hist.count}")
+    for (name, labels), value in sorted(_counters.items()):
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# HELP {name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name}{_labels(labels)} {value}")
+    for name, (help_text, read) in sorted(_gauges.items()):
+        try:
+            value = read()
+        except Exception:
+            logger.exception("Gauge %s failed", name)
+            continue
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+async def _handle(reader, writer) -> None:
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+        while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+            pass  # headers are not needed
+        parts = request_line.decode("latin-1").split()
+        if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+            status, body = "200 OK", render().encode()
+        else:
+            status, body = "404 Not Found", b"not found\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host: str = METRICS_HOST, port: int = METRICS_PORT):
+    """Start the /metrics endpoint; returns the asyncio server, or None when port is 0."""
+    if not port:
+        return None
+    server = await asyncio.start_server(_handle, host, port)
+    logger.info("Metrics on http://%s:%s/metrics", host, port)
+    return server
@@ -0,0 +1,213 @@
+"""
+Central outbound queue for Bot API sends and edits.
+
+Every call waits for a token from its chat's bucket (Telegram allows about one
+message per second per private chat and 20 per minute per group), then for a
+token from the global bucket (~30/s). Waiters for the global bucket are served
+by priority, so ticket cards go out before GM notices when we are throttled.
+RetryAfter pauses the chat (and the global bucket for flood-wide limits) for
+the time Telegram asks and then retries, instead of losing the message.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TimedOut
+
+logger = logging.getLogger("topping_bot.outbound")
+
+PRIORITY_CARD = 0    # new ticket/task cards and routing confirmations
+PRIORITY_EDIT = 1    # card edits after a button press
+PRIORITY_NOTICE = 2  # GM dashboard notices, announcements
+
+GLOBAL_RATE, GLOBAL_BURST = 25.0, 5
+PRIVATE_RATE, PRIVATE_BURST = 1.0, 1
+GROUP_RATE, GROUP_BURST = 17 / 60, 3   # burst + rate*60 stays within 20/min
+MAX_ATTEMPTS = 5
+# Sweep idle per-chat buckets once this many exist (then again at twice what the sweep kept).
+CHAT_BUCKET_SWEEP = 1024
+
+
+def _seconds(retry_after) -> float:
+    # int in older PTB, datetime.timedelta in newer releases
+    return retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else float(retry_after)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        """Take a token (possibly going into debt); returns seconds to wait before using it."""
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens -= 1
+        wait = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+        return max(wait, self.blocked_until - now)
+
+    def delay(self) -> float:
+        """Seconds until a token is available, without taking it."""
+        now = time.monotonic()
+        self._refill(now)
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(wait, self.blocked_until - now)
+
+    def take(self) -> None:
+        self.tokens -= 1
+
+    def block(self, seconds: float) -> None:
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def idle(self, now: float) -> bool:
+        """Full and not blocked: indistinguishable from a fresh bucket, so it can be dropped."""
+        self._refill(now)
+        return self.tokens >= self.burst and self.blocked_until <= now
+
+
+class OutboundQueue:
+    def __init__(self):
+        self._global = TokenBucket(GLOBAL_RATE, GLOBAL_BURST)
+        self._chats: dict = {}
+        self._sweep_at = CHAT_BUCKET_SWEEP
+        self._waiting = []  # heap of (priority, seq, future) for global tokens
+        self._seq = itertools.count()
+        self._wake = None
+        self._dispatcher = None
+        # metrics
+        self.pending = 0
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    # -- public API ------------------------------------------------------------
+    async def send_message(self, bot, chat_id, text, priority=PRIORITY_CARD, **kwargs):
+        # A timed-out send may still have been delivered; retrying could post the card twice.
+        return await self.submit(
+            chat_id, priority, lambda: bot.send_message(chat_id=chat_id, text=text, **kwargs), retry_timeouts=False,
+        )
+
+    async def edit_message_text(self, bot, chat_id, message_id, text, priority=PRIORITY_EDIT, **kwargs):
+        return await self.submit(
+            chat_id, priority,
+            lambda: bot.edit_message_text(chat_id=chat_id, message_id=message_id, text=text, **kwargs),
+        )
+
+    async def submit(self, chat_id, priority, call, retry_timeouts=True):
+        """Run `call()` (a coroutine factory) once chat and global limits allow; retries on RetryAfter and
+        transient network errors. BadRequest/Forbidden are permanent and raised at once; TimedOut is only
+        retried when `retry_timeouts` (calls that are safe to repeat)."""
+        started = time.monotonic()
+        self.pending += 1
+        try:
+            for attempt in range(1, MAX_ATTEMPTS + 1):
+                await self._acquire(chat_id, priority)
+                try:
+                    result = await call()
+                except RetryAfter as e:
+                    if attempt == MAX_ATTEMPTS:
+                        raise
+                    wait = _seconds(e.retry_after)
+                    self._bucket(chat_id).block(wait)
+                    if wait > 1:
+                        self._global.block(wait)  # long waits are flood control on the whole bot
+                    logger.warning("RetryAfter %.1fs for chat %s (attempt %d)", wait, chat_id, attempt)
+                except (BadRequest, Forbidden):
+                    raise  # permanent: retrying only burns the chat's rate-limit tokens
+                except NetworkError as e:
+                    if attempt == MAX_ATTEMPTS or (isinstance(e, TimedOut) and not retry_timeouts):
+                        raise
+                    logger.warning("Network error sending to chat %s (attempt %d): %s", chat_id, attempt, e)
+                    await asyncio.sleep(min(2 ** attempt, 30))
+                else:
+                    self.sent += 1
+                    latency = time.monotonic() - started
+                    self.latency_total += latency
+                    self.latency_max = max(self.latency_max, latency)
+                    return result
+                self.retried += 1
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.pending -= 1
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.pending,
+            "waiting_global": len(self._waiting),
+            "chat_buckets": len(self._chats),
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+            "latency_avg_ms": round(1000 * self.latency_total / self.sent, 1) if self.sent else 0.0,
+            "latency_max_ms": round(1000 * self.latency_max, 1),
+        }
+
+    # -- internals -------------------------------------------------------------
+    def _bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= self._sweep_at:
+                self._sweep()
+            # Negative ids are groups/supergroups/channels.
+            if isinstance(chat_id, int) and chat_id < 0:
+                bucket = TokenBucket(GROUP_RATE, GROUP_BURST)
+            else:
+                bucket = TokenBucket(PRIVATE_RATE, PRIVATE_BURST)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    def _sweep(self) -> None:
+        now = time.monotonic()
+        for chat_id, bucket in list(self._chats.items()):
+            if bucket.idle(now):
+                del self._chats[chat_id]
+        self._sweep_at = max(CHAT_BUCKET_SWEEP, 2 * len(self._chats))  # amortized O(1) per new chat
+
+    async def _acquire(self, chat_id, priority) -> None:
+        wait = self._bucket(chat_id).reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        if not self._waiting and self._global.delay() == 0:
+            self._global.take()
+            return
+        self._ensure_dispatcher()
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, (priority, next(self._seq), fut))
+        self._wake.set()
+        await fut
+
+    def _ensure_dispatcher(self) -> None:
+        if self._dispatcher is None or self._dispatcher.done():
+            self._wake = asyncio.Event()
+            self._dispatcher = asyncio.get_running_loop().create_task(self._dispatch())
+
+    async def _dispatch(self) -> None:
+        while True:
+            if not self._waiting:
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+            wait = self._global.delay()
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            _, _, fut = heapq.heappop(self._waiting)
+            if not fut.done():
+                self._global.take()
+                fut.set_result(None)
+
+
+outbound = OutboundQueue()
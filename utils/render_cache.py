@@ -0,0 +1,49 @@
+"""
+Shared LRU caches for rendered ticket/task cards and their keyboards.
+
+Card keys include the record's version (updated_at, plus status for tickets),
+so a changed record simply misses and the stale entry ages out. Keyboards
+depend only on the id. Both are bounded; least recently used entries go first.
+"""
+from collections import OrderedDict
+
+CARD_CACHE_SIZE = 2048
+KEYBOARD_CACHE_SIZE = 2048
+
+
+class LRUCache:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_build(self, key, build):
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            value = self._data[key] = build()
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+            return value
+        self.hits += 1
+        self._data.move_to_end(key)
+        return value
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+cards = LRUCache(CARD_CACHE_SIZE)
+keyboards = LRUCache(KEYBOARD_CACHE_SIZE)
+
+
+def stats() -> dict:
+    return {"cards": cards.stats(), "keyboards": keyboards.stats()}